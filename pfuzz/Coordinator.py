@@ -0,0 +1,65 @@
+import pickle
+
+###
+# 'Coordinator' is shared by the worker processes of a multi-target campaign (Snipuzz.py -t <targetfile>)
+# 'Coordinator' attrs - [ corpus  : "model|digest" -> pickled Seed  - probed seeds with their snippet hierarchy;
+#                         order   : "model|digest" List              - publish order, so workers pull incrementally;
+#                         claims  : "model|digest" -> worker name    - the worker that probes and snippet-mutates a seed;
+#                         crashes : bucket -> crash file             - crash buckets across all workers ]
+# The attrs are multiprocessing.Manager proxies, so the object itself can be handed to the workers.
+###
+class Coordinator:
+    def __init__(self, manager) -> None:
+        self.lock = manager.Lock()
+        self.corpus = manager.dict()
+        self.order = manager.list()
+        self.claims = manager.dict()
+        self.crashes = manager.dict()
+
+    # the first worker asking for a seed of a model gets it, identical devices then pull the result
+    def claim(self, model, digest, worker):
+        key = model + "|" + digest
+        with self.lock:
+            if key in self.claims:
+                return self.claims[key] == worker
+            self.claims[key] = worker
+            return True
+
+    # give up a claim whose seed could not be probed (failed dry run), so another worker can take it
+    def release(self, model, digest, worker):
+        key = model + "|" + digest
+        with self.lock:
+            if self.claims.get(key) == worker and key not in self.corpus:
+                del self.claims[key]
+
+    def known(self, model, digest):
+        return (model + "|" + digest) in self.claims
+
+    def lookup(self, model, digest):
+        data = self.corpus.get(model + "|" + digest)
+        return pickle.loads(data) if data is not None else None
+
+    def publish(self, model, seed, worker):
+        key = model + "|" + seed.digest()
+        with self.lock:
+            self.claims.setdefault(key, worker)
+            if key not in self.corpus:
+                self.order.append(key)
+            self.corpus[key] = pickle.dumps(seed)
+
+    # seeds of a model published since the 'since' position, and the new position
+    def pull(self, model, since):
+        keys = self.order[since:]
+        seeds = []
+        for key in keys:
+            if key.startswith(model + "|"):
+                seeds.append(pickle.loads(self.corpus[key]))
+        return seeds, since + len(keys)
+
+    # record a crash bucket, True if no worker reported it before
+    def crash(self, bucket, file):
+        with self.lock:
+            if bucket in self.crashes:
+                return False
+            self.crashes[bucket] = file
+            return True
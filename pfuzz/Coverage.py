@@ -0,0 +1,142 @@
+import json
+import os
+import random
+
+from Distill import DIGITS
+from SnR import SimilarityScore
+
+# responses remembered per entry for the exact-match lookup before it is cleared
+EXACT_LIMIT = 1024
+
+###
+# 'CoverageMap' counts the response classes hit by every (seed, message) pair, AFL's "paths" for a black-box target
+# entries : "digest|message index" -> { reps     : representative response of each class;
+#                                       scores   : similarity a response needs to join the class;
+#                                       hits     : executions that landed in the class;
+#                                       ops      : operator that found the class ('Probe' for the probe classes);
+#                                       snippets : snippet ([start, end]) that found the class, None if none;
+#                                       exact    : response -> class, so a repeated response costs one dict lookup }
+# The probe classes (PR/PS) of a seed are its first classes. A response joining no class opens a new one and is
+# novel; the same response again is not, so one behaviour only queues one interesting seed. Responses are compared
+# with their digits masked (as in Distill), so a changing timestamp or counter does not make a reply new, and a new
+# class takes the threshold of the class it came closest to.
+###
+class CoverageMap:
+    entries = {}
+
+    def __init__(self) -> None:
+        self.entries = {}
+        self.execs = 0
+        self.paths = 0
+        # digest -> rarity of the seed, sum of 1 / (1 + hits) over its classes
+        self.rarity = {}
+
+    def entry(self, digest, seed, index):
+        key = digest + "|" + str(index)
+        if key not in self.entries:
+            pool = seed.PR[index] if index < len(seed.PR) else []
+            scores = seed.PS[index] if index < len(seed.PS) else []
+            self.entries[key] = {
+                "reps": [DIGITS.sub('0', (r or "").strip()) for r in pool],
+                "scores": list(scores),
+                "hits": [0] * len(pool),
+                "ops": ['Probe'] * len(pool),
+                "snippets": [None] * len(pool),
+                "exact": {},
+            }
+            self.rarity[digest] = self.rarity.get(digest, 0.0) + len(pool)
+        return self.entries[key]
+
+    # (class of a (masked) response, -1 if it joins none; the class it came closest to, -1 if there is none)
+    def classify(self, entry, response):
+        if response in entry["exact"]:
+            return entry["exact"][response], entry["exact"][response]
+        closest = -1
+        best = -1.0
+        for j in range(len(entry["reps"])):
+            score = SimilarityScore(entry["reps"][j], response)
+            if score >= entry["scores"][j]:
+                if len(entry["exact"]) >= EXACT_LIMIT:
+                    entry["exact"].clear()
+                entry["exact"][response] = j
+                return j, j
+            if score > best:
+                closest = j
+                best = score
+        return -1, closest
+
+    # count one execution, (class, novel)
+    def record(self, digest, seed, index, response, op='', snippet=None):
+        response = DIGITS.sub('0', (response or "").strip())
+        entry = self.entry(digest, seed, index)
+        self.execs += 1
+        c, closest = self.classify(entry, response)
+        novel = c < 0
+        if novel:
+            entry["reps"].append(response)
+            entry["scores"].append(entry["scores"][closest] if closest >= 0 else 100.0)
+            entry["hits"].append(0)
+            entry["ops"].append(op)
+            entry["snippets"].append(snippet)
+            c = len(entry["reps"]) - 1
+            entry["exact"][response] = c
+            self.paths += 1
+            self.rarity[digest] += 1.0
+        h = entry["hits"][c]
+        self.rarity[digest] += 1.0 / (h + 2) - 1.0 / (h + 1)
+        entry["hits"][c] = h + 1
+        return c, novel
+
+    # recount the rarity of a seed from its entries (after a load)
+    def updateRarity(self, digest):
+        rarity = 0.0
+        index = 0
+        while digest + "|" + str(index) in self.entries:
+            rarity += sum(1.0 / (1 + h) for h in self.entries[digest + "|" + str(index)]["hits"])
+            index += 1
+        self.rarity[digest] = rarity
+
+    # a queue position, weighted by rarity; seeds never executed count as one unhit class
+    def pick(self, digests):
+        weights = [self.rarity.get(digest, 1.0) or 0.01 for digest in digests]
+        return random.choices(range(len(digests)), weights=weights)[0]
+
+    def lines(self):
+        found = {}
+        for entry in self.entries.values():
+            for op in entry["ops"]:
+                found[op] = found.get(op, 0) + 1
+        lines = ["Coverage execs: " + str(self.execs) + " paths: " + str(self.paths) +
+                 " classes: " + str(sum(found.values())) + " seeds/messages: " + str(len(self.entries))]
+        for op in sorted(found):
+            lines.append(op + " classes: " + str(found[op]))
+        return lines
+
+    def display(self):
+        for line in self.lines():
+            print(line)
+
+    def save(self, file):
+        data = {"execs": self.execs, "paths": self.paths, "entries": {}}
+        for key, entry in self.entries.items():
+            data["entries"][key] = {k: entry[k] for k in ("reps", "scores", "hits", "ops", "snippets")}
+        with open(file + '.tmp', 'w') as f:
+            json.dump(data, f)
+        os.replace(file + '.tmp', file)
+        with open(os.path.splitext(file)[0] + '.txt', 'w') as f:
+            for line in self.lines():
+                f.write(line + "\n")
+
+    def load(self, file):
+        if not os.path.exists(file):
+            return
+        with open(file, 'r') as f:
+            data = json.load(f)
+        self.execs = data.get("execs", 0)
+        self.paths = data.get("paths", 0)
+        for key, entry in data.get("entries", {}).items():
+            entry["reps"] = [DIGITS.sub('0', r) for r in entry["reps"]]
+            entry["exact"] = {}
+            self.entries[key] = entry
+        for digest in set(key.rsplit("|", 1)[0] for key in self.entries):
+            self.updateRarity(digest)
@@ -0,0 +1,182 @@
+import json
+import os
+import random
+import re
+
+###
+# 'TokenDictionary' keeps the tokens harvested from the seeds and the probe responses of one target
+# 'TokenDictionary' attrs - [ hits    : Token and its hit count (Dictionary - { Token : Count } ) - how many times the token produced an interesting response;
+#                             order   : Token List (String List)                                  - insertion order, used to break ties in the ranking;
+#                             values  : Key and its last value (Dictionary - { Key : Value } )     - the last string or number seen after a JSON key;
+#                             changes : Key and its changes (Dictionary - { Key : Count } )        - how many times in a row that value changed;
+#                             ranking : Token List (String List)                                  - ranked() cached until a token is added, hit or evicted ]
+# At most MAX_TOKENS tokens are kept: past it the least hit ones are evicted, the oldest first (the defaults never are).
+# A key whose value changed VOLATILE_CHANGES times in a row (a timestamp, a nonce, a counter) is not harvested any more.
+###
+
+# the tokens the "Interesting" operator used before anything was harvested
+DEFAULT_TOKENS = ['on', 'off', 'True', 'False', '0', '1']
+
+KEY_PATTERN = re.compile(r'["\']([^"\'\\]{1,32})["\']\s*:')
+STRING_PATTERN = re.compile(r':\s*["\']([^"\'\\]{1,64})["\']')
+HEX_PATTERN = re.compile(r'^[0-9a-fA-F]{12,}$')
+NUMBER_PATTERN = re.compile(r'(?<![\w.])-?\d{1,10}(?![\w.])')
+LITERAL_PATTERN = re.compile(r':\s*(true|false|null|True|False|None)\b')
+
+MAX_TOKENS = 4096
+VOLATILE_CHANGES = 3
+
+KEY_VALUE_PATTERN = re.compile(r'["\']([^"\'\\]{1,32})["\']\s*:\s*(?:["\']([^"\'\\]{1,64})["\']|(-?\d{1,10})(?![\w.]))')
+
+BOUNDARIES = [0, -1, 127, 128, 255, 256, 32767, 32768, 65535, 65536, 2147483647, 2147483648, 4294967295]
+
+
+class TokenDictionary:
+    hits = {}
+    order = []
+    values = {}
+    changes = {}
+    ranking = None
+
+    def __init__(self) -> None:
+        self.hits = {}
+        self.order = []
+        self.values = {}
+        self.changes = {}
+        self.ranking = None
+        for token in DEFAULT_TOKENS:
+            self.add(token)
+
+    def __len__(self):
+        return len(self.order)
+
+    def add(self, token):
+        if token and token not in self.hits:
+            self.hits[token] = 0
+            self.order.append(token)
+            self.ranking = None
+            if len(self.order) > MAX_TOKENS:
+                self.evict()
+
+    # drop an eighth of the tokens, the least hit first and the oldest first on ties
+    def evict(self):
+        index = {token: i for i, token in enumerate(self.order)}
+        candidates = sorted((token for token in self.order if token not in DEFAULT_TOKENS),
+                            key=lambda token: (self.hits[token], index[token]))
+        dropped = set(candidates[:MAX_TOKENS // 8])
+        for token in dropped:
+            del self.hits[token]
+        self.order = [token for token in self.order if token not in dropped]
+        self.ranking = None
+
+    # the values after the JSON keys of a text that keep changing from one text to the next
+    def volatile(self, text):
+        found = set()
+        for key, string, number in KEY_VALUE_PATTERN.findall(text):
+            value = string or number
+            last = self.values.get(key)
+            if last is not None:
+                self.changes[key] = self.changes.get(key, 0) + 1 if last != value else 0
+            self.values[key] = value
+            if self.changes.get(key, 0) >= VOLATILE_CHANGES:
+                found.add(value)
+        return found
+
+    # mine dps keys, enum values, hex colour strings and numeric boundaries from a content or a response
+    def harvest(self, text):
+        text = (text or "").strip()
+        if not text:
+            return
+        volatile = self.volatile(text)
+
+        for key in KEY_PATTERN.findall(text):
+            self.add(key)
+
+        for value in STRING_PATTERN.findall(text):
+            if value in volatile:
+                continue
+            self.add(value)
+            if HEX_PATTERN.match(value):
+                # keep the length so the device still parses it as a colour
+                self.add('0' * len(value))
+                self.add('f' * len(value))
+                self.add(value[:len(value) // 2])
+
+        for literal in LITERAL_PATTERN.findall(text):
+            self.add(literal)
+
+        for number in NUMBER_PATTERN.findall(text):
+            if number in volatile:
+                continue
+            n = int(number)
+            self.add(str(n))
+            self.add(str(n - 1))
+            self.add(str(n + 1))
+            for b in BOUNDARIES:
+                if abs(b) >= abs(n):
+                    self.add(str(b))
+                    break
+
+    def harvestSeed(self, seed):
+        for message in seed.M:
+            self.harvest(message.raw.get("Content", ""))
+        for response in seed.R:
+            self.harvest(response)
+        for pool in seed.PR:
+            for response in pool:
+                self.harvest(response)
+
+    def hit(self, token):
+        if token in self.hits:
+            self.hits[token] += 1
+            self.ranking = None
+
+    # a token and its hit count from a saved dictionary
+    def restore(self, token, hits):
+        self.add(token)
+        if token in self.hits:
+            self.hits[token] = max(self.hits[token], hits)
+            self.ranking = None
+
+    # tokens ordered by hit count, the earlier harvested first on ties
+    def ranked(self):
+        if self.ranking is None:
+            index = {token: i for i, token in enumerate(self.order)}
+            self.ranking = sorted(self.order, key=lambda token: (-self.hits[token], index[token]))
+        return self.ranking
+
+    def top(self, n):
+        return self.ranked()[:n]
+
+    # weighted pick for Havoc, tokens that already hit are picked more often
+    def choice(self):
+        weights = [self.hits[token] + 1 for token in self.order]
+        return random.choices(self.order, weights=weights)[0]
+
+
+# per-target dictionaries, keyed by Seed.target()
+dictionaries = {}
+
+
+def getDictionary(target):
+    if target not in dictionaries:
+        dictionaries[target] = TokenDictionary()
+    return dictionaries[target]
+
+
+def saveDictionaries(file):
+    with open(file, 'w') as f:
+        for target, dictionary in dictionaries.items():
+            for token in dictionary.ranked():
+                f.write(json.dumps({"target": target, "token": token, "hits": dictionary.hits[token]}) + "\n")
+
+
+def loadDictionaries(file):
+    if not os.path.exists(file):
+        return
+    with open(file, 'r') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            getDictionary(entry["target"]).restore(entry["token"], int(entry["hits"]))
@@ -0,0 +1,115 @@
+import getopt
+import os
+import re
+import sys
+
+###
+# Corpus distillation: the smallest set of seeds that still covers every response class observed so far.
+# A class is (message index, response with the digits masked), so two seeds whose probes drew the same answer
+# (up to timestamps and counters) from the same message cover the same class.
+# Greedy set cover, cheapest per new class first; the cost of a seed is its total content length, which is
+# what the Probe and the snippet mutation spend sends on, times the seconds one execution of it takes. Seeds
+# without a measured time (all of them when Distill.py runs on a record file) count the mean time.
+###
+
+DIGITS = re.compile(r'\d+')
+
+
+def classes(seed):
+    covered = set()
+    for i in range(len(seed.PR)):
+        for response in seed.PR[i]:
+            covered.add((i, DIGITS.sub('0', (response or "").strip())))
+    return covered
+
+
+def coverage(queue):
+    covered = set()
+    for seed in queue:
+        covered |= classes(seed)
+    return covered
+
+
+def cost(seed, seconds=1.0):
+    return (sum(len(message.raw.get("Content", "").strip()) for message in seed.M) + len(seed.M)) * seconds
+
+
+# (kept, retired), both in queue order; 'times' are the execution seconds by seed digest
+def distill(queue, times=None):
+    times = times or {}
+    default = sum(times.values()) / len(times) if times else 1.0
+    remaining = {}
+    costs = {}
+    for n in range(len(queue)):
+        remaining[n] = classes(queue[n])
+        costs[n] = cost(queue[n], times.get(queue[n].digest(), default) or default)
+
+    uncovered = set()
+    for covered in remaining.values():
+        uncovered |= covered
+
+    chosen = set()
+    while uncovered:
+        best = None
+        bestScore = 0
+        for n, covered in remaining.items():
+            gain = len(covered & uncovered)
+            if gain == 0:
+                continue
+            score = gain / costs[n]
+            if best is None or score > bestScore:
+                best = n
+                bestScore = score
+        if best is None:
+            break
+        chosen.add(best)
+        uncovered -= remaining.pop(best)
+
+    kept = [queue[n] for n in range(len(queue)) if n in chosen]
+    retired = [queue[n] for n in range(len(queue)) if n not in chosen]
+    return kept, retired
+
+
+def main(argv):
+    from Snipuzz import readRecordFile, writeSeedRecord
+
+    recordfile = ''
+    outputfold = ''
+    usage = 'Distill.py -c <recordfile> -o <outputfold>'
+    try:
+        opts, args = getopt.getopt(argv, "hc:o:", ["cfile=", "ofold="])
+    except getopt.GetoptError:
+        print(usage)
+        sys.exit(2)
+    for opt, arg in opts:
+        if opt == '-h':
+            print(usage)
+            sys.exit()
+        elif opt in ("-c", "--cfile"):
+            recordfile = arg
+        elif opt in ("-o", "--ofold"):
+            outputfold = arg
+    if not recordfile or not outputfold:
+        print(usage)
+        sys.exit(2)
+
+    queue = readRecordFile(recordfile)
+    kept, retired = distill(queue)
+    os.makedirs(outputfold, exist_ok=True)
+    with open(os.path.join(outputfold, 'ProbeRecord.txt'), 'w') as f:
+        for i in range(len(kept)):
+            writeSeedRecord(f, kept[i], i)
+    with open(os.path.join(outputfold, 'Retired.txt'), 'w') as f:
+        for i in range(len(retired)):
+            writeSeedRecord(f, retired[i], i)
+    # the record must read back as written, or the kept / retired split was made on part of the corpus
+    written = len(readRecordFile(os.path.join(outputfold, 'ProbeRecord.txt'))) + \
+        len(readRecordFile(os.path.join(outputfold, 'Retired.txt')))
+    if written != len(queue):
+        print('#### ' + str(written) + ' of ' + str(len(queue)) + ' seeds read back from ' + outputfold)
+        sys.exit(1)
+    print('Kept ' + str(len(kept)) + ' of ' + str(len(queue)) + ' seeds, ' + str(len(coverage(kept))) + ' classes')
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
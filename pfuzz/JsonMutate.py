@@ -0,0 +1,225 @@
+import copy
+import json
+import random
+
+from Template import freeze, thaw
+
+###
+# Structure-aware mutation for JSON contents (e.g. Tuya '{"protocol":5,"t":...,"data":{"dps":{...}}}').
+# The content is parsed once, then mutated at the value, key, type and nesting level and dumped back
+# compactly, so most mutations get past the device's JSON parser instead of ending in 'data format error'.
+# Template placeholders ({{epoch}}, ...) survive the round trip and, unless asked, are never mutated.
+###
+
+JSON_OPERATORS = ['JsonValue', 'JsonKey', 'JsonType', 'JsonNest']
+
+INT_BOUNDARIES = [0, -1, 1, 255, 256, 65535, 2147483647, -2147483648, 4294967296]
+
+# responses that tell the message never got past the parser
+REJECT_MARKERS = ["data format error", "'Err': '900'", '"Err": "900"']
+
+parsed = {}
+
+
+# parse a content once, None if it is not a JSON object or array
+def parse(content):
+    content = (content or "").strip()
+    if content not in parsed:
+        try:
+            obj = json.loads(freeze(content))
+        except ValueError:
+            obj = None
+        parsed[content] = obj if isinstance(obj, (dict, list)) else None
+    return parsed[content]
+
+
+def dumps(obj):
+    return thaw(json.dumps(obj, separators=(',', ':')))
+
+
+# a node holding a template placeholder, anywhere below it
+def isProtected(node):
+    return '{{' in json.dumps(node)
+
+
+# paths to every node below the root, e.g. ('data', 'dps', '1')
+def paths(node, prefix=()):
+    result = []
+    if isinstance(node, dict):
+        items = node.items()
+    elif isinstance(node, list):
+        items = enumerate(node)
+    else:
+        return result
+    for key, value in items:
+        result.append(prefix + (key,))
+        result.extend(paths(value, prefix + (key,)))
+    return result
+
+
+def get(node, path):
+    for key in path:
+        node = node[key]
+    return node
+
+
+def replaced(obj, path, value):
+    new = copy.deepcopy(obj)
+    get(new, path[:-1])[path[-1]] = value
+    return new
+
+
+def valueVariants(value, tokens):
+    if isinstance(value, bool):
+        return [not value]
+    if isinstance(value, (int, float)):
+        return [value + 1, value - 1] + [b for b in INT_BOUNDARIES if b != value]
+    if isinstance(value, str):
+        return [t for t in tokens if t != value] + ["", value * 16]
+    if value is None:
+        return [0, ""]
+    return []
+
+
+def typeVariants(value):
+    variants = [None, str(value), [value], {}]
+    if isinstance(value, bool):
+        variants.append(int(value))
+    elif isinstance(value, (int, float)):
+        variants.append(bool(value))
+    elif isinstance(value, str):
+        # isdigit() also holds for digits int() does not take, e.g. the superscripts BitFlip produces
+        variants.append(int(value) if value.isascii() and value.lstrip('-').isdigit() else 0)
+    return [v for v in variants if type(v) is not type(value) or v != value]
+
+
+def nestVariants(value):
+    deep = value
+    for _ in range(32):
+        deep = [deep]
+    return [[value], {"0": value}, deep]
+
+
+# the JSON mutations of one node: (operator, mutated object)
+def nodeMutations(obj, path, tokens):
+    mutations = []
+    value = get(obj, path)
+    parent = get(obj, path[:-1])
+
+    if not isinstance(value, (dict, list)):
+        for v in valueVariants(value, tokens):
+            mutations.append(('JsonValue', replaced(obj, path, v)))
+
+    if isinstance(parent, dict):
+        # drop the key, or rename it to another harvested key
+        new = copy.deepcopy(obj)
+        del get(new, path[:-1])[path[-1]]
+        mutations.append(('JsonKey', new))
+        for t in tokens:
+            if t not in parent:
+                new = copy.deepcopy(obj)
+                target = get(new, path[:-1])
+                target[t] = target.pop(path[-1])
+                mutations.append(('JsonKey', new))
+                break
+
+    for v in typeVariants(value):
+        mutations.append(('JsonType', replaced(obj, path, v)))
+
+    for v in nestVariants(value):
+        mutations.append(('JsonNest', replaced(obj, path, v)))
+
+    return mutations
+
+
+# break the text on purpose, so the parser's reject path still gets some coverage
+def invalid(text):
+    pick = random.randint(0, 3)
+    if pick == 0:
+        return text[:random.randint(1, max(1, len(text) - 1))]
+    if pick == 1:
+        i = random.randint(0, len(text) - 1)
+        return text[:i] + text[i + 1:]
+    if pick == 2:
+        return text.replace(':', '::', 1)
+    return text + random.choice(['}', ',', '"', ']'])
+
+
+# every structural mutation of a content, in a deterministic order; a 'ratio' share of them is sent broken
+def structuralMutations(content, tokens, ratio, protect=True):
+    obj = parse(content)
+    if obj is None:
+        return
+    for path in paths(obj):
+        if protect and isProtected(get(obj, path)):
+            continue
+        for op, new in nodeMutations(obj, path, tokens):
+            text = dumps(new)
+            if random.random() < ratio:
+                yield 'JsonInvalid', invalid(text)
+            else:
+                yield op, text
+
+
+# one random structural mutation of a content for Havoc, None if the content is not JSON
+def randomMutation(content, tokens, ratio, protect=True):
+    obj = parse(content)
+    if obj is None:
+        return None
+    nodes = [path for path in paths(obj) if not (protect and isProtected(get(obj, path)))]
+    if not nodes:
+        return None
+    op, new = random.choice(nodeMutations(obj, random.choice(nodes), tokens))
+    text = dumps(new)
+    if random.random() < ratio:
+        return 'JsonInvalid', invalid(text)
+    return op, text
+
+
+def isValidResponse(response):
+    response = (response or "").strip()
+    if not response:
+        return False
+    for marker in REJECT_MARKERS:
+        if marker in response:
+            return False
+    return True
+
+
+###
+# 'OperatorStats' records, for every mutation operator, how many sends it made and how many of them
+# got a response past the parser, to compare the byte-level and the structural operators
+###
+class OperatorStats:
+    sends = {}
+    valid = {}
+
+    def __init__(self) -> None:
+        self.sends = {}
+        self.valid = {}
+
+    def record(self, op, response):
+        self.sends[op] = self.sends.get(op, 0) + 1
+        if isValidResponse(response):
+            self.valid[op] = self.valid.get(op, 0) + 1
+
+    def rate(self, op):
+        if not self.sends.get(op):
+            return 0.0
+        return round(self.valid.get(op, 0) / self.sends[op] * 100, 2)
+
+    def lines(self):
+        lines = []
+        for op in sorted(self.sends):
+            lines.append(op + " sends: " + str(self.sends[op]) + " valid: " + str(self.valid.get(op, 0)) +
+                         " rate: " + str(self.rate(op)) + "%")
+        return lines
+
+    def display(self):
+        for line in self.lines():
+            print(line)
+
+    def save(self, file):
+        with open(file, 'w') as f:
+            for line in self.lines():
+                f.write(line + "\n")
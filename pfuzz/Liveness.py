@@ -0,0 +1,85 @@
+import socket
+import threading
+import time
+
+import TuyaFrame
+
+###
+# 'LivenessMonitor' probes the target in a background thread, in parallel with the fuzzing loop, so the
+# Messenger can tell a dead device from a slow one without burning its retries.
+#   tcp       : a TCP connect to the device port; refused or timed out => crash
+#   heartbeat : a Tuya HEART_BEAT on a session of its own; connect ok but no answer => hang
+# A crash or hang is flagged after 'threshold' failed checks in a row, i.e. within
+# threshold * (interval + timeout) seconds.
+###
+class LivenessMonitor(threading.Thread):
+    def __init__(self, address, port, interval=0.5, timeout=0.5, threshold=3, session=None) -> None:
+        super().__init__(daemon=True)
+        self.address = address
+        self.port = port
+        self.interval = interval
+        self.timeout = timeout
+        self.threshold = threshold
+        self.session = session
+        self.failures = 0
+        self.state = "alive"
+        self.checked = threading.Event()
+        self.running = True
+
+    def latency(self):
+        return self.threshold * (self.interval + self.timeout)
+
+    def tcpCheck(self):
+        try:
+            socket.create_connection((self.address, self.port), timeout=self.timeout).close()
+            return "alive"
+        except OSError:
+            return "crash"
+
+    def heartbeatCheck(self):
+        if self.tcpCheck() != "alive":
+            return "crash"
+        try:
+            self.session.timeout = self.timeout
+            return "alive" if self.session.heartbeat() else "hang"
+        except (OSError, TuyaFrame.TuyaAuthError):
+            self.session.close()
+            return "hang"
+
+    def run(self):
+        while self.running:
+            state = self.heartbeatCheck() if self.session is not None else self.tcpCheck()
+            if state == "alive":
+                self.failures = 0
+                self.state = "alive"
+            else:
+                self.failures += 1
+                if self.failures >= self.threshold:
+                    if self.state == "alive":
+                        print("[Liveness] target " + self.address + ":" + str(self.port) + " looks dead: " + state)
+                    self.state = state
+            self.checked.set()
+            time.sleep(self.interval)
+
+    def stop(self):
+        self.running = False
+
+    def down(self):
+        return self.state != "alive"
+
+    # after a failed send: True if the target is down. Only when a check has already failed does it wait (bounded)
+    # for the monitor to make up its mind; a silent reply from a target the monitor last saw alive costs nothing
+    def settle(self):
+        if self.down():
+            return True
+        if self.failures == 0:
+            return False
+        deadline = time.time() + self.latency() + self.interval
+        while time.time() < deadline:
+            self.checked.clear()
+            self.checked.wait(max(0.0, deadline - time.time()))
+            if self.down():
+                return True
+            if self.failures == 0:
+                return False
+        return self.down()
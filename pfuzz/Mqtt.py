@@ -0,0 +1,223 @@
+import re
+import select
+import socket
+import ssl
+import struct
+import time
+
+###
+# A minimal MQTT 3.1.1 client (QoS 0) for the Messenger's 'Transport: mqtt' seeds, e.g. the eWelink hub's
+# broker on 8883 (TLS, ALPN "mqtt"). One 'MqttSession' keeps the TLS session and the MQTT connection across
+# executions: a send is one PUBLISH on 'topic' and the reply is the next PUBLISH on 'reply_topic'.
+# TLS-PSK needs ssl.SSLContext.set_psk_client_callback (Python 3.13+).
+###
+
+CONNECT = 1
+CONNACK = 2
+PUBLISH = 3
+PUBACK = 4
+SUBSCRIBE = 8
+SUBACK = 9
+PINGREQ = 12
+PINGRESP = 13
+DISCONNECT = 14
+
+
+class MqttError(Exception):
+    pass
+
+
+def encodeLength(n):
+    out = bytearray()
+    while True:
+        byte = n % 128
+        n //= 128
+        if n:
+            byte |= 0x80
+        out.append(byte)
+        if not n:
+            return bytes(out)
+
+
+def encodeString(s):
+    data = s.encode("utf-8") if isinstance(s, str) else s
+    return struct.pack('>H', len(data)) + data
+
+
+def packet(kind, flags, body):
+    return bytes([(kind << 4) | flags]) + encodeLength(len(body)) + body
+
+
+# the value of a JSON field, used to pair a reply with its request (e.g. eWelink's "sequence")
+def correlationValue(text, field):
+    match = re.search(r'"' + re.escape(field) + r'"\s*:\s*"?([^",}\s]*)', text or "")
+    return match.group(1) if match else None
+
+
+class MqttSession:
+    def __init__(self, host, port=8883, client_id='pfuzz', topic='', reply_topic='', username='', password='',
+                 use_tls=True, psk_identity='', psk=b'', timeout=2.0, keepalive=60) -> None:
+        self.host = host
+        self.port = port
+        self.client_id = client_id
+        self.topic = topic
+        self.reply_topic = reply_topic
+        self.username = username
+        self.password = password
+        self.use_tls = use_tls
+        self.psk_identity = psk_identity
+        self.psk = psk
+        self.timeout = timeout
+        self.keepalive = keepalive
+        self.sock = None
+        self.buffer = b''
+        self.packet_id = 1
+        self.last_sent = 0
+        self.connects = 0
+
+    def connected(self):
+        return self.sock is not None
+
+    def close(self):
+        if self.sock is not None:
+            try:
+                self.sock.sendall(packet(DISCONNECT, 0, b''))
+            except OSError:
+                pass
+            try:
+                self.sock.close()
+            except OSError:
+                pass
+        self.sock = None
+        self.buffer = b''
+
+    def _context(self):
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
+        # the devices present self-signed certificates, the fuzzer is not the one to check them
+        context.check_hostname = False
+        context.verify_mode = ssl.CERT_NONE
+        context.set_alpn_protocols(["mqtt"])
+        if self.psk:
+            if not hasattr(context, "set_psk_client_callback"):
+                raise MqttError("TLS-PSK needs Python 3.13 or later")
+            context.maximum_version = ssl.TLSVersion.TLSv1_2
+            context.set_ciphers("PSK")
+            context.set_psk_client_callback(lambda hint: (self.psk_identity, self.psk))
+        return context
+
+    def connect(self):
+        self.close()
+        sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        if self.use_tls:
+            sock = self._context().wrap_socket(sock, server_hostname=self.host)
+        self.sock = sock
+        self.connects += 1
+
+        flags = 0x02  # clean session
+        payload = encodeString(self.client_id)
+        if self.username:
+            flags |= 0x80
+            payload += encodeString(self.username)
+        if self.password:
+            flags |= 0x40
+            payload += encodeString(self.password)
+        body = encodeString("MQTT") + bytes([4, flags]) + struct.pack('>H', self.keepalive) + payload
+        self._send(packet(CONNECT, 0, body))
+
+        kind, _, body = self._read(self.timeout)
+        if kind != CONNACK or len(body) < 2 or body[1] != 0:
+            code = body[1] if kind == CONNACK and len(body) >= 2 else None
+            self.close()
+            raise MqttError("connection refused by the broker, CONNACK code " + str(code))
+
+        if self.reply_topic:
+            pid = self._next_id()
+            self._send(packet(SUBSCRIBE, 0x02, struct.pack('>H', pid) + encodeString(self.reply_topic) + b'\x00'))
+            deadline = time.time() + self.timeout
+            while True:
+                kind, _, body = self._read(max(0.0, deadline - time.time()))
+                if kind is None:
+                    raise MqttError("no SUBACK for " + self.reply_topic)
+                if kind == SUBACK:
+                    if body[2:3] == b'\x80':
+                        raise MqttError("subscription to " + self.reply_topic + " refused")
+                    break
+
+    def _next_id(self):
+        pid = self.packet_id
+        self.packet_id = self.packet_id % 65535 + 1
+        return pid
+
+    def _send(self, data):
+        self.sock.sendall(data)
+        self.last_sent = time.time()
+
+    # one packet (kind, flags, body), (None, None, None) when nothing arrives within 'timeout'
+    def _read(self, timeout):
+        deadline = time.time() + timeout
+        while True:
+            if len(self.buffer) >= 2:
+                n = 0
+                shift = 0
+                i = 1
+                while i < len(self.buffer) and i <= 4:
+                    n |= (self.buffer[i] & 0x7F) << shift
+                    shift += 7
+                    if not self.buffer[i] & 0x80:
+                        break
+                    i += 1
+                if i < len(self.buffer) and not self.buffer[i] & 0x80 and len(self.buffer) >= i + 1 + n:
+                    first = self.buffer[0]
+                    body = self.buffer[i + 1:i + 1 + n]
+                    self.buffer = self.buffer[i + 1 + n:]
+                    return first >> 4, first & 0x0F, body
+            remaining = max(0.0, deadline - time.time())
+            # data already decrypted by the TLS layer does not show up in select
+            pending = self.sock.pending() if isinstance(self.sock, ssl.SSLSocket) else 0
+            if not pending:
+                ready, _, _ = select.select([self.sock], [], [], remaining)
+                if not ready:
+                    return None, None, None
+            chunk = self.sock.recv(65536)
+            if not chunk:
+                raise ConnectionResetError("broker closed the connection")
+            self.buffer += chunk
+
+    def _publish(self, body):
+        length = struct.unpack('>H', body[:2])[0]
+        return body[2:2 + length].decode("utf-8", errors="ignore"), body[2 + length:]
+
+    # drop what arrived since the last request (late replies, retained messages)
+    def drain(self):
+        while self._read(0)[0] is not None:
+            pass
+
+    def request(self, payload, topic=None, correlate='', timeout=None):
+        """
+        Publish one message and return the first reply payload (bytes), None when no reply came in time
+        """
+        if not self.connected():
+            self.connect()
+        elif time.time() - self.last_sent > self.keepalive / 2:
+            self._send(packet(PINGREQ, 0, b''))
+        self.drain()
+
+        self._send(packet(PUBLISH, 0, encodeString(topic or self.topic) + payload))
+        if not self.reply_topic:
+            return None
+
+        want = correlationValue(payload.decode("utf-8", errors="ignore"), correlate) if correlate else None
+        deadline = time.time() + (self.timeout if timeout is None else timeout)
+        while True:
+            kind, flags, body = self._read(max(0.0, deadline - time.time()))
+            if kind is None:
+                return None
+            if kind != PUBLISH:
+                continue
+            _, data = self._publish(body)
+            if (flags >> 1) & 0x03:
+                data = data[2:]  # QoS 1/2 packet identifier
+            if want is not None and correlationValue(data.decode("utf-8", errors="ignore"), correlate) != want:
+                continue
+            return data
@@ -0,0 +1,153 @@
+import getopt
+import json
+import socket
+import ssl
+import struct
+import sys
+import threading
+
+from Mqtt import (CONNACK, CONNECT, DISCONNECT, PINGREQ, PINGRESP, PUBACK, PUBLISH, SUBACK, SUBSCRIBE,
+                  correlationValue, encodeString, packet)
+
+###
+# A local stand-in for the device's MQTT broker, to try the Messenger's 'Transport: mqtt' seeds without a device.
+# Every PUBLISH is answered on the subscribed reply topic with { <correlate>: <value of the request>, "length": n },
+# after a decoy reply with another correlation value, so the Correlate header is exercised too.
+# A QoS 1 PUBLISH is acknowledged (PUBACK) before the replies; QoS 2 is not supported, it is answered like QoS 0.
+# With -c <cert> -k <key> it speaks TLS with ALPN "mqtt" like the eWelink hub on 8883, plain TCP otherwise.
+# --psk <identity>:<hex key> speaks TLS-PSK instead (TLS 1.2, like the client), which needs
+# ssl.SSLContext.set_psk_server_callback (Python 3.13+).
+#   python MqttBroker.py -p 8883 -c cert.pem -k key.pem
+#   (seed headers: IP, Port, Transport: mqtt, Topic, ReplyTopic, Correlate: sequence, TLS: off without -c,
+#    PSKIdentity and PSK with --psk)
+###
+
+connections = 0
+
+
+def readPacket(sock, buffer):
+    """
+    One packet (kind, flags, body, rest of the buffer), kind None when the client closed the connection
+    """
+    while True:
+        if len(buffer) >= 2:
+            n = 0
+            shift = 0
+            i = 1
+            while i < len(buffer) and i <= 4:
+                n |= (buffer[i] & 0x7F) << shift
+                shift += 7
+                if not buffer[i] & 0x80:
+                    break
+                i += 1
+            if i < len(buffer) and not buffer[i] & 0x80 and len(buffer) >= i + 1 + n:
+                return buffer[0] >> 4, buffer[0] & 0x0F, buffer[i + 1:i + 1 + n], buffer[i + 1 + n:]
+        chunk = sock.recv(65536)
+        if not chunk:
+            return None, None, None, b''
+        buffer += chunk
+
+
+def serveClient(sock, correlate):
+    buffer = b''
+    topics = []
+    try:
+        while True:
+            kind, flags, body, buffer = readPacket(sock, buffer)
+            if kind is None or kind == DISCONNECT:
+                return
+            if kind == CONNECT:
+                sock.sendall(packet(CONNACK, 0, b'\x00\x00'))
+            elif kind == SUBSCRIBE:
+                length = struct.unpack('>H', body[2:4])[0]
+                topics.append(body[4:4 + length])
+                sock.sendall(packet(SUBACK, 0, body[:2] + b'\x00'))
+            elif kind == PINGREQ:
+                sock.sendall(packet(PINGRESP, 0, b''))
+            elif kind == PUBLISH:
+                length = struct.unpack('>H', body[:2])[0]
+                data = body[2 + length:]
+                if (flags >> 1) & 0x03:
+                    if (flags >> 1) & 0x03 == 1:
+                        sock.sendall(packet(PUBACK, 0, data[:2]))
+                    data = data[2:]
+                value = correlationValue(data.decode("utf-8", errors="ignore"), correlate) or ""
+                for topic in topics:
+                    decoy = json.dumps({correlate: value + "-other", "length": 0}).encode()
+                    reply = json.dumps({correlate: value, "length": len(data)}).encode()
+                    sock.sendall(packet(PUBLISH, 0, encodeString(topic) + decoy))
+                    sock.sendall(packet(PUBLISH, 0, encodeString(topic) + reply))
+    except OSError:
+        return
+    finally:
+        sock.close()
+
+
+def serve(port, cert='', key='', correlate='sequence', psk_identity='', psk=b''):
+    global connections
+    context = None
+    if cert or psk:
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.set_alpn_protocols(["mqtt"])
+    if cert:
+        context.load_cert_chain(cert, key or None)
+    if psk:
+        if not hasattr(context, "set_psk_server_callback"):
+            print('TLS-PSK needs Python 3.13 or later')
+            sys.exit(2)
+        context.maximum_version = ssl.TLSVersion.TLSv1_2
+        context.set_ciphers("PSK")
+        context.set_psk_server_callback(lambda identity: psk if identity == psk_identity else b'')
+
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    server.bind(('127.0.0.1', port))
+    server.listen(5)
+    print('MQTT stand-in on 127.0.0.1:' + str(server.getsockname()[1]) + (' (TLS)' if context else ''))
+    while True:
+        sock, _ = server.accept()
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        if context is not None:
+            try:
+                sock = context.wrap_socket(sock, server_side=True)
+            except (OSError, ssl.SSLError) as e:
+                print('TLS handshake failed:', e)
+                continue
+        connections += 1
+        print('Connection ' + str(connections))
+        threading.Thread(target=serveClient, args=(sock, correlate), daemon=True).start()
+
+
+def main(argv):
+    port = 1883
+    cert = ''
+    key = ''
+    correlate = 'sequence'
+    psk_identity = ''
+    psk = b''
+    usage = 'MqttBroker.py -p <port> (-c <cert> -k <key> | --psk <identity>:<hex key>) (-r <correlate field>)'
+    try:
+        opts, args = getopt.getopt(argv, "hp:c:k:r:", ["port=", "cert=", "key=", "correlate=", "psk="])
+    except getopt.GetoptError:
+        print(usage)
+        sys.exit(2)
+    for opt, arg in opts:
+        if opt == '-h':
+            print(usage)
+            sys.exit()
+        elif opt in ("-p", "--port"):
+            port = int(arg)
+        elif opt in ("-c", "--cert"):
+            cert = arg
+        elif opt in ("-k", "--key"):
+            key = arg
+        elif opt in ("-r", "--correlate"):
+            correlate = arg
+        elif opt == "--psk":
+            psk_identity, _, hexkey = arg.partition(':')
+            psk = bytes.fromhex(hexkey)
+    serve(port, cert, key, correlate, psk_identity, psk)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
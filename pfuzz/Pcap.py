@@ -0,0 +1,349 @@
+import getopt
+import mmap
+import os
+import socket
+import struct
+import sys
+from collections import OrderedDict
+
+###
+# Seed extraction from pcap / pcapng captures
+# The capture is mmap'ed and walked record by record, TCP flows are reassembled in sequence order and every flow
+# becomes one seed file in the readInputFile format: one message (IP, Port, Content as hex) per client payload,
+# a client payload being the client's bytes between two answers of the server.
+# Memory is bounded by MAX_FLOWS open flows (the oldest is written out first), MAX_MESSAGES messages per flow,
+# MAX_MESSAGE bytes per message and MAX_PENDING out-of-order segments per direction.
+###
+
+MAX_FLOWS = 1024
+MAX_MESSAGES = 64
+MAX_MESSAGE = 65536
+MAX_PENDING = 64
+
+PCAP_MAGIC = {
+    b'\xd4\xc3\xb2\xa1': '<', b'\xa1\xb2\xc3\xd4': '>',  # microsecond timestamps
+    b'\x4d\x3c\xb2\xa1': '<', b'\xa1\xb2\x3c\x4d': '>',  # nanosecond timestamps
+}
+PCAPNG_SHB = 0x0A0D0D0A
+PCAPNG_IDB = 1
+PCAPNG_PB = 2
+PCAPNG_SPB = 3
+PCAPNG_EPB = 6
+
+LINKTYPE_NULL = 0
+LINKTYPE_ETHERNET = 1
+LINKTYPE_RAW = 101
+LINKTYPE_LOOP = 108
+LINKTYPE_LINUX_SLL = 113
+LINKTYPE_IPV4 = 228
+LINKTYPE_IPV6 = 229
+LINKTYPE_LINUX_SLL2 = 276
+
+TCP_FIN = 0x01
+TCP_SYN = 0x02
+TCP_RST = 0x04
+TCP_ACK = 0x10
+
+
+def mapFile(file):
+    f = open(file, 'rb')
+    try:
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (ValueError, OSError):
+        # empty file or a file system without mmap
+        data = f.read()
+    f.close()
+    return data
+
+
+# (linktype, frame) for every packet of a pcap or pcapng file, frame is a memoryview into the mapped file
+def packets(file):
+    data = mapFile(file)
+    view = memoryview(data)
+    try:
+        if bytes(view[:4]) in PCAP_MAGIC:
+            yield from pcapPackets(view)
+        elif len(view) >= 4 and struct.unpack('<I', view[:4])[0] == PCAPNG_SHB:
+            yield from pcapngPackets(view)
+        else:
+            raise ValueError(file + " is neither a pcap nor a pcapng file")
+    finally:
+        try:
+            view.release()
+            if isinstance(data, mmap.mmap):
+                data.close()
+        except BufferError:
+            # a caller still holds a frame, the mapping goes away with it
+            pass
+
+
+def pcapPackets(view):
+    order = PCAP_MAGIC[bytes(view[:4])]
+    linktype = struct.unpack(order + 'I', view[20:24])[0] & 0x0FFFFFFF
+    offset = 24
+    while offset + 16 <= len(view):
+        caplen = struct.unpack(order + 'I', view[offset + 8:offset + 12])[0]
+        offset += 16
+        if offset + caplen > len(view):
+            break
+        yield linktype, view[offset:offset + caplen]
+        offset += caplen
+
+
+def pcapngPackets(view):
+    order = '<'
+    linktypes = []
+    offset = 0
+    while offset + 12 <= len(view):
+        blockType = struct.unpack(order + 'I', view[offset:offset + 4])[0]
+        if blockType == PCAPNG_SHB:
+            # the byte-order magic decides the endianness of this section
+            order = '<' if struct.unpack('<I', view[offset + 8:offset + 12])[0] == 0x1A2B3C4D else '>'
+            linktypes = []
+        blockLen = struct.unpack(order + 'I', view[offset + 4:offset + 8])[0]
+        if blockLen < 12 or offset + blockLen > len(view):
+            break
+        body = view[offset + 8:offset + blockLen - 4]
+
+        if blockType == PCAPNG_IDB:
+            linktypes.append(struct.unpack(order + 'H', body[:2])[0])
+        elif blockType == PCAPNG_EPB:
+            interface, _, _, caplen = struct.unpack(order + 'IIII', body[:16])
+            if interface < len(linktypes):
+                yield linktypes[interface], body[20:20 + caplen]
+        elif blockType == PCAPNG_PB:
+            interface, _, _, _, caplen = struct.unpack(order + 'HHIII', body[:16])
+            if interface < len(linktypes):
+                yield linktypes[interface], body[20:20 + caplen]
+        elif blockType == PCAPNG_SPB and linktypes:
+            yield linktypes[0], body[4:]
+        offset += blockLen
+
+
+# (src, dst, sport, dport, seq, flags, payload) of a TCP segment, None for anything else
+def decodeTCP(linktype, frame):
+    if linktype == LINKTYPE_ETHERNET:
+        if len(frame) < 14:
+            return None
+        ethertype = struct.unpack('>H', frame[12:14])[0]
+        offset = 14
+        while ethertype in (0x8100, 0x88A8) and len(frame) >= offset + 4:
+            ethertype = struct.unpack('>H', frame[offset + 2:offset + 4])[0]
+            offset += 4
+        ip = frame[offset:]
+    elif linktype in (LINKTYPE_NULL, LINKTYPE_LOOP):
+        ip = frame[4:]
+        ethertype = None
+    elif linktype == LINKTYPE_LINUX_SLL:
+        ethertype = struct.unpack('>H', frame[14:16])[0]
+        ip = frame[16:]
+    elif linktype == LINKTYPE_LINUX_SLL2:
+        ethertype = struct.unpack('>H', frame[0:2])[0]
+        ip = frame[20:]
+    elif linktype in (LINKTYPE_RAW, LINKTYPE_IPV4, LINKTYPE_IPV6, 12, 14):
+        ip = frame
+        ethertype = None
+    else:
+        return None
+
+    if len(ip) < 20 or (ethertype is not None and ethertype not in (0x0800, 0x86DD)):
+        return None
+    version = ip[0] >> 4
+    if version == 4:
+        headerLen = (ip[0] & 0x0F) * 4
+        total = struct.unpack('>H', ip[2:4])[0]
+        if ip[9] != 6 or struct.unpack('>H', ip[6:8])[0] & 0x1FFF:
+            return None  # not TCP, or a non-first fragment
+        src = socket.inet_ntop(socket.AF_INET, bytes(ip[12:16]))
+        dst = socket.inet_ntop(socket.AF_INET, bytes(ip[16:20]))
+        tcp = ip[headerLen:total] if total >= headerLen else ip[headerLen:]
+    elif version == 6 and len(ip) >= 40:
+        if ip[6] != 6:
+            return None
+        src = socket.inet_ntop(socket.AF_INET6, bytes(ip[8:24]))
+        dst = socket.inet_ntop(socket.AF_INET6, bytes(ip[24:40]))
+        tcp = ip[40:40 + struct.unpack('>H', ip[4:6])[0]]
+    else:
+        return None
+
+    if len(tcp) < 20:
+        return None
+    sport, dport, seq = struct.unpack('>HHI', tcp[:8])
+    dataOffset = (tcp[12] >> 4) * 4
+    return src, dst, sport, dport, seq, tcp[13], tcp[dataOffset:]
+
+
+###
+# 'Stream' is one direction of a TCP flow, reassembled in sequence order
+# 'Stream' attrs - [ nxt     : next expected sequence number (None before the first segment);
+#                    pending : seq -> payload (bytes) - segments that arrived ahead of a gap ]
+###
+class Stream:
+    def __init__(self) -> None:
+        self.nxt = None
+        self.pending = {}
+        self.closed = False
+
+    # the new in-order bytes a segment brings (retransmitted and overlapping bytes removed)
+    def push(self, seq, payload, syn=False):
+        if syn:
+            self.nxt = (seq + 1) & 0xFFFFFFFF
+        if not payload:
+            return b''
+        if self.nxt is None:
+            self.nxt = seq
+        ahead = (seq - self.nxt) & 0xFFFFFFFF
+        if ahead and ahead < 0x80000000:
+            if len(self.pending) < MAX_PENDING:
+                self.pending[seq] = bytes(payload)
+                return b''
+            # too many holes: give up on the gap
+            self.nxt = seq
+            ahead = 0
+        behind = 0 if not ahead else (self.nxt - seq) & 0xFFFFFFFF
+        if behind >= len(payload):
+            return b''
+        out = bytearray(payload[behind:])
+        self.nxt = (self.nxt + len(out)) & 0xFFFFFFFF
+        while self.nxt in self.pending:
+            chunk = self.pending.pop(self.nxt)
+            out += chunk
+            self.nxt = (self.nxt + len(chunk)) & 0xFFFFFFFF
+        return bytes(out)
+
+
+###
+# 'Flow' is one TCP connection
+# 'Flow' attrs - [ client, server : (ip, port);
+#                  messages       : bytes List - the client payloads completed so far;
+#                  current        : bytearray  - the client payload being collected ]
+###
+class Flow:
+    def __init__(self, client, server) -> None:
+        self.client = client
+        self.server = server
+        self.streams = {client: Stream(), server: Stream()}
+        self.messages = []
+        self.current = bytearray()
+
+    def segment(self, src, seq, flags, payload):
+        data = self.streams[src].push(seq, payload, bool(flags & TCP_SYN))
+        if flags & (TCP_FIN | TCP_RST):
+            self.streams[src].closed = True
+        if not data:
+            return
+        if src == self.client:
+            if len(self.messages) < MAX_MESSAGES:
+                self.current += data[:MAX_MESSAGE - len(self.current)]
+        else:
+            self.endMessage()
+
+    def endMessage(self):
+        if self.current and len(self.messages) < MAX_MESSAGES:
+            self.messages.append(bytes(self.current))
+        self.current = bytearray()
+
+
+def writeSeed(flow, fold, name):
+    flow.endMessage()
+    if not flow.messages:
+        return None
+    file = os.path.join(fold, name + "-" + flow.client[0].replace(':', '.') + "_" + str(flow.client[1]) + "-" +
+                        flow.server[0].replace(':', '.') + "_" + str(flow.server[1]) + ".txt")
+    with open(file, 'w') as f:
+        for i in range(len(flow.messages)):
+            f.write("========Seed " + str(i) + "========\n")
+            f.write("Message Index-" + str(i) + "\n")
+            f.write("IP: " + flow.server[0] + "\n")
+            f.write("Port: " + str(flow.server[1]) + "\n")
+            f.write("Content: " + flow.messages[i].hex() + "\n\n")
+    return file
+
+
+# Convert a capture to seed files in 'fold'; ports: server ports to keep (empty: all), host: keep only the
+# flows with this ip (or ip:port) at either end. Returns the list of files written.
+def extract(file, fold, ports=(), host=''):
+    os.makedirs(fold, exist_ok=True)
+    name = os.path.splitext(os.path.basename(file))[0]
+    flows = OrderedDict()
+    written = []
+
+    def close(key):
+        out = writeSeed(flows.pop(key), fold, name)
+        if out:
+            written.append(out)
+
+    for linktype, frame in packets(file):
+        segment = decodeTCP(linktype, frame)
+        if segment is None:
+            continue
+        src, dst, sport, dport, seq, flags, payload = segment
+        a, b = (src, sport), (dst, dport)
+        if host and not any(host in (end[0], end[0] + ":" + str(end[1])) for end in (a, b)):
+            continue
+        key = (a, b) if a < b else (b, a)
+
+        flow = flows.get(key)
+        if flow is None:
+            if flags & TCP_SYN and not flags & TCP_ACK:
+                client, server = a, b
+            elif flags & TCP_SYN:
+                client, server = b, a
+            elif ports:
+                client, server = (a, b) if dport in ports else (b, a)
+            else:
+                # no handshake seen: the lower port is the service
+                client, server = (a, b) if dport <= sport else (b, a)
+            if ports and server[1] not in ports:
+                continue
+            flow = Flow(client, server)
+            flows[key] = flow
+            if len(flows) > MAX_FLOWS:
+                close(next(iter(flows)))
+        else:
+            flows.move_to_end(key)
+
+        flow.segment(a, seq, flags, payload)
+        if flags & TCP_RST or all(stream.closed for stream in flow.streams.values()):
+            close(key)
+
+    for key in list(flows):
+        close(key)
+    return written
+
+
+def main(argv):
+    capture = ''
+    outputfold = ''
+    ports = set()
+    host = ''
+    usage = 'Pcap.py -p <capture> -o <outputfold> (-P <port,port,...>) (-f <ip>|<ip:port>)'
+    try:
+        opts, args = getopt.getopt(argv, "hp:o:P:f:", ["pcap=", "ofold=", "ports=", "flow="])
+    except getopt.GetoptError:
+        print(usage)
+        sys.exit(2)
+    for opt, arg in opts:
+        if opt == '-h':
+            print(usage)
+            sys.exit()
+        elif opt in ("-p", "--pcap"):
+            capture = arg
+        elif opt in ("-o", "--ofold"):
+            outputfold = arg
+        elif opt in ("-P", "--ports"):
+            ports = set(int(p) for p in arg.split(',') if p.strip())
+        elif opt in ("-f", "--flow"):
+            host = arg
+    if not capture or not outputfold:
+        print(usage)
+        sys.exit(2)
+
+    files = extract(capture, outputfold, ports, host)
+    for file in files:
+        print("Seed written: " + file)
+    print(str(len(files)) + " seed files from " + capture)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
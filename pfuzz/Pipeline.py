@@ -0,0 +1,179 @@
+import queue
+import threading
+import time
+
+from Seed import Seed
+
+# default depth of the queues between the stages (--pipeline <depth>)
+PIPELINE_DEPTH = 32
+
+
+###
+# 'Mutation' is one mutated execution: the i-th message of 'seed' with new content or Tuya frame fields
+# 'Mutation' attrs - [ seed    : Seed           - the seed it was made from (never changed);
+#                      i       : Int            - index of the mutated message;
+#                      op      : String         - operator name, for the operator stats and the coverage map;
+#                      content : String / None  - new Content of the message;
+#                      fields  : String / None  - Tuya frame field overrides, in the 'Frame' header format;
+#                      snippet : [start, end]   - snippet it came from, None if none;
+#                      token   : String / None  - dictionary token it used, credited when it is interesting;
+#                      digest  : String         - Seed.digest() of 'seed' ]
+# mutant() is a copy of the sequence with the mutated message, so mutations can be built ahead of time while
+# the seed itself stays as it is; the copy shares the seed's probe results (PR/PS/PI).
+###
+class Mutation:
+    def __init__(self, seed, i, op, content=None, fields=None, snippet=None, token=None, digest=None) -> None:
+        self.seed = seed
+        self.i = i
+        self.op = op
+        self.content = content
+        self.fields = fields
+        self.snippet = snippet
+        self.token = token
+        self.digest = digest or seed.digest()
+
+    def key(self):
+        return (self.digest, self.i, self.content, repr(self.fields))
+
+    def mutant(self):
+        mutant = Seed()
+        mutant.M = list(self.seed.M)
+        message = self.seed.M[self.i].copy()
+        if self.content is not None:
+            message.set("Content", self.content)
+        if self.fields is not None:
+            message.set("Frame", self.fields)
+        mutant.M[self.i] = message
+        mutant.PR = self.seed.PR
+        mutant.PS = self.seed.PS
+        mutant.PI = self.seed.PI
+        return mutant
+
+
+###
+# 'Pipeline' overlaps the three parts of a mutation: building it, sending it, scoring the response
+#   producer thread : runs the mutation generator (clustering included), drops duplicates, builds the mutants;
+#                     the generator works on seeds it was given and never indexes the queue, whose spill file
+#                     belongs to the caller's thread
+#   caller's thread : sends each mutant through the Messenger (SnippetMutationExecute), so the device, the
+#                     crash handling and the queue stay on one thread
+#   scorer thread   : SnippetMutationClassify (similarity / coverage), the results go back to the caller's
+#                     'finish' between two sends
+# 'todo' and 'scored' hold at most 'depth' mutations, so the producer runs at most 'depth' mutations ahead.
+# 'stalled' is the time the sender waited for the producer, i.e. the device waited on Python.
+###
+class Pipeline:
+    def __init__(self, depth=PIPELINE_DEPTH) -> None:
+        self.depth = depth
+        self.produced = 0
+        self.duplicates = 0
+        self.executed = 0
+        self.stalled = 0.0
+        self.error = None
+
+    # send every mutation of 'jobs' through the Messenger 'm'; finish(mutation, mutant, info, response) ->
+    # (info, continue) is called on this thread for each one; False if any finish said so (an interesting one)
+    def run(self, m, jobs, finish):
+        self.error = None
+        todo = queue.Queue(self.depth)
+        scored = queue.Queue(self.depth)
+        results = queue.Queue()
+        stop = threading.Event()
+
+        def put(q, item):
+            while not stop.is_set():
+                try:
+                    q.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def produce():
+            seen = set()
+            try:
+                for job in jobs:
+                    if stop.is_set():
+                        return
+                    key = job.key()
+                    if key in seen:
+                        self.duplicates += 1
+                        continue
+                    seen.add(key)
+                    self.produced += 1
+                    if not put(todo, (job, job.mutant())):
+                        return
+            except Exception as e:
+                self.error = e
+            finally:
+                put(todo, None)
+
+        def score():
+            while True:
+                item = scored.get()
+                if item is None:
+                    return
+                job, mutant, response, newState = item
+                try:
+                    info = m.SnippetMutationClassify(mutant, job.i, response, newState, job.digest, job.op,
+                                                     job.snippet)
+                except Exception as e:
+                    self.error = e
+                    info = ""
+                results.put((job, mutant, info, response))
+
+        producer = threading.Thread(target=produce, daemon=True)
+        scorer = threading.Thread(target=score, daemon=True)
+        producer.start()
+        scorer.start()
+
+        keep = True
+
+        def drain():
+            nonlocal keep
+            while True:
+                try:
+                    job, mutant, info, response = results.get_nowait()
+                except queue.Empty:
+                    return
+                keep = finish(job, mutant, info, response)[1] and keep
+
+        try:
+            while True:
+                try:
+                    item = todo.get_nowait()
+                except queue.Empty:
+                    waited = time.time()
+                    item = todo.get()
+                    self.stalled += time.time() - waited
+                if item is None:
+                    break
+                job, mutant = item
+                response, newState = m.SnippetMutationExecute(mutant, job.i)
+                self.executed += 1
+                if response in ("#error", "#crash"):
+                    keep = finish(job, mutant, response, response)[1] and keep
+                else:
+                    scored.put((job, mutant, response, newState))
+                drain()
+        finally:
+            stop.set()
+            scored.put(None)
+            scorer.join()
+        drain()
+        if self.error is not None:
+            raise self.error
+        return keep
+
+    def lines(self):
+        return ["Pipeline produced: " + str(self.produced) + " duplicates: " + str(self.duplicates) +
+                " executed: " + str(self.executed) + " stalled: " + str(round(self.stalled, 2)) + "s"]
+
+    def display(self):
+        for line in self.lines():
+            print(line)
+
+    def save(self, file):
+        with open(file, 'w') as f:
+            for line in self.lines():
+                f.write(line + "\n")
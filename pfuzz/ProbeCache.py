@@ -0,0 +1,103 @@
+import hashlib
+import sqlite3
+
+###
+# 'ProbeCache' keeps probe responses on disk (sqlite), across seeds and across runs
+# key   : (target fingerprint, hash of the messages sent before and the headers of the probed message,
+#          hash of the deleted byte's window: WINDOW bytes on either side of it)
+# value : the normalized (stripped) response and its class, the hash of the pool response it was classified with
+# Two seeds whose probed message only differs away from the deleted byte share the entry. Class IDs only mean
+# something inside one seed's response pool, so a hit takes the class whose pool response has the stored hash and
+# is classified by similarity like a fresh response when the pool at hand has no such class.
+# 'limit' bounds the number of entries; the least recently used tenth is evicted when it is exceeded.
+###
+class ProbeCache:
+    # writes between two commits
+    COMMIT_EVERY = 50
+    # bytes kept on either side of the deleted byte in the key
+    WINDOW = 16
+
+    def __init__(self, file, limit=100000) -> None:
+        self.file = file
+        self.limit = limit
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.db = sqlite3.connect(file)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=OFF")
+        self.db.execute("CREATE TABLE IF NOT EXISTS probe (key TEXT PRIMARY KEY, response TEXT, used INTEGER)")
+        # caches written before the class was stored
+        if "class" not in [row[1] for row in self.db.execute("PRAGMA table_info(probe)")]:
+            self.db.execute("ALTER TABLE probe ADD COLUMN class TEXT")
+        self.db.execute("CREATE INDEX IF NOT EXISTS probe_used ON probe (used)")
+        self.count = self.db.execute("SELECT COUNT(*) FROM probe").fetchone()[0]
+        self.clock = self.db.execute("SELECT COALESCE(MAX(used), 0) FROM probe").fetchone()[0]
+
+    # the key of the probe deleting the i-th byte of content
+    @staticmethod
+    def key(target, sequence, content, i):
+        window = content[max(0, i - ProbeCache.WINDOW):i] + "\x00" + content[i + 1:i + 1 + ProbeCache.WINDOW]
+        return target + "|" + sequence + "|" + hashlib.sha1(window.encode("utf-8", errors="ignore")).hexdigest()
+
+    # the class stored with a response: the hash of the pool response it was classified with
+    @staticmethod
+    def classOf(response):
+        return hashlib.sha1((response or "").strip().encode("utf-8", errors="ignore")).hexdigest()[:16]
+
+    # (response, class) or None
+    def get(self, key):
+        row = self.db.execute("SELECT response, class FROM probe WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.clock += 1
+        self.db.execute("UPDATE probe SET used = ? WHERE key = ?", (self.clock, key))
+        self._written()
+        return row[0], row[1]
+
+    def put(self, key, response, cls=None):
+        self.clock += 1
+        try:
+            self.db.execute("INSERT INTO probe (key, response, used, class) VALUES (?, ?, ?, ?)",
+                            (key, response.strip(), self.clock, cls))
+            self.count += 1
+        except sqlite3.IntegrityError:
+            self.db.execute("UPDATE probe SET response = ?, used = ?, class = ? WHERE key = ?",
+                            (response.strip(), self.clock, cls, key))
+        if self.count > self.limit:
+            self.evict()
+        self._written()
+
+    def evict(self):
+        n = self.count - self.limit + max(1, self.limit // 10)
+        self.db.execute("DELETE FROM probe WHERE key IN (SELECT key FROM probe ORDER BY used LIMIT ?)", (n,))
+        self.count = self.db.execute("SELECT COUNT(*) FROM probe").fetchone()[0]
+
+    def _written(self):
+        self.writes += 1
+        if self.writes % self.COMMIT_EVERY == 0:
+            self.db.commit()
+
+    def flush(self):
+        self.db.commit()
+
+    def rate(self):
+        if not self.hits + self.misses:
+            return 0.0
+        return round(self.hits / (self.hits + self.misses) * 100, 2)
+
+    def lines(self):
+        return ["ProbeCache hits: " + str(self.hits) + " misses: " + str(self.misses) +
+                " rate: " + str(self.rate()) + "% entries: " + str(self.count) + "/" + str(self.limit)]
+
+    def display(self):
+        for line in self.lines():
+            print(line)
+
+    def save(self, file):
+        self.flush()
+        with open(file, 'w') as f:
+            for line in self.lines():
+                f.write(line + "\n")
@@ -0,0 +1,214 @@
+import collections
+import hashlib
+import json
+import threading
+import time
+
+from SnR import Messenger
+
+###
+# Seeded campaigns (--seed <N>) and their offline replay (--replay <Executions.jsonl>)
+# 'ExecLog' writes <outputfold>/Executions.jsonl, one JSON record per line:
+#   { seed, argv }                                        : first line, the seed the campaign ran with
+#   { n, key, response, seconds }                         : every message the Messenger sent, key = messageKey()
+#   { seq, stage, digest, index, op, sends, seconds, class (, state) }
+#                                                         : every sent sequence (restore included), 'sends' is the
+#                                                           [first, last + 1) range of its message records and
+#                                                           'class' the result ("#interesting-<i>", "#crash", ...);
+#                                                           a mutation that got to the DPS state check (-S) has
+#                                                           its 'state' (new state or not, null if not queried)
+# 'ReplayMessenger' answers every message with the next response recorded for the same key, in recorded order, so
+# the similarity, clustering and scheduling stages run again on the same workload without the device. A key with
+# no recorded response left repeats its last one ("" if it never had one) and counts as a miss: the replayed
+# campaign went somewhere the recorded one did not. The replay ends after as many sends as were recorded.
+# The state checks and the dry-run times (the distillation cost) are the recorded ones as well.
+###
+
+class ReplayFinished(Exception):
+    pass
+
+
+# the message as written in the seed: the placeholders are not expanded, so the key is the same in every run
+def messageKey(message):
+    raw = json.dumps(message.raw, sort_keys=True, default=str)
+    return hashlib.sha1(raw.encode("utf-8", errors="ignore")).hexdigest()
+
+
+class ExecLog:
+    def __init__(self, file, seed=None, argv=None) -> None:
+        self.file = open(file, 'w', buffering=1)
+        self.lock = threading.Lock()
+        self.sends = 0
+        self.sequences = 0
+        self.interesting = 0
+        self.seconds = 0.0
+        # sends and seconds of the sequence being sent
+        self.first = 0
+        self.open = 0.0
+        # mutations sent but not classified yet: id(sequence) -> record
+        self.pending = {}
+        # seconds of the last sequence closed, e.g. a dry run's for the distillation cost
+        self.lastSeconds = 0.0
+        self._write({"seed": seed, "argv": argv or []})
+
+    def _write(self, record):
+        self.file.write(json.dumps(record) + "\n")
+
+    def send(self, message, response, seconds):
+        with self.lock:
+            self._write({"n": self.sends, "key": messageKey(message), "response": response,
+                         "seconds": round(seconds, 6)})
+            self.sends += 1
+            self.seconds += seconds
+            self.open += seconds
+
+    # close the sequence whose messages were just sent; a result of None waits for classify()
+    def sequence(self, stage, squence, index, result, extra=None):
+        with self.lock:
+            # a mutation gets the digest of the seed it was made from in classify()
+            digest = squence.digest() if result is not None else ""
+            record = {"seq": self.sequences, "stage": stage, "digest": digest, "index": index, "op": "",
+                      "sends": [self.first, self.sends], "seconds": round(self.open, 6)}
+            record.update(extra or {})
+            self.sequences += 1
+            self.first = self.sends
+            self.lastSeconds = self.open
+            self.open = 0.0
+            if result is None:
+                self.pending[id(squence)] = record
+            else:
+                self._finish(record, result)
+
+    # the result of a mutation sequence, with the operator and the digest of the seed it was made from
+    def classify(self, squence, info, op='', digest=None):
+        with self.lock:
+            record = self.pending.pop(id(squence), None)
+            if record is not None:
+                record["op"] = op
+                record["digest"] = digest or squence.digest()
+                self._finish(record, info)
+
+    def _finish(self, record, result):
+        record["class"] = result if isinstance(result, str) and result.startswith("#") else ""
+        if record["class"].startswith("#interesting"):
+            self.interesting += 1
+        self._write(record)
+
+    def close(self):
+        with self.lock:
+            self.file.close()
+
+    def lines(self):
+        return ["Executions sequences: " + str(self.sequences) + " sends: " + str(self.sends) +
+                " interesting: " + str(self.interesting) + " device time: " + str(round(self.seconds, 2)) + "s"]
+
+    def display(self):
+        for line in self.lines():
+            print(line)
+
+    def save(self, file):
+        with open(file, 'w') as f:
+            for line in self.lines():
+                f.write(line + "\n")
+
+
+class ReplayLog:
+    def __init__(self, file) -> None:
+        self.file = file
+        self.seed = None
+        self.argv = []
+        # key -> recorded responses not replayed yet
+        self.responses = collections.defaultdict(collections.deque)
+        self.last = {}
+        self.total = 0
+        self.seconds = 0.0
+        self.sequences = 0
+        self.interesting = 0
+        # digest -> seconds of its successful dry runs, in recorded order
+        self.dryRuns = collections.defaultdict(list)
+        # (seq, state) of the mutations that got to the state check
+        states = []
+        with open(file, 'r') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                if "key" in record:
+                    self.responses[record["key"]].append(record["response"])
+                    self.total += 1
+                    self.seconds += record.get("seconds", 0.0)
+                elif "seq" in record:
+                    self.sequences += 1
+                    if record.get("class", "").startswith("#interesting"):
+                        self.interesting += 1
+                    if record["stage"] == "dryrun" and not record.get("class"):
+                        self.dryRuns[record["digest"]].append(record["seconds"])
+                    if "state" in record:
+                        states.append((record["seq"], record["state"]))
+                elif "seed" in record:
+                    self.seed = record["seed"]
+                    self.argv = record.get("argv", [])
+        # mutations are logged once they are classified, the state checks were made in execution order
+        self.states = collections.deque(state for _, state in sorted(states))
+        self.replayed = 0
+        self.hits = 0
+        self.misses = 0
+        self.started = time.time()
+
+    def next(self, message):
+        if self.replayed >= self.total:
+            raise ReplayFinished()
+        self.replayed += 1
+        key = messageKey(message)
+        recorded = self.responses.get(key)
+        if recorded:
+            self.hits += 1
+            self.last[key] = recorded.popleft()
+            return self.last[key]
+        self.misses += 1
+        return self.last.get(key, "")
+
+    # the result of the next recorded state check
+    def nextState(self):
+        return self.states.popleft() if self.states else None
+
+    # the recorded seconds of the n-th dry run of a seed, None if the recorded campaign had no such dry run
+    def dryRunTime(self, digest, n):
+        times = self.dryRuns.get(digest, [])
+        return times[n] if n < len(times) else None
+
+    def lines(self):
+        return ["Replay of " + self.file + " (seed " + str(self.seed) + ")",
+                "Replay sends: " + str(self.replayed) + "/" + str(self.total) + " hits: " + str(self.hits) +
+                " misses: " + str(self.misses),
+                "Recorded sequences: " + str(self.sequences) + " interesting: " + str(self.interesting),
+                "Recorded device time: " + str(round(self.seconds, 2)) + "s replay time: " +
+                str(round(time.time() - self.started, 2)) + "s"]
+
+    def display(self):
+        for line in self.lines():
+            print(line)
+
+    def save(self, file):
+        with open(file, 'w') as f:
+            for line in self.lines():
+                f.write(line + "\n")
+
+
+###
+# 'ReplayMessenger' is a Messenger without a device: no Tuya session, no sockets, no state queries; the sends and
+# the state checks are answered from 'ReplayMessenger.log'
+###
+class ReplayMessenger(Messenger):
+    log = None
+
+    def __init__(self, restoreSeed):
+        super().__init__(None)
+        self.restoreSeed = restoreSeed
+        self.restore = restoreSeed
+
+    def _send_message(self, message, retry=0):
+        return ReplayMessenger.log.next(message)
+
+    def _state_check(self):
+        return ReplayMessenger.log.nextState()
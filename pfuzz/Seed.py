@@ -1,3 +1,9 @@
+import hashlib
+
+# headers that name one physical device rather than the protocol, left out of the digest so identical
+# device models share seeds
+TARGET_HEADERS = ["DevID", "Address", "LocalKey", "IP"]
+
 ###
 # 'Seed' is used to store the seeds for fuzzing process
 # 'Seed' attrs - [ M : Message List (Class 'Message')   - to store the list of messages;
@@ -36,6 +42,40 @@ class Seed:
     def response(self, response):
         self.R.append(response)
 
+    # a new seed with copies of the messages, without responses or probe results
+    def copy(self):
+        seed = Seed()
+        for message in self.M:
+            seed.append(message.copy())
+        return seed
+
+    # content hash of the message sequence (headers and their contents, device identity excluded)
+    def digest(self):
+        h = hashlib.sha1()
+        for message in self.M:
+            for header in message.headers:
+                if header in TARGET_HEADERS:
+                    continue
+                h.update((header + ":" + message.raw[header].strip() + "\n").encode("utf-8", errors="ignore"))
+            h.update(b"========\n")
+        return h.hexdigest()
+
+    # point every message at the device of the given message (e.g. the first message of a restore seed)
+    def retarget(self, message):
+        for m in self.M:
+            for header in TARGET_HEADERS:
+                if header in m.raw and header in message.raw:
+                    m.raw[header] = message.raw[header]
+
+    # the device the seed talks to: DevID for Tuya seeds, IP:Port for socket seeds
+    def target(self):
+        for message in self.M:
+            if "DevID" in message.raw:
+                return message.raw["DevID"].strip()
+            if "IP" in message.raw and "Port" in message.raw:
+                return message.raw["IP"].strip() + ":" + message.raw["Port"].strip()
+        return ""
+
     def display(self):
         for i in range(0, len(self.M)):
             print("Message index: ", i + 1)
@@ -67,6 +107,24 @@ class Message:
         self.headers = []
         self.raw = {}
 
+    def copy(self):
+        message = Message()
+        message.headers = list(self.headers)
+        message.raw = dict(self.raw)
+        return message
+
+    # set a header, adding it to 'headers' when the message has none yet, so that the record files, the crash
+    # outputs and Seed.digest() see it
+    def set(self, header, value) -> None:
+        if header not in self.headers:
+            self.headers.append(header)
+        self.raw[header] = value
+
+    def remove(self, header) -> None:
+        if header in self.headers:
+            self.headers.remove(header)
+        self.raw.pop(header, None)
+
     def append(self, line) -> None:
         if ":" in line:
             sp = line.split(":")
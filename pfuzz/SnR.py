@@ -1,6 +1,16 @@
+import hashlib
+import ipaddress
+import json
+import select
 import socket
+import time
 import tinytuya
 
+import Mqtt
+import TlsHello
+import TuyaFrame
+from Template import expand
+
 # ============================================
 #  Edit distance & similarity
 # ============================================
@@ -44,10 +54,37 @@ def SimilarityScore(str1, str2):
 #  Messenger：负责真正发包
 # ============================================
 
+# UDP（Transport: udp）：发出后最多等 UDP_WINDOW 秒收回包（可用 Window 头覆盖），
+# 收到第一个数据报后，UDP_GAP 秒内没有新的数据报就提前结束；Replies 头给出回包个数时收够就结束
+UDP_WINDOW = 0.3
+UDP_GAP = 0.05
+# TLS（Transport: tls）：等 alert / ServerHello 的默认秒数（可用 Timeout 头覆盖）
+TLS_TIMEOUT = 1.0
+
 class Messenger:
-    # 共享一个 TinyTuya 设备，避免频繁重连
+    # 共享一个 TinyTuya 设备 / 原生 TuyaSession，避免频繁重连
     shared_tuya_device = None
-    shared_tuya_fingerprint = None  # (dev_id, address, local_key, version)
+    shared_tuya_fingerprint = None  # (dev_id, address, local_key, version, transport)
+    # Liveness.LivenessMonitor（Snipuzz -l / --heartbeat 时设置）：超时后用它区分设备挂了还是只是慢
+    monitor = None
+    # Coverage.CoverageMap（Snipuzz 设置）：有它时 SnippetMutationSend 用它判断是否出现了新的响应类
+    coverage = None
+
+    # 设备状态反馈（Snipuzz -S <N>）：每 N 次变异执行后、restore 之前查一次 DPS，
+    # DPS 组合（去掉 state_ignore 里的 DP）的哈希没见过 => 也算 interesting
+    state_every = 0
+    state_ignore = set()
+    state_seen = set()
+    state_execs = 0
+    state_queries = 0
+
+    # UDP：每个目标 (ip, port) 一个复用的非阻塞 socket
+    udp_sockets = {}
+    # MQTT：每组 (ip, port, client id, topic, reply topic, ...) 一个常驻的 Mqtt.MqttSession（TLS 会话跨执行复用）
+    mqtt_sessions = {}
+
+    # Replay.ExecLog（Snipuzz --seed / --replay 时设置）：记录每条消息和每个序列，供离线重放
+    execLog = None
 
     def __init__(self, restoreSeed):
         """
@@ -62,10 +99,16 @@ class Messenger:
         self.tuya_local_key = None
         self.tuya_version = 3.4
         self.tuya_device = None
+        self.tuya_port = 6668
+        # "tuya"：pfuzz 自己的 TuyaFrame 编解码（默认）；"tinytuya"：旧的 tinytuya 发包
+        self.tuya_transport = "tuya"
 
         # ⭐ 默认 cmd（可以被种子里的 Cmd 覆盖）
         self.default_cmd = 13
 
+        # SnippetMutationSend 拿到的原始响应（用于统计各变异算子的有效响应率）
+        self.lastResponse = ""
+
         # 如果 restoreSeed 里有 DevID / LocalKey，则初始化 TinyTuya
         if restoreSeed and getattr(restoreSeed, "M", None) and restoreSeed.M:
             cfg = restoreSeed.M[0].raw
@@ -85,12 +128,22 @@ class Messenger:
                     except ValueError:
                         self.default_cmd = 13
 
+                if "Port" in cfg:
+                    self.tuya_port = int(str(cfg["Port"]).strip())
+
+                self.tuya_transport = str(cfg.get("Transport", "tuya")).strip().lower()
+                if self.tuya_transport == "tuya" and not TuyaFrame.available():
+                    print("No AES backend for TuyaFrame, falling back to tinytuya.")
+                    self.tuya_transport = "tinytuya"
+
                 self._init_tuya_device()
 
     def _tuya_fingerprint(self):
-        return (self.tuya_dev_id, self.tuya_address, self.tuya_local_key, self.tuya_version)
+        return (self.tuya_dev_id, self.tuya_address, self.tuya_local_key, self.tuya_version, self.tuya_transport)
 
     def _invalidate_shared_tuya(self):
+        if isinstance(Messenger.shared_tuya_device, TuyaFrame.TuyaSession):
+            Messenger.shared_tuya_device.close()
         Messenger.shared_tuya_device = None
         Messenger.shared_tuya_fingerprint = None
         self.tuya_device = None
@@ -108,13 +161,23 @@ class Messenger:
             self.tuya_device = Messenger.shared_tuya_device
             return
 
-        print("[Messenger] Init TinyTuya device:", self.tuya_dev_id, self.tuya_address)
-        device = tinytuya.Device(
-            dev_id=self.tuya_dev_id,
-            address=self.tuya_address,
-            local_key=self.tuya_local_key,
-            version=self.tuya_version
-        )
+        if self.tuya_transport == "tuya":
+            print("[Messenger] Init Tuya session:", self.tuya_dev_id, self.tuya_address)
+            device = TuyaFrame.TuyaSession(
+                dev_id=self.tuya_dev_id,
+                address=self.tuya_address,
+                local_key=self.tuya_local_key,
+                version=self.tuya_version,
+                port=self.tuya_port
+            )
+        else:
+            print("[Messenger] Init TinyTuya device:", self.tuya_dev_id, self.tuya_address)
+            device = tinytuya.Device(
+                dev_id=self.tuya_dev_id,
+                address=self.tuya_address,
+                local_key=self.tuya_local_key,
+                version=self.tuya_version
+            )
         Messenger.shared_tuya_device = device
         Messenger.shared_tuya_fingerprint = fp
         self.tuya_device = device
@@ -131,16 +194,16 @@ class Messenger:
         for message in squence.M:
             response = self.sendMessage(message)
             if response in ("#error", "#crash"):
-                return response
+                return self._sequence("dryrun", squence, -1, response)
             squence.R.append(response)
 
         if self.restore and getattr(self.restore, "M", None):
             for message in self.restore.M:
                 response = self.sendMessage(message)
                 if response in ("#error", "#crash"):
-                    return response
+                    return self._sequence("dryrun", squence, -1, response)
 
-        return squence
+        return self._sequence("dryrun", squence, -1, squence)
 
     # ---------------------------------------------------------
     #  Snipuzz 调用：Probe 阶段
@@ -154,7 +217,7 @@ class Messenger:
         for i in range(len(squence.M)):
             response = self.sendMessage(squence.M[i])
             if response in ("#error", "#crash"):
-                return response
+                return self._sequence("probe", squence, index, response)
             if i == index:
                 res = response
 
@@ -162,35 +225,76 @@ class Messenger:
             for i in range(len(self.restore.M)):
                 restoreResponse = self.sendMessage(self.restore.M[i])
                 if restoreResponse in ("#error", "#crash"):
-                    return restoreResponse
+                    return self._sequence("probe", squence, index, restoreResponse)
 
-        return res
+        return self._sequence("probe", squence, index, res)
 
     # ---------------------------------------------------------
     #  Snipuzz 调用：SnippetMutate 阶段
     # ---------------------------------------------------------
-    def SnippetMutationSend(self, squence, index):
+    def SnippetMutationSend(self, squence, index, digest=None, op='', snippet=None):
         """
         SnippetMutate 阶段发送序列，并根据响应与 PR/PS 判断是否 #interesting
+        digest：变异前种子的 Seed.digest()；给了且有 coverage 时，由覆盖表判断新类并记录命中次数
+        """
+        res, newState = self.SnippetMutationExecute(squence, index)
+        if res in ("#error", "#crash"):
+            return res
+        return self.SnippetMutationClassify(squence, index, res, newState, digest, op, snippet)
+
+    def SnippetMutationExecute(self, squence, index):
+        """
+        只发包：发送序列（+ 状态查询）+ restore，返回 (第 index 条的响应, 是否出现新的 DPS 状态)；
+        出错 / 设备挂了 => ("#error" / "#crash", False)
         """
         res = ""
+        self.lastResponse = ""
         for i in range(len(squence.M)):
             response = self.sendMessage(squence.M[i])
             if response in ("#error", "#crash"):
-                return response
+                self._sequence("mutation", squence, index, None)
+                return response, False
             if i == index:
                 res = response
 
+        # 状态要在 restore 把设备复位之前查
+        newState = self._state_check()
+
         if self.restore and getattr(self.restore, "M", None):
             for i in range(len(self.restore.M)):
                 restoreResponse = self.sendMessage(self.restore.M[i])
                 if restoreResponse in ("#error", "#crash"):
-                    return restoreResponse
+                    self._sequence("mutation", squence, index, None, {"state": newState})
+                    return restoreResponse, False
+
+        self._sequence("mutation", squence, index, None, {"state": newState})
+        self.lastResponse = res
+        return res, bool(newState)
+
+    def _sequence(self, stage, squence, index, result, extra=None):
+        """
+        execLog：刚发完的序列记一条；result 为 None 的（变异）等 Snipuzz 判断完再补上类别。原样返回 result
+        extra：记录里附带的字段，例如走到状态查询的变异执行的 {"state": _state_check() 的结果}，replay 按顺序给回
+        """
+        if Messenger.execLog is not None:
+            Messenger.execLog.sequence(stage, squence, index, result, extra)
+        return result
+
+    def SnippetMutationClassify(self, squence, index, res, newState=False, digest=None, op='', snippet=None):
+        """
+        只判断：不碰设备，可以在别的线程里跑（Pipeline 的打分阶段）；返回 "#interesting-<index>" 或 ""
+        """
+        if newState:
+            return "#interesting-" + str(index)
 
         # ✅ 方案A：空响应直接忽略，不算 interesting
         if (res or "").strip() == "":
             return ""
 
+        if Messenger.coverage is not None and digest is not None:
+            _, novel = Messenger.coverage.record(digest, squence, index, res, op, snippet)
+            return "#interesting-" + str(index) if novel else ""
+
         pool = squence.PR[index]
         scores = squence.PS[index]
 
@@ -200,15 +304,324 @@ class Messenger:
                 return ""
         return "#interesting-" + str(index)
 
+    # ---------------------------------------------------------
+    #  设备状态反馈
+    # ---------------------------------------------------------
+    def _query_state(self):
+        """当前设备的 DPS 字典；查询失败 => None（不影响发包流程）"""
+        try:
+            if isinstance(self.tuya_device, TuyaFrame.TuyaSession):
+                return self.tuya_device.status()
+            data = self.tuya_device.status()
+            if isinstance(data, dict) and isinstance(data.get("dps"), dict):
+                return data["dps"]
+        except (OSError, TuyaFrame.TuyaAuthError) as e:
+            print("State query error:", e)
+            if isinstance(self.tuya_device, TuyaFrame.TuyaSession):
+                self.tuya_device.close()
+        except Exception as e:
+            print("State query error:", e)
+        return None
+
+    def _state_check(self):
+        """每 state_every 次变异执行查一次 DPS；返回是否出现新的 DPS 状态，这次不查 => None"""
+        if Messenger.state_every > 0 and self.tuya_device is not None:
+            Messenger.state_execs += 1
+            if Messenger.state_execs % Messenger.state_every == 0:
+                return self._state_feedback()
+        return None
+
+    def _state_feedback(self):
+        """查一次 DPS 并记入状态集合；第一次看到的状态只作为基线，不算新"""
+        dps = self._query_state()
+        if dps is None:
+            return False
+        Messenger.state_queries += 1
+        state = {k: v for k, v in dps.items() if str(k) not in Messenger.state_ignore}
+        digest = hashlib.sha1(json.dumps(state, sort_keys=True, default=str).encode()).hexdigest()
+        if digest in Messenger.state_seen:
+            return False
+        baseline = not Messenger.state_seen
+        Messenger.state_seen.add(digest)
+        if not baseline:
+            print("~~New device state:", state)
+        return not baseline
+
+    def _target_down(self):
+        """发送失败/超时后询问存活监控：设备已挂 => True，不再白白重试"""
+        return Messenger.monitor is not None and Messenger.monitor.settle()
+
+    # ---------------------------------------------------------
+    #  原生 Tuya 帧：会话密钥跨发送保留，只有认证失败/断线才重新协商
+    # ---------------------------------------------------------
+    def _send_native(self, message, cmd, json_str, retry):
+        MAX_RETRY = 3
+        session = self.tuya_device
+
+        fields = None
+        if message.raw.get("Frame", "").strip():
+            try:
+                fields = TuyaFrame.parseFields(message.raw["Frame"])
+            except ValueError:
+                print("Frame header parse error:", message.raw["Frame"])
+                return "#error"
+
+        try:
+            resp = session.request(cmd, json_str.encode("utf-8", errors="ignore"), fields)
+        except TuyaFrame.TuyaAuthError as e:
+            # 认证失败：丢掉会话密钥，下次发送时重新协商
+            print("Tuya auth error:", e)
+            session.close()
+            if self._target_down():
+                return "#crash"
+            if retry < MAX_RETRY:
+                return self._send_native(message, cmd, json_str, retry + 1)
+            return "#error"
+        except OSError as e:
+            # 连接断开：只重连这一条 socket，不重建设备
+            print("Tuya socket error:", e)
+            session.close()
+            if self._target_down():
+                return "#crash"
+            if retry < MAX_RETRY:
+                return self._send_native(message, cmd, json_str, retry + 1)
+            return "#error"
+
+        # ✅ 方案A：无回包/丢包 => ""（允许重试）
+        if resp is None:
+            if self._target_down():
+                return "#crash"
+            if retry < MAX_RETRY:
+                return self._send_native(message, cmd, json_str, retry + 1)
+            return ""
+        return resp
+
+    # ---------------------------------------------------------
+    #  UDP：无连接，复用 socket，在有限窗口内收集多个回包
+    # ---------------------------------------------------------
+    def _udp_socket(self, ip, port):
+        key = (ip, port)
+        sock = Messenger.udp_sockets.get(key)
+        if sock is None:
+            family = socket.AF_INET6 if ":" in ip else socket.AF_INET
+            sock = socket.socket(family, socket.SOCK_DGRAM)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+            sock.setblocking(False)
+            Messenger.udp_sockets[key] = sock
+        return sock
+
+    def _send_udp(self, message, ip, port, payload):
+        """
+        返回：窗口内收到的所有数据报（hex，空格分隔）；没有回包 => ""（UDP 不重试）
+        广播 / 组播目标（如 SSDP 239.255.255.250）接受任意来源的回包，其余只收目标自己的
+        """
+        try:
+            window = float(str(message.raw.get("Window", UDP_WINDOW)).strip())
+        except ValueError:
+            window = UDP_WINDOW
+        try:
+            expected = int(str(message.raw.get("Replies", "0")).strip())
+        except ValueError:
+            expected = 0
+        try:
+            addr = ipaddress.ip_address(ip)
+            anySource = addr.is_multicast or ip.endswith(".255")
+        except ValueError:
+            anySource = False
+
+        sock = self._udp_socket(ip, port)
+        # 丢掉上一次执行迟到的回包
+        try:
+            while True:
+                sock.recvfrom(65535)
+        except (BlockingIOError, InterruptedError):
+            pass
+        except OSError:
+            pass
+
+        try:
+            sock.sendto(payload, (ip, port))
+        except OSError as e:
+            print("UDP error:", e)
+            sock.close()
+            Messenger.udp_sockets.pop((ip, port), None)
+            if self._target_down():
+                return "#crash"
+            return "#error"
+
+        replies = []
+        deadline = time.time() + window
+        while True:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            ready, _, _ = select.select([sock], [], [], min(remaining, UDP_GAP) if replies else remaining)
+            if not ready:
+                if replies:
+                    break
+                continue
+            try:
+                data, source = sock.recvfrom(65535)
+            except (BlockingIOError, InterruptedError):
+                continue
+            except OSError as e:
+                # ICMP port unreachable 等
+                print("UDP error:", e)
+                break
+            if anySource or source[0] == ip:
+                replies.append(data.hex())
+                if len(replies) == expected:
+                    break
+
+        if not replies and self._target_down():
+            return "#crash"
+        return " ".join(replies)
+
+    # ---------------------------------------------------------
+    #  MQTT（over TLS）：常驻连接，Content 发到 Topic，从 ReplyTopic 收回包
+    # ---------------------------------------------------------
+    def _mqtt_session(self, message, ip, port):
+        raw = message.raw
+        cfg = {k: str(raw.get(k, "")).strip() for k in
+               ("ClientID", "Topic", "ReplyTopic", "Username", "Password", "PSKIdentity", "PSK", "TLS", "Timeout")}
+        key = (ip, port) + tuple(sorted(cfg.items()))
+        session = Messenger.mqtt_sessions.get(key)
+        if session is None:
+            session = Mqtt.MqttSession(
+                host=ip,
+                port=port,
+                client_id=cfg["ClientID"] or "pfuzz",
+                topic=cfg["Topic"],
+                reply_topic=cfg["ReplyTopic"],
+                username=cfg["Username"],
+                password=cfg["Password"],
+                use_tls=cfg["TLS"].lower() not in ("off", "no", "0", "false"),
+                psk_identity=cfg["PSKIdentity"],
+                psk=bytes.fromhex(cfg["PSK"]) if cfg["PSK"] else b'',
+                timeout=float(cfg["Timeout"] or 2.0)
+            )
+            Messenger.mqtt_sessions[key] = session
+        return session
+
+    def _send_mqtt(self, message, ip, port, retry):
+        """
+        返回：ReplyTopic 上第一条（Correlate 字段相同的）回包；超时 => ""（不重试）
+        连接 / TLS 出错才重连重试
+        """
+        MAX_RETRY = 3
+        try:
+            session = self._mqtt_session(message, ip, port)
+        except ValueError as e:
+            print("MQTT header error:", e)
+            return "#error"
+
+        payload = expand(str(message.raw.get("Content", ""))).strip().encode("utf-8", errors="ignore")
+        try:
+            resp = session.request(payload, correlate=str(message.raw.get("Correlate", "")).strip())
+        except (OSError, Mqtt.MqttError) as e:
+            # ssl.SSLError 也是 OSError
+            print("MQTT error:", e)
+            session.close()
+            if self._target_down():
+                return "#crash"
+            if retry < MAX_RETRY:
+                return self._send_mqtt(message, ip, port, retry + 1)
+            return "#error"
+
+        if resp is None:
+            if self._target_down():
+                return "#crash"
+            return ""
+        return resp.decode("utf-8", errors="ignore")
+
+    # ---------------------------------------------------------
+    #  TLS（Transport: tls）：Content 是 hex 的 ClientHello，每次执行新建连接，
+    #  回包按 alert 码 / ServerHello 选中的 cipher 归类（TlsHello.TlsRecordReader）
+    # ---------------------------------------------------------
+    def _send_tls(self, message, ip, port, payload, retry):
+        """
+        返回："alert:<level>:<description>" / "serverhello:<cipher>" / "other:<record type>"；
+        Timeout 头（默认 TLS_TIMEOUT 秒）内没有回包 => ""；连接出错才重试
+        """
+        MAX_RETRY = 3
+        try:
+            timeout = float(str(message.raw.get("Timeout", TLS_TIMEOUT)).strip())
+        except ValueError:
+            timeout = TLS_TIMEOUT
+
+        sock = None
+        try:
+            sock = socket.create_connection((ip, port), timeout=timeout)
+            sock.sendall(payload)
+            records = TlsHello.TlsRecordReader()
+            deadline = time.time() + timeout
+            # ServerHello 或 alert 一到就能归类，不用等到超时
+            while records.server_hello is None and not records.done:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                sock.settimeout(remaining)
+                try:
+                    chunk = sock.recv(16384)
+                except socket.timeout:
+                    break
+                except ConnectionResetError:
+                    # 收到 ClientHello 直接 RST 也是一种回应
+                    if records.first_type is None:
+                        return "reset"
+                    break
+                if not chunk:
+                    if records.first_type is None:
+                        return "closed"
+                    break
+                records.feed(chunk)
+            if records.alert is not None:
+                return "alert:%d:%d" % records.alert
+            if records.server_hello is not None:
+                return "serverhello:%04x" % records.server_hello[1]
+            if records.first_type is None:
+                if self._target_down():
+                    return "#crash"
+                return ""
+            return "other:%02x" % records.first_type
+        except OSError as e:
+            print("TLS error:", e)
+            if self._target_down():
+                return "#crash"
+            if retry < MAX_RETRY:
+                return self._send_tls(message, ip, port, payload, retry + 1)
+            return "#error"
+        finally:
+            if sock is not None:
+                try:
+                    sock.close()
+                except OSError:
+                    pass
+
     # ---------------------------------------------------------
     #  关键：真正发包的函数（JSON/TinyTuya + Hex/Socket）
     # ---------------------------------------------------------
     def sendMessage(self, message, retry=0):
+        """
+        发一条消息；有 execLog（Snipuzz --seed / --replay）时记下它的响应和耗时
+        """
+        if Messenger.execLog is None:
+            return self._send_message(message, retry)
+        start = time.time()
+        response = self._send_message(message, retry)
+        Messenger.execLog.send(message, response, time.time() - start)
+        return response
+
+    def _send_message(self, message, retry=0):
         """
         方案A：timeout / 无回包 => 返回 ""（空串）
         """
         MAX_RETRY = 3
 
+        # 监控已判定设备挂了：不用再发
+        if Messenger.monitor is not None and Messenger.monitor.down():
+            return "#crash"
+
         # 兼容：raw 有字段但 headers 不包含
         has_tuya_hint = (
             ("DevID" in getattr(message, "headers", {})) or
@@ -255,10 +668,13 @@ class Messenger:
             else:
                 cmd = self.default_cmd
 
-            json_str = (message.raw.get("Content", "") or "").strip()
+            json_str = expand(message.raw.get("Content", "") or "").strip()
             if not json_str:
                 return ""
 
+            if isinstance(self.tuya_device, TuyaFrame.TuyaSession):
+                return self._send_native(message, cmd, json_str, retry)
+
             try:
                 payload = tinytuya.MessagePayload(
                     cmd=cmd,
@@ -269,8 +685,10 @@ class Messenger:
 
                 # ✅ 方案A：无回包/丢包 => ""（允许重试）
                 if resp is None:
+                    if self._target_down():
+                        return "#crash"
                     if retry < MAX_RETRY:
-                        return self.sendMessage(message, retry + 1)
+                        return self._send_message(message, retry + 1)
                     return ""
 
                 return str(resp)
@@ -278,17 +696,23 @@ class Messenger:
             except Exception as e:
                 # 这里大多是协议/解密/网络异常，视为 error（避免误判 crash）
                 print("TinyTuya error:", e)
+                if self._target_down():
+                    return "#crash"
                 if retry < MAX_RETRY:
                     self._invalidate_shared_tuya()
                     self._init_tuya_device()
-                    return self.sendMessage(message, retry + 1)
+                    return self._send_message(message, retry + 1)
                 return "#error"
 
         # =============== 分支 2：IP + Port + hex socket 模式 ===================
         if ("IP" in getattr(message, "headers", {})) and ("Port" in getattr(message, "headers", {})):
             ip = str(message.raw["IP"]).strip()
             port = int(message.raw["Port"])
-            hex_str = str(message.raw.get("Content", "")).strip().replace(" ", "")
+
+            # MQTT 的 Content 是文本（一般是 JSON），不是 hex
+            if str(message.raw.get("Transport", "")).strip().lower() == "mqtt":
+                return self._send_mqtt(message, ip, port, retry)
+            hex_str = expand(str(message.raw.get("Content", ""))).strip().replace(" ", "")
             print(hex_str)
 
             try:
@@ -297,6 +721,11 @@ class Messenger:
                 print("Hex parse error in Content:", hex_str)
                 return "#error"
 
+            if str(message.raw.get("Transport", "")).strip().lower() == "udp":
+                return self._send_udp(message, ip, port, payload)
+            if TlsHello.isTls(message):
+                return self._send_tls(message, ip, port, payload, retry)
+
             sock = None
             try:
                 sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
@@ -308,8 +737,10 @@ class Messenger:
                     resp_bytes = sock.recv(2048)
                 except socket.timeout:
                     # ✅ 方案A：timeout => ""（允许重试）
+                    if self._target_down():
+                        return "#crash"
                     if retry < MAX_RETRY:
-                        return self.sendMessage(message, retry + 1)
+                        return self._send_message(message, retry + 1)
                     return ""
 
                 if not resp_bytes:
@@ -318,11 +749,15 @@ class Messenger:
                 return resp_bytes.hex()
 
             except socket.timeout:
+                if self._target_down():
+                    return "#crash"
                 if retry < MAX_RETRY:
-                    return self.sendMessage(message, retry + 1)
+                    return self._send_message(message, retry + 1)
                 return ""
             except Exception as e:
                 print("Socket error:", e)
+                if self._target_down():
+                    return "#crash"
                 return "#error"
             finally:
                 if sock is not None:
@@ -1,23 +1,141 @@
 import getopt
+import hashlib
+import heapq
+import io
+import itertools
+import json
+import multiprocessing
 import os
 import sys
 import time
 import random
+import re
+import socket
+import statistics
 
 import pandas as pd
 from scipy.cluster import hierarchy
 
 sys.path.append(r'..')
 
+from Coordinator import Coordinator
+from Coverage import CoverageMap
+from Distill import distill
+from Liveness import LivenessMonitor
+from Pipeline import PIPELINE_DEPTH, Mutation, Pipeline
+from ProbeCache import ProbeCache
+from Replay import ExecLog, ReplayFinished, ReplayLog, ReplayMessenger
 from SnR import Messenger
+from SpillQueue import SpillQueue
 from Seed import Message, Seed
+from Sync import SyncDir
+from Dictionary import getDictionary, loadDictionaries, saveDictionaries
+from JsonMutate import OperatorStats, randomMutation, structuralMutations
+import Template
+from Template import clip, overlaps, protectedSpans
+import TlsHello
+from TuyaFrame import SESS_KEY_NEG_FINISH, SESS_KEY_NEG_RESP, SESS_KEY_NEG_START, TuyaSession, randomFields
 
 
+# score written right after the response, without a line break, in the older records
+LEGACY_SCORE = re.compile(r'^(.*?)(\d{1,3}\.\d+)\s*$')
+
 # Golbal var
-queue = []
+queue = SpillQueue()
 restoreSeed = ''
 outputfold = ''
 
+# interesting seeds waiting to be probed, drained between mutation rounds:
+# heap of (bytes to probe, tick, seed, parent seed, index of the mutated message), and the digests in it
+pending = []
+pendingDigests = set()
+pendingTick = itertools.count()
+
+# -d <rounds>: distill the queue every <rounds> Havoc rounds; seeds whose response classes other seeds
+# already cover are retired from scheduling, appended to Retired.txt as they go (only their digests stay in memory)
+distillEvery = 0
+retiredDigests = set()
+retiredCount = 0
+# seconds the dry runs (sequence and restore) of a seed took, by digest; the distillation cost takes their median.
+# With an execution log they are the logged times, and a replay takes the recorded ones instead of its own
+sendTime = {}
+
+# seconds between the two sends of a probe
+pace = 1
+
+# multi-target mode (-t <targetfile>): the shared coordinator and this worker's device model and name
+targetfile = ''
+coordinator = None
+model = ''
+workerName = ''
+pulled = 0
+# Havoc rounds between two pulls from the coordinator
+PULL_EVERY = 10
+
+# directory sync with other instances (-s <syncdir> -n <instance>); seeds of the same model (-m <model>,
+# default the 'Model' header of the restore seed) are imported without probing them again
+syncdir = ''
+instanceName = ''
+sync = None
+lastSync = 0
+SYNC_EVERY = 60
+
+# how many of the best ranked dictionary tokens SnippetMutate tries on every snippet
+DICT_TOP = 12
+
+# JSON structure-aware mode (-j <ratio>): the ratio is the share of structural mutations sent as broken JSON
+jsonMode = False
+jsonInvalidRatio = 0.1
+operatorStats = OperatorStats()
+
+# response classes hit per (seed, message): novelty for SnippetMutationSend, rarity for Havoc's seed pick
+coverage = CoverageMap()
+Messenger.coverage = coverage
+
+# -P: let Probe and the mutation operators touch the template placeholders ({{epoch}}, ...) too
+mutateProtected = False
+
+# -F: Havoc also mutates the Tuya frame fields (cmd, seqno, length, checksum)
+frameMode = False
+
+# -x <budget>: sends per seed message of the Cmd exploration stage (0 skips the stage), over command IDs 0..CMD_SPACE-1
+cmdBudget = 0
+CMD_SPACE = 256
+# the session key negotiation would tear down the session the sweep runs in
+CMD_SKIP = [SESS_KEY_NEG_START, SESS_KEY_NEG_RESP, SESS_KEY_NEG_FINISH]
+
+# --memory <MB>: memory budget of the queue, cold seeds beyond it are spilled to <outputfold>/Queue.db
+memoryBudget = 0
+
+# -S <N>: query the Tuya DPS state after every N-th mutated sequence, a new DPS combination is interesting;
+# --state-ignore <id,id,...> leaves out DPs that change on their own (timers, counters, power readings)
+# (the settings live on the Messenger class)
+
+# on-disk probe response cache (<outputfold>/ProbeCache.db), --cache <entries> bounds it, 0 turns it off
+probeCache = None
+cacheLimit = 100000
+
+# --pipeline <depth>: build the next mutations and score the last responses on other threads while the
+# device is busy (Pipeline.py); a Havoc round is then a batch of PIPELINE_HAVOC mutations
+pipeline = None
+PIPELINE_HAVOC = 64
+
+# -l <interval>: check the target every <interval> seconds in the background, so a timeout is told from a
+# crash right away; --heartbeat checks a Tuya device with HEART_BEAT frames instead of a TCP connect
+liveInterval = 0
+heartbeat = False
+
+# --seed <N>: seed the mutation and nonce generators and log every execution to <outputfold>/Executions.jsonl;
+# --replay <Executions.jsonl>: run again on the responses of such a log instead of the device (Replay.py).
+# Both leave out the probe cache and the liveness monitor, and want a fresh <outputfold>: the dictionaries and the
+# Cmd exploration state of an earlier run would change the workload.
+randomSeed = None
+replayfile = ''
+execLog = None
+replayLog = None
+# the Messenger class every stage sends through, ReplayMessenger when replaying
+messenger = Messenger
+
 
 # read the input file and store it as seed
 def readInputFile(file):
@@ -40,44 +158,64 @@ def readInputFile(file):
 # read the input fold and store them as seeds
 def readInputFold(fold):
     seeds = []
-    files = os.listdir(fold)
+    files = sorted(os.listdir(fold))
     for file in files:
         print("Loading file: ", os.path.join(fold, file))
         seeds.append(readInputFile(os.path.join(fold, file)))
     return seeds
 
 
-# Write the probe result that has been run into the output
-def writeRecord(queue, fold):
-    with open(os.path.join(fold, 'ProbeRecord.txt'), 'w') as f:
-        for i in range(len(queue)):
-            f.writelines("========Seed " + str(i) + "========\n")
-            for j in range(len(queue[i].M)):
+# Write one probed seed in the record format
+def writeSeedRecord(f, seed, i):
+    for j in range(len(seed.M)):
+        if len(seed.PR[j]) != len(seed.PS[j]):
+            raise ValueError("seed " + str(i) + " message " + str(j) + ": " + str(len(seed.PR[j])) +
+                             " probe responses but " + str(len(seed.PS[j])) + " scores")
+    f.writelines("========Seed " + str(i) + "========\n")
+    for j in range(len(seed.M)):
 
-                f.writelines("Message Index-" + str(j) + "\n")
-                for header in queue[i].M[j].headers:
-                    f.writelines(header + ":" + queue[i].M[j].raw[header] + '\n')
-                f.writelines("\n")
+        f.writelines("Message Index-" + str(j) + "\n")
+        for header in seed.M[j].headers:
+            f.writelines(header + ":" + seed.M[j].raw[header].rstrip("\n") + '\n')
+        f.writelines("\n")
 
-                f.writelines('Original Response' + "\n")
-                f.writelines(queue[i].R[j] if j < len(queue[i].R) else "")
+        f.writelines('Original Response' + "\n")
+        f.writelines((seed.R[j] if j < len(seed.R) else "").rstrip("\n") + "\n")
 
-                f.writelines('Probe Result:' + "\n")
-                f.writelines('PI' + "\n")
-                for n in queue[i].PI[j]:
-                    f.write(str(n) + " ")
-                f.writelines("\n")
+        f.writelines('Probe Result:' + "\n")
+        f.writelines('PI' + "\n")
+        for n in seed.PI[j]:
+            f.write(str(n) + " ")
+        f.writelines("\n")
 
-                f.writelines('PR and PS' + "\n")
-                for n in range(len(queue[i].PR[j])):
-                    f.writelines("(" + str(n) + ") " + queue[i].PR[j][n])
-                    f.writelines(str(queue[i].PS[j][n]) + "\n")
+        f.writelines('PR and PS' + "\n")
+        for n in range(len(seed.PR[j])):
+            f.writelines("(" + str(n) + ") " + seed.PR[j][n].rstrip("\n") + "\n")
+            f.writelines(str(seed.PS[j][n]) + "\n")
 
-            f.writelines("\n\n")
+    f.writelines("\n\n")
+
+
+# Write the probe result that has been run into the output
+def writeRecord(queue, fold):
+    with open(os.path.join(fold, 'ProbeRecord.txt'), 'w') as f:
+        for i in range(len(queue)):
+            writeSeedRecord(f, queue[i], i)
+    coverage.save(os.path.join(fold, 'Coverage.json'))
     return 0
 
 
+# a line of the record that is a similarity score
+def isScore(text):
+    try:
+        float(text)
+        return True
+    except ValueError:
+        return False
+
+
 # Read the probe results from the record, thus skip the probe process and directly start the mutation test.
+# PR and PS come as "(n) response" and the score on the next line, or in the older records as "(n) response99.01"
 def readRecordFile(file):
     queue = []
     with open(os.path.join(file), 'r') as f:
@@ -134,27 +272,52 @@ def readRecordFile(file):
                                 break
                         for j in range(index, ends):
                             if lines[j].startswith("("):
-                                PR.append(lines[j][3:])
-                            elif lines[j].strip() and lines[j][0].isdigit():
+                                response = lines[j][lines[j].index(') ') + 2:]
+                                legacy = LEGACY_SCORE.match(response)
+                                if legacy and not (j + 1 < ends and isScore(lines[j + 1].strip())):
+                                    PR.append(legacy.group(1) + "\n")
+                                    PS.append(float(legacy.group(2)))
+                                else:
+                                    PR.append(response)
+                            elif lines[j].strip() and isScore(lines[j].strip()):
                                 PS.append(float(lines[j].strip()))
                         seed.PR.append(PR)
                         seed.PS.append(PS)
 
                     index += 1
 
-                i = seedEnd
                 queue.append(seed)
+                i = seedEnd
+                continue
 
             i += 1
     return queue
 
 
+# Dry run one seed and keep the time it took
+def timedDryRun(m, seed):
+    start = time.time()
+    result = m.DryRunSend(seed)
+    if isinstance(result, str):
+        return result
+    times = sendTime.setdefault(result.digest(), [])
+    if replayLog is not None:
+        seconds = replayLog.dryRunTime(result.digest(), len(times))
+    elif execLog is not None:
+        seconds = execLog.lastSeconds
+    else:
+        seconds = time.time() - start
+    if seconds is not None:
+        times.append(seconds)
+    return result
+
+
 # DryRun：必须捕获 Messenger 返回的 "#error/#crash"
 def dryRun(queue):
     global restoreSeed
-    m = Messenger(restoreSeed)
+    m = messenger(restoreSeed)
     for i in range(0, len(queue)):
-        seed = m.DryRunSend(queue[i])
+        seed = timedDryRun(m, queue[i])
         if isinstance(seed, str) and seed.startswith("#"):
             print("#### DryRun failed:", seed)
             return True
@@ -184,12 +347,36 @@ def SimilarityScore(str1, str2):
     return round((1 - (ED / max_len)) * 100, 2)
 
 
+# Probe classes a child seed can take over from its parent for the bytes the mutation left untouched:
+# { byte index in the child : parent class + offset }, from the common prefix and suffix of the two contents
+def inheritedClasses(parentContent, content, parentPI, offset):
+    prefix = 0
+    limit = min(len(parentContent), len(content))
+    while prefix < limit and parentContent[prefix] == content[prefix]:
+        prefix += 1
+    suffix = 0
+    while suffix < limit - prefix and parentContent[-1 - suffix] == content[-1 - suffix]:
+        suffix += 1
+
+    classes = {}
+    for i in range(prefix):
+        if i < len(parentPI):
+            classes[i] = parentPI[i] + offset
+    shift = len(parentContent) - len(content)
+    for i in range(len(content) - suffix, len(content)):
+        if 0 <= i + shift < len(parentPI):
+            classes[i] = parentPI[i + shift] + offset
+    return classes
+
+
 # Probe（方案A）：过滤空响应，避免污染 PR/PS/PI
-def Probe(SeedObj):
+# With a parent (the seed an interesting mutation came from), messages before the mutated one keep the
+# parent's probe results, and only the changed region of the mutated message is probed again.
+def Probe(SeedObj, parent=None, mutated=-1):
     global restoreSeed
 
     print("*** Probe ")
-    m = Messenger(restoreSeed)
+    m = messenger(restoreSeed)
 
     for index in range(len(SeedObj.M)):
 
@@ -199,9 +386,18 @@ def Probe(SeedObj):
 
         print(SeedObj.M[index].raw["Content"].strip())
 
+        if parent is not None and index < mutated and \
+                SeedObj.M[index].raw["Content"] == parent.M[index].raw["Content"]:
+            SeedObj.PR.append(list(parent.PR[index]))
+            SeedObj.PS.append(list(parent.PS[index]))
+            SeedObj.PI.append(list(parent.PI[index]))
+            continue
+
         response1 = m.ProbeSend(SeedObj, index)
-        time.sleep(1)
+        time.sleep(pace)
         response2 = m.ProbeSend(SeedObj, index)
+        if "#crash" in (response1, response2):
+            writeOutput(SeedObj)
 
         # ✅ 方案A关键：任何一次为空，就给占位并跳过该 message 的 probe
         if (response1 or "").strip() == "" or (response2 or "").strip() == "":
@@ -214,15 +410,39 @@ def Probe(SeedObj):
         responsePool.append(response1)
         similarityScore.append(SimilarityScore(response1.strip(), response2.strip()))
 
+        # a ClientHello is mutated field by field (TlsHello), deleting its bytes one at a time tells nothing
+        if TlsHello.isTls(SeedObj.M[index]):
+            SeedObj.PR.append(responsePool)
+            SeedObj.PS.append(similarityScore)
+            SeedObj.PI.append([0] * len(SeedObj.M[index].raw["Content"]))
+            continue
+
+        # the parent's classes come after the child's own response
+        known = {}
+        if parent is not None and index == mutated:
+            known = inheritedClasses(parent.M[index].raw["Content"].strip(), SeedObj.M[index].raw["Content"].strip(),
+                                     parent.PI[index], len(responsePool))
+            responsePool.extend(parent.PR[index])
+            similarityScore.extend(parent.PS[index])
+
+        spans = [] if mutateProtected else protectedSpans(SeedObj.M[index].raw["Content"].strip())
+        context = probeContext(SeedObj, index)
+
         # probe process: delete ith byte
         for i in range(0, len(SeedObj.M[index].raw["Content"])):
+            # protected fields are not probed, they join the original response class
+            if overlaps(i, i, spans):
+                probeResponseIndex.append(0)
+                continue
+            if i in known:
+                probeResponseIndex.append(known[i])
+                continue
+
             temp = SeedObj.M[index].raw["Content"]
             SeedObj.M[index].raw["Content"] = SeedObj.M[index].raw["Content"].strip()[:i] + \
                                               SeedObj.M[index].raw["Content"].strip()[i + 1:]
 
-            response1 = m.ProbeSend(SeedObj, index)
-            time.sleep(1)
-            _ = m.ProbeSend(SeedObj, index)  # response2 不再强依赖（避免噪声）
+            response1, key, cls = cachedProbeSend(m, SeedObj, index, context, temp.strip(), i)
             print(response1, end='')
 
             # ✅ 方案A关键：空响应直接归入 0 类，不引入新类
@@ -231,8 +451,16 @@ def Probe(SeedObj):
                 SeedObj.M[index].raw["Content"] = temp
                 continue
 
+            # a cached response comes with the class it had, reused when this pool has it too
             flag = True
-            for j in range(0, len(responsePool)):
+            if cls is not None:
+                for j in range(0, len(responsePool)):
+                    if ProbeCache.classOf(responsePool[j]) == cls:
+                        flag = False
+                        probeResponseIndex.append(j)
+                        break
+
+            for j in range(0, len(responsePool) if flag else 0):
                 target = responsePool[j]
                 score = similarityScore[j]
                 c = SimilarityScore((target or "").strip(), response1.strip())
@@ -249,15 +477,57 @@ def Probe(SeedObj):
                 similarityScore.append(100.0)
                 probeResponseIndex.append(len(responsePool) - 1)
 
+            # empty responses and markers may be transient, they are probed again next time
+            klass = ProbeCache.classOf(responsePool[probeResponseIndex[-1]])
+            if key is not None and klass != cls and not response1.startswith("#"):
+                probeCache.put(key, response1, klass)
+
             SeedObj.M[index].raw["Content"] = temp
 
         SeedObj.PR.append(responsePool)
         SeedObj.PS.append(similarityScore)
         SeedObj.PI.append(probeResponseIndex)
 
+    getDictionary(SeedObj.target()).harvestSeed(SeedObj)
+    if probeCache is not None:
+        probeCache.display()
     return SeedObj
 
 
+# (target fingerprint, sequence hash) of the index-th message of a seed for the probe cache: the device and
+# restore sequence, the messages sent before it and its own headers, everything but the probed content, whose
+# window around the deleted byte completes the key
+def probeContext(SeedObj, index):
+    h = hashlib.sha1()
+    for message in SeedObj.M[:index + 1]:
+        for header in message.headers:
+            if message is SeedObj.M[index] and header == "Content":
+                continue
+            h.update((header + ":" + message.raw[header].strip() + "\n").encode("utf-8", errors="ignore"))
+        h.update(b"========\n")
+    h.update(str(index).encode())
+    restore = restoreSeed.digest() if isinstance(restoreSeed, Seed) else ""
+    return SeedObj.target() + "|" + model + "|" + restore, h.hexdigest()
+
+
+# (response, cache key, cached class) of the probe deleting the i-th byte of content, from the probe cache when
+# the same window was probed before; Probe stores the response with its class once it is classified
+def cachedProbeSend(m, SeedObj, index, context, content, i):
+    key = None
+    if probeCache is not None:
+        key = ProbeCache.key(context[0], context[1], content, i)
+        cached = probeCache.get(key)
+        if cached is not None:
+            return cached[0], key, cached[1]
+
+    response1 = m.ProbeSend(SeedObj, index)
+    time.sleep(pace)
+    response2 = m.ProbeSend(SeedObj, index)  # response2 不再强依赖（避免噪声）
+    if "#crash" in (response1, response2):
+        writeOutput(SeedObj)
+    return response1, key, None
+
+
 def getFeature(response, score):
     feature = {'a': 0, 'n': 0, 's': 0}
     response = (response or "")
@@ -314,20 +584,157 @@ def formSnippets(pi, cluster, index):
     return snippet
 
 
+# Queue a copy of the mutated seed for probing; the caller is about to put the original content back
 def interesting(oldSeed, index):
+    print(oldSeed.M[index].raw["Content"])
+
+    seed = oldSeed.copy()
+    digest = seed.digest()
+    if digest in pendingDigests:
+        return
+
+    # another device of the same model found it first, it comes in with the next pull; claiming it before it is
+    # queued keeps two workers from probing the same child
+    if coordinator is not None and \
+            (coordinator.known(model, digest) or not coordinator.claim(model, digest, workerName)):
+        return
+
+    # cheapest first: the changed bytes of the mutated message and every byte of the messages after it
+    parent = oldSeed.M[index].raw["Content"].strip()
+    content = seed.M[index].raw["Content"].strip()
+    cost = len(inheritedClasses(parent, content, oldSeed.PI[index], 0))
+    cost = len(content) - cost + sum(len(message.raw["Content"]) for message in seed.M[index + 1:])
+    heapq.heappush(pending, (cost, next(pendingTick), seed, oldSeed, index))
+    pendingDigests.add(digest)
+
+
+# Dry run and probe the pending interesting seeds, True if the queue grew; a probed seed is published right
+# away so the other workers of the model can mutate it too, a failed one gives up its claim
+def drainPending():
+    m = messenger(restoreSeed)
+    added = False
+    while pending:
+        _, _, seed, parent, index = heapq.heappop(pending)
+        digest = seed.digest()
+        pendingDigests.discard(digest)
+        seed = timedDryRun(m, seed)
+        if isinstance(seed, str) and seed.startswith("#"):
+            if coordinator is not None:
+                coordinator.release(model, digest, workerName)
+            continue
+        queue.append(Probe(seed, parent, index))
+        share(queue[-1])
+        added = True
+    return added
+
+
+# Cmd exploration state, kept in CmdExplore.txt so an interrupted sweep resumes where it stopped
+# { seed digest : { "swept": True once the seed needs no more sends,
+#                   message index : { "next": next command ID, "sends": sends so far, "promoted": [command IDs] } } }
+# The children a sweep promotes are recorded as swept, a resumed run (-c) does not spend the budget on them again.
+def loadCmdState(fold):
+    file = os.path.join(fold, 'CmdExplore.txt')
+    if not os.path.exists(file):
+        return {}
+    with open(file, 'r') as f:
+        return json.load(f)
+
+
+def saveCmdState(state, fold):
+    file = os.path.join(fold, 'CmdExplore.txt')
+    with open(file + '.tmp', 'w') as f:
+        json.dump(state, f)
+    os.replace(file + '.tmp', file)
+
+
+# Sweep the command-ID space with the seed's payload before snippet mutation. A command ID whose response
+# falls in none of the seed's PR/PS classes (nor in a class already promoted) becomes a new queue entry.
+# A Tuya message without a Cmd header is swept from the Messenger's default command.
+def CmdExplore(seed, restoreSeedObj, state):
     global queue
-    global restoreSeed
-    m = Messenger(restoreSeed)
+    m = messenger(restoreSeedObj)
+    seedState = state.setdefault(seed.digest(), {})
+    if seedState.get("swept"):
+        return 0
+
+    for index in range(len(seed.M)):
+        message = seed.M[index]
+        if "Cmd" in message.raw:
+            try:
+                own = int(message.raw["Cmd"].strip(), 0)
+            except ValueError:
+                continue
+        elif "DevID" in message.raw or "LocalKey" in message.raw:
+            own = m.default_cmd
+        else:
+            continue
 
-    print(oldSeed.M[index].raw["Content"])
+        progress = seedState.setdefault(str(index), {"next": 0, "sends": 0, "promoted": []})
+        pool = list(seed.PR[index])
+        scores = list(seed.PS[index])
+        tempCmd = message.raw.get("Cmd")
+
+        def restoreCmd():
+            if tempCmd is None:
+                message.remove("Cmd")
+            else:
+                message.set("Cmd", tempCmd)
+
+        print("*** Cmd explore, message", index, "from", progress["next"])
+        while progress["next"] < CMD_SPACE and progress["sends"] < cmdBudget:
+            cmd = progress["next"]
+            progress["next"] += 1
+            if cmd == own or cmd in CMD_SKIP:
+                continue
 
-    seed = Seed()
-    seed.M = oldSeed.M
-    seed = m.DryRunSend(seed)
-    if isinstance(seed, str) and seed.startswith("#"):
+            message.set("Cmd", " " + str(cmd))
+            response = m.ProbeSend(seed, index)
+            progress["sends"] += 1
+
+            if response == "#crash":
+                writeOutput(seed)
+            if (response or "").strip() == "" or response.startswith("#"):
+                restoreCmd()
+                saveCmdState(state, outputfold)
+                continue
+
+            distinct = True
+            for j in range(len(pool)):
+                if SimilarityScore((pool[j] or "").strip(), response.strip()) >= scores[j]:
+                    distinct = False
+                    break
+
+            if distinct:
+                print("~~Cmd", cmd, "behaves differently:", response.strip())
+                pool.append(response)
+                scores.append(100.0)
+                progress["promoted"].append(cmd)
+                child = seed.copy()
+                state[child.digest()] = {"swept": True}
+                # the queue may spill the seed while the child is added, it has to be spilled as it was
+                restoreCmd()
+                child = timedDryRun(m, child)
+                if not (isinstance(child, str) and child.startswith("#")):
+                    queue.append(Probe(child))
+                    writeRecord(queue, outputfold)
+
+            restoreCmd()
+            saveCmdState(state, outputfold)
+
+        restoreCmd()
+
+    seedState["swept"] = True
+    saveCmdState(state, outputfold)
+    return 0
+
+
+# Run the Cmd exploration stage (-x <budget>) over the seeds in the queue
+def cmdExploreQueue():
+    if cmdBudget <= 0:
         return
-    seed = Probe(seed)
-    queue.append(seed)
+    cmdState = loadCmdState(outputfold)
+    for seed in list(queue):
+        CmdExplore(seed, restoreSeed, cmdState)
 
 
 # ✅ 必改：修文件名
@@ -336,12 +743,26 @@ def writeOutput(seed):
     ts = time.strftime("%Y%m%d-%H%M%S", time.localtime())
     file = f'Crash-{ts}.txt'
 
+    if coordinator is not None and not coordinator.crash(model + "|" + seed.digest(), os.path.join(outputfold, file)):
+        print("Crash already reported by another worker @ " + ts)
+        sys.exit()
+
+    bucket = model + "-" + seed.digest()
+    if sync is not None and sync.crashOwner(bucket) not in ("", sync.name):
+        print("Crash already reported by " + sync.crashOwner(bucket) + " @ " + ts)
+        sys.exit()
+
+    text = ""
+    for i in range(len(seed.M)):
+        text += "Message Index-" + str(i) + "\n"
+        for header in seed.M[i].headers:
+            text += header + ":" + seed.M[i].raw[header] + '\n'
+        text += "\n"
+
     with open(os.path.join(outputfold, file), 'w') as f:
-        for i in range(len(seed.M)):
-            f.writelines("Message Index-" + str(i) + "\n")
-            for header in seed.M[i].headers:
-                f.writelines(header + ":" + seed.M[i].raw[header] + '\n')
-            f.writelines("\n")
+        f.write(text)
+    if sync is not None:
+        sync.exportCrash(bucket, text)
 
     print("Found a crash @ " + ts)
     sys.exit()
@@ -364,12 +785,62 @@ def responseHandle(seed, info):
     return True
 
 
-def SnippetMutate(seed, restoreSeedObj):
-    m = Messenger(restoreSeedObj)
+# Account for one sent mutation: operator stats, the dictionary token, interesting / crash handling
+def finishMutation(mutation, mutant, info, response):
+    operatorStats.record(mutation.op, response)
+    if execLog is not None:
+        execLog.classify(mutant, info, mutation.op, mutation.digest)
+    temp = responseHandle(mutant, info)
+    if mutation.token is not None and (info or "").startswith("#interesting"):
+        getDictionary(mutation.seed.target()).hit(mutation.token)
+    return info, temp
+
 
+# Send one mutation and handle its result
+def runMutation(m, mutation):
+    mutant = mutation.mutant()
+    info = m.SnippetMutationSend(mutant, mutation.i, mutation.digest, mutation.op, mutation.snippet)
+    return finishMutation(mutation, mutant, info, m.lastResponse)
+
+
+# Send mutations one after the other, or through the pipeline (--pipeline); False if one was interesting
+def runMutations(m, mutations):
+    if pipeline is not None:
+        return pipeline.run(m, mutations, finishMutation)
+    keep = True
+    for mutation in mutations:
+        keep = runMutation(m, mutation)[1] and keep
+    return keep
+
+
+# Send the seed with the i-th message replaced by the mutated content
+def mutationSend(m, seed, i, message, op, snippet=None):
+    return runMutation(m, Mutation(seed, i, op, message, snippet=snippet))
+
+
+# Send the seed with frame field overrides on the i-th message (Tuya native transport only)
+def frameSend(m, seed, i, fields):
+    return runMutation(m, Mutation(seed, i, 'Frame', fields=fields))
+
+
+# Every mutation SnippetMutate sends for a seed, generated lazily so the pipeline can cluster the next
+# message while the current one is being sent; fills seed.ClusterList and seed.Snippet on the way
+def snippetMutations(seed):
+    digest = seed.digest()
     for i in range(len(seed.M)):
+        # ========  TLS ClientHello fields ========
+        # (a record the model cannot read back gets no snippets, Havoc leaves it alone)
+        if TlsHello.isTls(seed.M[i]):
+            print("--TLS")
+            seed.ClusterList.append([])
+            for op, message, snippet in TlsHello.fieldMutations(seed.M[i].raw["Content"]):
+                yield Mutation(seed, i, op, message, snippet=snippet, digest=digest)
+            seed.Snippet.append(TlsHello.fieldSnippets(seed.M[i].raw["Content"]))
+            continue
+
         pool = seed.PR[i]
-        poolIndex = seed.PI[i]
+        # formSnippets relabels the classes in place, the seed keeps its probe classes for its children
+        poolIndex = list(seed.PI[i])
         similarityScores = seed.PS[i]
 
         featureList = []
@@ -381,13 +852,14 @@ def SnippetMutate(seed, restoreSeedObj):
 
         seed.ClusterList.append(cluster)
 
+        dictionary = getDictionary(seed.target())
+        spans = [] if mutateProtected else protectedSpans(seed.M[i].raw["Content"])
         mutatedSnippet = []
         for index in range(len(cluster)):
-            snippetsList = formSnippets(poolIndex, cluster, index)
+            snippetsList = [part for snippet in formSnippets(poolIndex, cluster, index) for part in clip(snippet, spans)]
             for snippet in snippetsList:
                 if snippet not in mutatedSnippet:
                     mutatedSnippet.append(snippet)
-                    tempMessage = seed.M[i].raw["Content"]
 
                     # ========  BitFlip ========
                     print("--BitFlip")
@@ -396,52 +868,85 @@ def SnippetMutate(seed, restoreSeedObj):
                     for o in range(snippet[0], snippet[1]):
                         asc = asc + (chr(255 - ord(message[o])))
                     message = message[:snippet[0]] + asc + message[snippet[1] + 1:]
-                    seed.M[i].raw["Content"] = message
-                    responseHandle(seed, m.SnippetMutationSend(seed, i))
-                    seed.M[i].raw["Content"] = tempMessage
+                    yield Mutation(seed, i, 'BitFlip', message, snippet=snippet, digest=digest)
 
                     # ========  Empty ========
                     print("--Empty")
                     message = seed.M[i].raw["Content"]
                     message = message[:snippet[0]] + message[snippet[1] + 1:]
-                    seed.M[i].raw["Content"] = message
-                    responseHandle(seed, m.SnippetMutationSend(seed, i))
-                    seed.M[i].raw["Content"] = tempMessage
+                    yield Mutation(seed, i, 'Empty', message, snippet=snippet, digest=digest)
 
                     # ========  Repeat ========
                     print("--Repeat")
                     message = seed.M[i].raw["Content"]
                     t = random.randint(2, 5)
                     message = message[:snippet[0]] + message[snippet[0]:snippet[1]] * t + message[snippet[1] + 1:]
-                    seed.M[i].raw["Content"] = message
-                    responseHandle(seed, m.SnippetMutationSend(seed, i))
-                    seed.M[i].raw["Content"] = tempMessage
+                    yield Mutation(seed, i, 'Repeat', message, snippet=snippet, digest=digest)
 
                     # ========  Interesting ========
                     print("--Interesting")
-                    interestingString = ['on', 'off', 'True', 'False', '0', '1']
-                    for t in interestingString:
+                    for t in dictionary.top(DICT_TOP):
                         message = seed.M[i].raw["Content"]
                         message = message[:snippet[0]] + t + message[snippet[1] + 1:]
-                        seed.M[i].raw["Content"] = message
-                        responseHandle(seed, m.SnippetMutationSend(seed, i))
-                        seed.M[i].raw["Content"] = tempMessage
+                        yield Mutation(seed, i, 'Interesting', message, snippet=snippet, token=t, digest=digest)
+
+        # ========  JSON structure ========
+        if jsonMode:
+            print("--JSON")
+            tokens = dictionary.top(DICT_TOP)
+            for op, message in structuralMutations(seed.M[i].raw["Content"], tokens, jsonInvalidRatio,
+                                                   not mutateProtected):
+                yield Mutation(seed, i, op, message, digest=digest)
 
         seed.Snippet.append(mutatedSnippet)
+
+
+def SnippetMutate(seed, restoreSeedObj):
+    m = messenger(restoreSeedObj)
+    runMutations(m, snippetMutations(seed))
+    seed.isMutated = True
+    if pipeline is not None:
+        pipeline.display()
     return 0
 
 
-def Havoc(queue, restoreSeedObj):
-    print("*Havoc")
-    m = Messenger(restoreSeedObj)
+# A copy of a queue seed with its probe results and snippets, for the pipeline's producer thread
+def snapshot(seed):
+    copy = seed.copy()
+    copy.R = list(seed.R)
+    copy.PR = [list(pool) for pool in seed.PR]
+    copy.PS = [list(scores) for scores in seed.PS]
+    copy.PI = [list(pi) for pi in seed.PI]
+    copy.ClusterList = list(seed.ClusterList)
+    copy.Snippet = [list(snippets) for snippets in seed.Snippet]
+    copy.isMutated = seed.isMutated
+    return copy
 
-    t = random.randint(0, len(queue) - 1)
-    seed = queue[t]
 
+# One random Havoc mutation of 'seed', None if the pick came to nothing
+def havocMutation(seed):
     i = random.randint(0, len(seed.M) - 1)
     snippets = seed.Snippet[i]
     message = seed.M[i].raw["Content"]
-    tempMessage = seed.M[i].raw["Content"]
+    dictionary = getDictionary(seed.target())
+
+    if frameMode and "DevID" in seed.M[i].raw and random.random() < 0.25:
+        return Mutation(seed, i, 'Frame', fields=randomFields())
+
+    if TlsHello.isTls(seed.M[i]):
+        mutation = TlsHello.randomMutation(message)
+        if mutation:
+            op, message, snippet = mutation
+            return Mutation(seed, i, op, message, snippet=snippet)
+
+    if jsonMode and random.random() < 0.5:
+        mutation = randomMutation(message, dictionary.top(DICT_TOP), jsonInvalidRatio, not mutateProtected)
+        if mutation:
+            op, message = mutation
+            return Mutation(seed, i, op, message)
+
+    if not snippets:
+        return None
 
     n = random.randint(0, len(snippets) - 1)
     snippet = snippets[n]
@@ -453,66 +958,80 @@ def Havoc(queue, restoreSeedObj):
         for o in range(snippet[0], snippet[1]):
             asc = asc + (chr(255 - ord(message[o])))
         message = message[:snippet[0]] + asc + message[snippet[1] + 1:]
-        seed.M[i].raw["Content"] = message
-        temp = responseHandle(seed, m.SnippetMutationSend(seed, i))
-        seed.M[i].raw["Content"] = tempMessage
-        return temp
+        return Mutation(seed, i, 'BitFlip', message, snippet=snippet)
 
     elif pick == 1:  # Empty
-        message = seed.M[i].raw["Content"]
         message = message[:snippet[0]] + message[snippet[1] + 1:]
-        seed.M[i].raw["Content"] = message
-        temp = responseHandle(seed, m.SnippetMutationSend(seed, i))
-        seed.M[i].raw["Content"] = tempMessage
-        return temp
+        return Mutation(seed, i, 'Empty', message, snippet=snippet)
 
     elif pick == 2:  # Repeat
-        message = seed.M[i].raw["Content"]
         t = random.randint(2, 5)
         message = message[:snippet[0]] + message[snippet[0]:snippet[1]] * t + message[snippet[1] + 1:]
-        seed.M[i].raw["Content"] = message
-        temp = responseHandle(seed, m.SnippetMutationSend(seed, i))
-        seed.M[i].raw["Content"] = tempMessage
-        return temp
+        return Mutation(seed, i, 'Repeat', message, snippet=snippet)
 
     elif pick == 3:  # Interesting
-        interestingString = ['on', 'off', 'True', 'False', '0', '1']
-        t = random.choice(interestingString)
-        message = seed.M[i].raw["Content"]
+        t = dictionary.choice()
         message = message[:snippet[0]] + t + message[snippet[1] + 1:]
-        seed.M[i].raw["Content"] = message
-        temp = responseHandle(seed, m.SnippetMutationSend(seed, i))
-        seed.M[i].raw["Content"] = tempMessage
-        return temp
+        return Mutation(seed, i, 'Interesting', message, snippet=snippet, token=t)
 
     elif pick == 4:  # Random Bytes Flip
         start = random.randint(0, len(message) - 1)
         end = random.randint(start, len(message))
+        spans = [] if mutateProtected else protectedSpans(message)
+        parts = clip([start, end], spans)
+        if not parts:
+            return None
+        start, end = parts[0]
         asc = ""
         for o in range(start, end):
             asc = asc + (chr(255 - ord(message[o])))
         message = message[:start] + asc + message[end + 1:]
-        seed.M[i].raw["Content"] = message
-        temp = responseHandle(seed, m.SnippetMutationSend(seed, i))
-        seed.M[i].raw["Content"] = tempMessage
-        return temp
+        return Mutation(seed, i, 'RandomBytesFlip', message, snippet=[start, end])
 
-    return True
+    return None
+
+
+# One Havoc round: a single mutation, or a batch of PIPELINE_HAVOC through the pipeline (--pipeline)
+def Havoc(queue, restoreSeedObj):
+    print("*Havoc")
+    m = messenger(restoreSeedObj)
+
+    if pipeline is not None:
+        picks = [coverage.pick(queue.digests()) for _ in range(PIPELINE_HAVOC)]
+        seeds = {}
+        for t in picks:
+            if t not in seeds:
+                seeds[t] = snapshot(queue[t])
+        batch = (havocMutation(seeds[t]) for t in picks)
+        return runMutations(m, (mutation for mutation in batch if mutation is not None))
+
+    mutation = havocMutation(queue[coverage.pick(queue.digests())])
+    if mutation is None:
+        return True
+    return runMutation(m, mutation)[1]
 
 
 def getArgs(argv):
+    global jsonMode, jsonInvalidRatio, mutateProtected, frameMode, cmdBudget, targetfile
+    global syncdir, instanceName, model, liveInterval, heartbeat, cacheLimit, distillEvery, memoryBudget, pipeline
+    global randomSeed, replayfile
+
     inputfold = ''
     outputfold_local = ''
     restorefile = ''
     recordfile = ''
+    usage = 'Snipuzz.py -i <inputfold> -r <restrefile> -o <outputfold> (-c <recordfile>) (-j <invalidratio>) (-P) (-F) (-x <cmdbudget>) (-t <targetfile>) (-s <syncdir> -n <instance> -m <model>) (-l <interval> (--heartbeat)) (--cache <entries>) (-d <rounds>) (--memory <MB>) (-S <N> (--state-ignore <ids>)) (--pipeline <depth>) (--seed <N> | --replay <Executions.jsonl>)'
     try:
-        opts, args = getopt.getopt(argv, "hi:r:o:c:", ["ifold=", "rfile=", "ofold=", "cfile="])
+        opts, args = getopt.getopt(argv, "hi:r:o:c:j:PFx:t:s:n:m:l:d:S:",
+                                   ["ifold=", "rfile=", "ofold=", "cfile=", "json=", "protected", "frame", "cmd=",
+                                    "tfile=", "sync=", "name=", "model=", "live=", "heartbeat", "cache=", "distill=", "memory=", "state=", "state-ignore=",
+                                    "pipeline=", "seed=", "replay="])
     except getopt.GetoptError:
-        print('Snipuzz.py -i <inputfold> -r <restrefile> -o <outputfold> (-c <recordfile>)')
+        print(usage)
         sys.exit(2)
     for opt, arg in opts:
         if opt == '-h':
-            print('test.py -i <inputfold> -r <restrefile> -o <outputfold> (-c <recordfile>)')
+            print(usage)
             sys.exit()
         elif opt in ("-i", "--ifold"):
             inputfold = arg
@@ -522,31 +1041,358 @@ def getArgs(argv):
             outputfold_local = arg
         elif opt in ("-c", "--cfile"):
             recordfile = arg
+        elif opt in ("-j", "--json"):
+            jsonMode = True
+            jsonInvalidRatio = float(arg)
+        elif opt in ("-P", "--protected"):
+            mutateProtected = True
+        elif opt in ("-F", "--frame"):
+            frameMode = True
+        elif opt in ("-x", "--cmd"):
+            cmdBudget = int(arg)
+        elif opt in ("-t", "--tfile"):
+            targetfile = arg
+        elif opt in ("-s", "--sync"):
+            syncdir = arg
+        elif opt in ("-n", "--name"):
+            instanceName = arg
+        elif opt in ("-m", "--model"):
+            model = arg
+        elif opt in ("-l", "--live"):
+            liveInterval = float(arg)
+        elif opt == "--heartbeat":
+            heartbeat = True
+        elif opt == "--cache":
+            cacheLimit = int(arg)
+        elif opt in ("-d", "--distill"):
+            distillEvery = int(arg)
+        elif opt == "--memory":
+            memoryBudget = int(float(arg) * 1024 * 1024)
+        elif opt in ("-S", "--state"):
+            Messenger.state_every = int(arg)
+        elif opt == "--state-ignore":
+            Messenger.state_ignore = set(dp.strip() for dp in arg.split(',') if dp.strip())
+        elif opt == "--pipeline":
+            pipeline = Pipeline(int(arg) or PIPELINE_DEPTH)
+        elif opt == "--seed":
+            randomSeed = int(arg)
+        elif opt == "--replay":
+            replayfile = arg
         if not recordfile:
             recordfile = 'unavailable'
     print('Input fold：', inputfold)
     print('Restore file: ', restorefile)
     print('Output fold：', outputfold_local)
     print('Record file：', recordfile)
+    if jsonMode:
+        print('JSON mode, invalid ratio: ', jsonInvalidRatio)
 
     return inputfold, restorefile, outputfold_local, recordfile
 
 
-def main(argv):
-    global queue, restoreSeed, outputfold
+# Probed and snippet-mutated seeds go to the coordinator, so identical devices reuse them
+def share(seed):
+    if coordinator is not None:
+        coordinator.publish(model, seed, workerName)
 
-    inputfold, restorefile, outputfold, recordfile = getArgs(argv)
-    restoreSeed = readInputFile(restorefile)
 
+# Take the seeds other workers of the same model published since the last pull
+def pullShared():
+    global pulled
+    seeds, pulled = coordinator.pull(model, pulled)
+    digests = set(queue.digests()) | retiredDigests
+    added = False
+    for seed in seeds:
+        if seed.digest() in digests:
+            continue
+        seed.retarget(restoreSeed.M[0])
+        queue.append(seed)
+        digests.add(seed.digest())
+        added = True
+    return added
+
+
+# Export the queue entries not shared yet, then import the peers' new entries; True if the queue grew
+def syncQueue():
+    global lastSync
+    lastSync = time.time()
+
+    for i, digest in enumerate(queue.digests()):
+        if digest in sync.seen:
+            continue
+        seed = queue[i]
+        buffer = io.StringIO()
+        buffer.write("Model:" + model + "\n")
+        writeSeedRecord(buffer, seed, 0)
+        sync.export(digest, buffer.getvalue())
+
+    digests = set(queue.digests()) | retiredDigests
+    added = False
+    for digest, path in sync.imports():
+        if digest in digests:
+            sync.done(digest)
+            continue
+        try:
+            with open(path, 'r') as f:
+                peerModel = f.readline().strip()[len("Model:"):]
+            seeds = readRecordFile(path)
+        except (OSError, ValueError, IndexError) as e:
+            print("Could not import " + path + ", trying again at the next sync:", e)
+            continue
+        if not seeds:
+            continue
+        sync.done(digest)
+        for seed in seeds:
+            seed.retarget(restoreSeed.M[0])
+            if not (model and peerModel == model):
+                # another model: only the messages are reused
+                seed = probeImported(seed.copy())
+                if seed is None:
+                    continue
+            print("Imported seed " + digest + " from the sync directory")
+            queue.append(seed)
+            digests.add(digest)
+            added = True
+    return added
+
+
+# Dry run and probe a seed that came from elsewhere, None if the dry run fails
+def probeImported(seed):
+    seed = timedDryRun(messenger(restoreSeed), seed)
+    if isinstance(seed, str) and seed.startswith("#"):
+        return None
+    return Probe(seed)
+
+
+def saveStateStats(file):
+    with open(file, 'w') as f:
+        f.write("States: " + str(len(Messenger.state_seen)) + " queries: " + str(Messenger.state_queries) +
+                " executions: " + str(Messenger.state_execs) + " every: " + str(Messenger.state_every) + "\n")
+
+
+# Retire the seeds whose response classes the rest of the queue already covers
+def distillQueue():
+    global retiredCount
+    kept, dropped = distill(queue, {digest: statistics.median(times) for digest, times in sendTime.items() if times})
+    if not dropped:
+        return
+    queue.reset(kept)
+    with open(os.path.join(outputfold, 'Retired.txt'), 'a') as f:
+        for seed in dropped:
+            writeSeedRecord(f, seed, retiredCount)
+            retiredDigests.add(seed.digest())
+            retiredCount += 1
+    print("Distilled the queue: " + str(len(kept)) + " active, " + str(retiredCount) + " retired")
+    writeRecord(queue, outputfold)
+
+
+def fuzzLoop():
+    skip = False
+    rounds = 0
+    while True:
+        if sync is not None and time.time() - lastSync > SYNC_EVERY:
+            if syncQueue():
+                skip = False
+        if not queue:
+            time.sleep(pace)
+            if coordinator is not None:
+                pullShared()
+            continue
+        if pending and drainPending():
+            skip = False
+        if not skip:
+            i = 0
+            while i < len(queue):
+                if not queue.isMutated(i):
+                    SnippetMutate(queue[i], restoreSeed)
+                    share(queue[i])
+                    saveDictionaries(os.path.join(outputfold, 'Dictionary.txt'))
+                    operatorStats.save(os.path.join(outputfold, 'OperatorStats.txt'))
+                    queue.save(os.path.join(outputfold, 'Queue.txt'))
+                    coverage.save(os.path.join(outputfold, 'Coverage.json'))
+                    if Messenger.state_every > 0:
+                        saveStateStats(os.path.join(outputfold, 'State.txt'))
+                    if probeCache is not None:
+                        probeCache.save(os.path.join(outputfold, 'ProbeCache.txt'))
+                    if pipeline is not None:
+                        pipeline.save(os.path.join(outputfold, 'Pipeline.txt'))
+                    if execLog is not None:
+                        execLog.save(os.path.join(outputfold, 'Executions.txt'))
+                i += 1
+        skip = True
+        skip = Havoc(queue, restoreSeed)
+        rounds += 1
+        if coordinator is not None and rounds % PULL_EVERY == 0:
+            pullShared()
+        if distillEvery > 0 and rounds % distillEvery == 0:
+            distillQueue()
+
+
+# Target list: one device per line, "<restorefile> [model] [pace]"; devices with the same model share seeds
+def readTargets(file):
+    targets = []
+    with open(file, 'r') as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            cols = line.split()
+            name = os.path.splitext(os.path.basename(cols[0]))[0]
+            targets.append({
+                "restore": cols[0],
+                "name": name,
+                "model": cols[1] if len(cols) > 1 else name,
+                "pace": float(cols[2]) if len(cols) > 2 else 1,
+            })
+    return targets
+
+
+# One device of a multi-target campaign, in its own process with its own Messenger and pacing
+def worker(target, inputfold, fold, sharedCoordinator):
+    global queue, restoreSeed, outputfold, pace, coordinator, model, workerName, sync
+
+    restoreSeed = readInputFile(target["restore"])
+    outputfold = fold
+    pace = target["pace"]
+    coordinator = sharedCoordinator
+    model = target["model"]
+    workerName = target["name"]
+    os.makedirs(outputfold, exist_ok=True)
+    loadDictionaries(os.path.join(outputfold, 'Dictionary.txt'))
+    if syncdir:
+        sync = SyncDir(syncdir, (instanceName or socket.gethostname()) + "-" + workerName)
+    startMonitor(restoreSeed)
+    openProbeCache(outputfold)
+
+    queue = SpillQueue(os.path.join(outputfold, 'Queue.db'), memoryBudget)
+    for seed in readInputFold(inputfold):
+        seed.retarget(restoreSeed.M[0])
+        # only one worker per model probes a seed, the others pull it as soon as it is probed
+        if not coordinator.claim(model, seed.digest(), workerName):
+            continue
+        if dryRun([seed]):
+            coordinator.release(model, seed.digest(), workerName)
+            print('#### Dry run failed on ' + workerName + ', check the inputs or connection.')
+            sys.exit()
+        queue.append(Probe(seed))
+        share(queue[-1])
+    writeRecord(queue, outputfold)
+
+    cmdExploreQueue()
+    fuzzLoop()
+
+
+def openProbeCache(fold):
+    global probeCache
+    if cacheLimit > 0:
+        os.makedirs(fold, exist_ok=True)
+        probeCache = ProbeCache(os.path.join(fold, 'ProbeCache.db'), cacheLimit)
+
+
+# Start the liveness monitor on the device of the restore seed (-l <interval>)
+def startMonitor(restoreSeedObj):
+    if liveInterval <= 0 or not restoreSeedObj.M:
+        return
+    cfg = restoreSeedObj.M[0].raw
+    session = None
+    if "DevID" in cfg and "LocalKey" in cfg:
+        address = cfg.get("Address", cfg.get("IP", "")).strip()
+        port = int(cfg.get("Port", "6668").strip())
+        if heartbeat:
+            # a session of its own, the Messenger's session stays untouched
+            session = TuyaSession(cfg["DevID"].strip(), address, cfg["LocalKey"].strip(),
+                                  float(cfg.get("Version", "3.4").strip()), port, liveInterval)
+    elif "IP" in cfg and "Port" in cfg:
+        if cfg.get("Transport", "").strip().lower() == "udp":
+            print('No liveness monitor for UDP targets, a TCP connect says nothing about them')
+            return
+        address = cfg["IP"].strip()
+        port = int(cfg["Port"].strip())
+    else:
+        return
+    monitor = LivenessMonitor(address, port, interval=liveInterval, timeout=liveInterval, session=session)
+    monitor.start()
+    Messenger.monitor = monitor
+    print('Liveness monitor on ' + address + ':' + str(port) + ', interval ' + str(liveInterval) + 's')
+
+
+def runTargets(file, inputfold, fold):
+    targets = readTargets(file)
+    manager = multiprocessing.Manager()
+    sharedCoordinator = Coordinator(manager)
+
+    workers = []
+    for target in targets:
+        print('Starting worker ' + target["name"] + ' (model ' + target["model"] + ')')
+        p = multiprocessing.Process(target=worker, name=target["name"],
+                                    args=(target, inputfold, os.path.join(fold, target["name"]), sharedCoordinator))
+        p.start()
+        workers.append(p)
+    for p in workers:
+        p.join()
+
+
+# --seed / --replay: seed the generators, open the execution log and send through the log instead of the device
+def startExecLog(argv):
+    global randomSeed, execLog, replayLog, messenger, pace, cacheLimit, liveInterval
+    logfile = os.path.join(outputfold, 'Executions.jsonl')
+    if replayfile:
+        if os.path.abspath(replayfile) == os.path.abspath(logfile):
+            print('#### The replay would overwrite ' + replayfile + ', choose another output fold.')
+            sys.exit(2)
+        replayLog = ReplayLog(replayfile)
+        ReplayMessenger.log = replayLog
+        messenger = ReplayMessenger
+        if randomSeed is None:
+            randomSeed = replayLog.seed
+        # no device to wait for
+        pace = 0
+        print('Replaying ' + str(replayLog.total) + ' sends of ' + replayfile)
+    if randomSeed is None:
+        return
+    random.seed(randomSeed)
+    Template.nonceRandom.seed(randomSeed)
+    cacheLimit = 0
+    liveInterval = 0
+    os.makedirs(outputfold, exist_ok=True)
+    execLog = ExecLog(logfile, randomSeed, argv)
+    Messenger.execLog = execLog
+    print('Seed ' + str(randomSeed) + ', executions logged to ' + logfile)
+
+
+# The replay sent as many messages as the recorded campaign: report and keep the state of this run
+def finishReplay():
+    print('#### Replay finished')
+    replayLog.display()
+    execLog.display()
+    replayLog.save(os.path.join(outputfold, 'Replay.txt'))
+    execLog.save(os.path.join(outputfold, 'Executions.txt'))
+    execLog.close()
+    operatorStats.save(os.path.join(outputfold, 'OperatorStats.txt'))
+    queue.save(os.path.join(outputfold, 'Queue.txt'))
+    coverage.save(os.path.join(outputfold, 'Coverage.json'))
+    if pipeline is not None:
+        pipeline.save(os.path.join(outputfold, 'Pipeline.txt'))
+
+
+def campaign(inputfold, recordfile):
+    global queue
+
+    loadDictionaries(os.path.join(outputfold, 'Dictionary.txt'))
+
+    os.makedirs(outputfold, exist_ok=True)
+    queue = SpillQueue(os.path.join(outputfold, 'Queue.db'), memoryBudget)
     if recordfile and os.path.exists(recordfile):
-        queue = readRecordFile(recordfile)
+        queue.extend(readRecordFile(recordfile))
+        coverage.load(os.path.join(outputfold, 'Coverage.json'))
         for seed in queue:
             seed.display()
+            getDictionary(seed.target()).harvestSeed(seed)
         if dryRun(queue):
             print('#### Dry run failed, check the inputs or connection.')
             sys.exit()
     else:
-        queue = readInputFold(inputfold)
+        queue.extend(readInputFold(inputfold))
         if dryRun(queue):
             print('#### Dry run failed, check the inputs or connection.')
             sys.exit()
@@ -554,16 +1400,34 @@ def main(argv):
             queue[i] = Probe(queue[i])
         writeRecord(queue, outputfold)
 
-    skip = False
-    while True:
-        if not skip:
-            i = 0
-            while i < len(queue):
-                if not queue[i].isMutated:
-                    SnippetMutate(queue[i], restoreSeed)
-                i += 1
-        skip = True
-        skip = Havoc(queue, restoreSeed)
+    cmdExploreQueue()
+    fuzzLoop()
+
+
+def main(argv):
+    global restoreSeed, outputfold, model, sync
+
+    inputfold, restorefile, outputfold, recordfile = getArgs(argv)
+    if targetfile:
+        if randomSeed is not None or replayfile:
+            print('#### --seed / --replay run a single target, not a target list.')
+            sys.exit(2)
+        runTargets(targetfile, inputfold, outputfold)
+        return
+
+    restoreSeed = readInputFile(restorefile)
+    if not model and restoreSeed.M:
+        model = restoreSeed.M[0].raw.get("Model", "").strip()
+    if syncdir:
+        sync = SyncDir(syncdir, instanceName)
+    startExecLog(argv)
+    startMonitor(restoreSeed)
+    openProbeCache(outputfold)
+
+    try:
+        campaign(inputfold, recordfile)
+    except ReplayFinished:
+        finishReplay()
 
 
 if __name__ == "__main__":
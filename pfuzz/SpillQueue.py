@@ -0,0 +1,163 @@
+import os
+import pickle
+import sqlite3
+from collections import OrderedDict
+
+###
+# 'SpillQueue' is the Snipuzz seed queue with a memory budget
+# 'SpillQueue' attrs - [ seeds   : Seed List, None where the seed is spilled            - the resident seeds by queue position;
+#                        sizes   : Int List                                               - pickled size of each seed when it was last measured;
+#                        digest  : String List                                            - Seed.digest() of each seed, so lookups need no load;
+#                        mutated : Bool List                                              - isMutated of each seed as of its last spill;
+#                        lru     : queue position -> None (OrderedDict)                   - the resident seeds, least recently used first ]
+# When the resident seeds exceed 'budget' bytes, the least recently used ones are pickled to a sqlite file and
+# dropped from memory; indexing a spilled position loads it back. budget 0 keeps everything resident.
+# A seed is written again every time it is spilled, so changes made while it was resident are kept. Seeds handed
+# out by indexing may be filled in place (Probe, SnippetMutate), so they are measured again before the next spill.
+###
+class SpillQueue:
+    def __init__(self, file='', budget=0) -> None:
+        self.file = file
+        self.budget = budget
+        self.seeds = []
+        self.sizes = []
+        self.digest = []
+        self.mutated = []
+        self.lru = OrderedDict()
+        # resident positions handed out since the last spill, measured again then
+        self.dirty = set()
+        self.resident = 0
+        self.spills = 0
+        self.loads = 0
+        self.db = None
+        if budget > 0:
+            if os.path.exists(file):
+                os.remove(file)
+            self.db = sqlite3.connect(file)
+            self.db.execute("PRAGMA synchronous=OFF")
+            self.db.execute("CREATE TABLE seed (position INTEGER PRIMARY KEY, data BLOB)")
+
+    def __len__(self):
+        return len(self.seeds)
+
+    def __iter__(self):
+        for i in range(len(self.seeds)):
+            yield self[i]
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self.seeds)
+        if self.seeds[i] is None:
+            self._load(i)
+        else:
+            self._spill(i)
+        self._touch(i)
+        if self.db is not None:
+            self.dirty.add(i)
+        return self.seeds[i]
+
+    def __setitem__(self, i, seed):
+        if i < 0:
+            i += len(self.seeds)
+        if self.seeds[i] is not None:
+            self.resident -= self.sizes[i]
+        self.seeds[i] = seed
+        self.digest[i] = seed.digest()
+        self.mutated[i] = seed.isMutated
+        self.sizes[i] = self._size(seed)
+        self.resident += self.sizes[i]
+        self._touch(i)
+        self._spill(i)
+
+    def append(self, seed):
+        self.seeds.append(None)
+        self.sizes.append(0)
+        self.digest.append("")
+        self.mutated.append(False)
+        self[len(self.seeds) - 1] = seed
+
+    def extend(self, seeds):
+        for seed in seeds:
+            self.append(seed)
+
+    # replace the whole queue, e.g. with the seeds a distillation kept
+    def reset(self, seeds):
+        seeds = list(seeds)
+        self.seeds = []
+        self.sizes = []
+        self.digest = []
+        self.mutated = []
+        self.lru = OrderedDict()
+        self.dirty = set()
+        self.resident = 0
+        if self.db is not None:
+            self.db.execute("DELETE FROM seed")
+        self.extend(seeds)
+
+    def digests(self):
+        return list(self.digest)
+
+    def isMutated(self, i):
+        if self.seeds[i] is not None:
+            return self.seeds[i].isMutated
+        return self.mutated[i]
+
+    def _size(self, seed):
+        if self.db is None:
+            return 0
+        return len(pickle.dumps(seed))
+
+    def _touch(self, i):
+        self.lru.pop(i, None)
+        self.lru[i] = None
+
+    def _load(self, i):
+        data = self.db.execute("SELECT data FROM seed WHERE position = ?", (i,)).fetchone()[0]
+        self.seeds[i] = pickle.loads(data)
+        self.sizes[i] = len(data)
+        self.resident += self.sizes[i]
+        self.loads += 1
+        self._spill(i)
+
+    # spill the least recently used seeds until the budget holds, never the one at 'keep'
+    def _spill(self, keep):
+        if self.db is None:
+            return
+        for i in self.dirty:
+            if self.seeds[i] is not None:
+                size = self._size(self.seeds[i])
+                self.resident += size - self.sizes[i]
+                self.sizes[i] = size
+        self.dirty.clear()
+        while self.resident > self.budget and len(self.lru) > 1:
+            i = next(iter(self.lru))
+            if i == keep:
+                self.lru.move_to_end(i)
+                continue
+            del self.lru[i]
+            seed = self.seeds[i]
+            data = pickle.dumps(seed)
+            self.db.execute("INSERT OR REPLACE INTO seed (position, data) VALUES (?, ?)", (i, data))
+            self.resident -= self.sizes[i]
+            self.sizes[i] = len(data)
+            self.mutated[i] = seed.isMutated
+            self.seeds[i] = None
+            self.spills += 1
+
+    def lines(self):
+        spilled = [self.sizes[i] for i in range(len(self.seeds)) if self.seeds[i] is None]
+        return ["Queue seeds: " + str(len(self.seeds)) +
+                " resident: " + str(len(self.seeds) - len(spilled)) + " (" + str(self.resident) + " bytes)" +
+                " spilled: " + str(len(spilled)) + " (" + str(sum(spilled)) + " bytes)" +
+                " budget: " + str(self.budget) + " spills: " + str(self.spills) + " loads: " + str(self.loads)]
+
+    def display(self):
+        for line in self.lines():
+            print(line)
+
+    def save(self, file):
+        if self.db is not None:
+            self.db.commit()
+        with open(file, 'w') as f:
+            for line in self.lines():
+                f.write(line + "\n")
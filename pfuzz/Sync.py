@@ -0,0 +1,67 @@
+import os
+import socket
+
+###
+# 'SyncDir' is a directory shared by several Snipuzz instances (-s <syncdir>), possibly on other hosts:
+#   <syncdir>/<instance>/queue/<digest>.txt      one probed seed in the ProbeRecord format
+#   <syncdir>/<instance>/crashes/<bucket>.txt    one crash per bucket
+# Files are written to a temporary name and renamed, so a peer never reads half a file. A peer's entry counts as
+# seen only once the caller has imported it (done()), an entry that failed to read is offered again next time.
+###
+class SyncDir:
+    def __init__(self, root, name='') -> None:
+        self.root = root
+        self.name = name or (socket.gethostname() + "-" + str(os.getpid()))
+        self.seen = set()
+        os.makedirs(os.path.join(self.root, self.name, 'queue'), exist_ok=True)
+        os.makedirs(os.path.join(self.root, self.name, 'crashes'), exist_ok=True)
+
+    def _write(self, kind, name, text):
+        path = os.path.join(self.root, self.name, kind, name + '.txt')
+        if os.path.exists(path):
+            return False
+        tmp = os.path.join(self.root, self.name, kind, '.' + name + '.tmp')
+        with open(tmp, 'w') as f:
+            f.write(text)
+        os.replace(tmp, path)
+        return True
+
+    def export(self, digest, text):
+        self.seen.add(digest)
+        return self._write('queue', digest, text)
+
+    def exportCrash(self, bucket, text):
+        return self._write('crashes', bucket, text)
+
+    # the instance that already reported a crash bucket, '' if none did
+    def crashOwner(self, bucket):
+        for instance in self.instances():
+            if os.path.exists(os.path.join(self.root, instance, 'crashes', bucket + '.txt')):
+                return instance
+        return ''
+
+    def instances(self):
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(d for d in os.listdir(self.root) if os.path.isdir(os.path.join(self.root, d)))
+
+    def done(self, digest):
+        self.seen.add(digest)
+
+    # (digest, path) of the peers' queue entries not imported yet
+    def imports(self):
+        entries = []
+        for instance in self.instances():
+            if instance == self.name:
+                continue
+            fold = os.path.join(self.root, instance, 'queue')
+            if not os.path.isdir(fold):
+                continue
+            for file in sorted(os.listdir(fold)):
+                if file.startswith('.') or not file.endswith('.txt'):
+                    continue
+                digest = file[:-4]
+                if digest in self.seen:
+                    continue
+                entries.append((digest, os.path.join(fold, file)))
+        return entries
@@ -0,0 +1,103 @@
+import itertools
+import random
+import re
+import time
+
+###
+# Template fields in seed contents, expanded by the Messenger every time a message is sent:
+#   {{epoch}}      current epoch in seconds         {{epoch_ms}}   current epoch in milliseconds
+#   {{counter}}    monotonically increasing counter {{nonce}}      random hex nonce (16 hex digits)
+# An optional format follows a colon: {{counter:6}} pads to 6 decimal digits, {{epoch:x8}} writes 8 hex
+# digits (for hex contents), {{nonce:32}} gives a 32 hex digit nonce.
+# Probe and the mutation operators work on the template text, so snippet offsets never move, and the
+# placeholders are protected fields: they are neither probed nor mutated unless asked for.
+###
+
+PLACEHOLDER = re.compile(r'\{\{(epoch_ms|epoch|counter|nonce)(?::(x?\d+))?\}\}')
+
+# markers wrapping bare placeholders while a JSON content is parsed
+FREEZE_MARK = '@@'
+
+counter = itertools.count(1)
+
+# the nonces come from their own generator so they do not shift the mutation's random sequence
+nonceRandom = random.Random()
+
+
+def formatValue(value, fmt):
+    if not fmt:
+        return str(value)
+    if fmt.startswith('x'):
+        width = int(fmt[1:])
+        return format(value, 'x').zfill(width)[-width:]
+    return str(value).zfill(int(fmt))
+
+
+def expandField(match):
+    name, fmt = match.group(1), match.group(2)
+    if name == 'epoch':
+        return formatValue(int(time.time()), fmt)
+    if name == 'epoch_ms':
+        return formatValue(int(time.time() * 1000), fmt)
+    if name == 'counter':
+        return formatValue(next(counter), fmt)
+    width = int(fmt.lstrip('x')) if fmt else 16
+    return format(nonceRandom.getrandbits(width * 4), 'x').zfill(width)
+
+
+def expand(content):
+    if '{{' not in content:
+        return content
+    return PLACEHOLDER.sub(expandField, content)
+
+
+# [start, end] (both inclusive) of every placeholder in the content
+def protectedSpans(content):
+    if '{{' not in content:
+        return []
+    return [[match.start(), match.end() - 1] for match in PLACEHOLDER.finditer(content)]
+
+
+def overlaps(start, end, spans):
+    for span in spans:
+        if start <= span[1] and span[0] <= end:
+            return True
+    return False
+
+
+# the parts of a snippet that lie outside the protected spans
+def clip(snippet, spans):
+    parts = [list(snippet)]
+    for span in spans:
+        clipped = []
+        for part in parts:
+            if part[1] < span[0] or span[1] < part[0]:
+                clipped.append(part)
+                continue
+            if part[0] < span[0]:
+                clipped.append([part[0], span[0] - 1])
+            if span[1] < part[1]:
+                clipped.append([span[1] + 1, part[1]])
+        parts = clipped
+    return parts
+
+
+# quote the bare placeholders ("t":{{epoch}}) so the content parses as JSON; thaw() undoes it
+def freeze(content):
+    if '{{' not in content:
+        return content
+    result = ""
+    last = 0
+    for match in PLACEHOLDER.finditer(content):
+        start, end = match.start(), match.end()
+        quoted = start > 0 and content[start - 1] == '"' and end < len(content) and content[end] == '"'
+        result += content[last:start]
+        result += match.group(0) if quoted else '"' + FREEZE_MARK + match.group(0) + FREEZE_MARK + '"'
+        last = end
+    return result + content[last:]
+
+
+def thaw(text):
+    if FREEZE_MARK not in text:
+        return text
+    return re.sub('"' + FREEZE_MARK + r'(\{\{[^}]*\}\})' + FREEZE_MARK + '"', r'\1', text)
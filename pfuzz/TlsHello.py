@@ -0,0 +1,150 @@
+import os
+import random
+import struct
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'eWelink_hub'))
+from cipher_suite_downgrade import PRESETS, ClientHello, TlsRecordReader
+
+###
+# Field-aware mutation for 'Transport: tls' seeds, whose Content is a ClientHello record in hex (see
+# cipher_suite_downgrade.ClientHello). Instead of the byte-deletion probe and the snippet clustering, every
+# ClientHello field is a snippet: a mutation overrides one field and the model derives the lengths around it,
+# so a mangled cipher list still parses and a mangled length field is the only inconsistency in the record.
+# The Messenger classifies the answer as 'alert:<level>:<description>' or 'serverhello:<cipher>'.
+###
+
+TLS_OPERATORS = ['TlsEmpty', 'TlsBitFlip', 'TlsRepeat', 'TlsInteresting']
+
+# cipher suites worth offering on their own: SCSVs, GREASE, NULL, export, anonymous, PSK and the presets
+INTERESTING_SUITES = [
+    0x00FF,  # TLS_EMPTY_RENEGOTIATION_INFO_SCSV
+    0x5600,  # TLS_FALLBACK_SCSV
+    0x0A0A,  # GREASE
+    0x0000,  # TLS_NULL_WITH_NULL_NULL
+    0x0001,  # TLS_RSA_WITH_NULL_MD5
+    0x0003,  # TLS_RSA_EXPORT_WITH_RC4_40_MD5
+    0x0008,  # TLS_RSA_EXPORT_WITH_DES40_CBC_SHA
+    0x0018,  # TLS_DH_anon_WITH_RC4_128_MD5
+    0x002C,  # TLS_PSK_WITH_NULL_SHA
+    0x008C,  # TLS_PSK_WITH_AES_128_CBC_SHA
+    0xC0A4,  # TLS_PSK_WITH_AES_128_CCM
+    0xC0A8,  # TLS_PSK_WITH_AES_128_CCM_8
+    0x1301,  # TLS_AES_128_GCM_SHA256 (TLS 1.3 only)
+    0xFFFF,
+]
+
+INTERESTING_VERSIONS = [b'\x03\x00', b'\x03\x01', b'\x03\x02', b'\x03\x04', b'\x02\x00', b'\xfe\xfd', b'\x7f\x1c']
+
+INTERESTING_NAMES = [b'', b'a' * 255, b'a' * 1024, b'.', b'localhost', b'\x00', b'\xff' * 16, b'%s%n']
+
+parsed = {}
+
+
+def isTls(message):
+    return str(message.raw.get("Transport", "")).strip().lower() == "tls"
+
+
+# the ClientHello model of a hex content (mutated ones too), None if the content is not one
+def parse(content):
+    content = (content or "").strip().replace(" ", "")
+    if content not in parsed:
+        try:
+            parsed[content] = ClientHello.parse(bytes.fromhex(content), strict=False)
+        except ValueError:
+            parsed[content] = None
+    return parsed[content]
+
+
+# the content with one field replaced, None if the value does not fit a length field
+def encode(hello, name, value):
+    overrides = hello.overrides
+    hello.overrides = dict(overrides, **{name: value})
+    try:
+        return hello.encode().hex()
+    except OverflowError:
+        return None
+    finally:
+        hello.overrides = overrides
+
+
+# [start, end] (inclusive) hex-character span of every non-empty field, in wire order
+def fieldSnippets(content):
+    hello = parse(content)
+    if hello is None:
+        return []
+    snippets = []
+    for start, end in hello.fields().values():
+        if end > start:
+            snippets.append([start * 2, end * 2 - 1])
+    return snippets
+
+
+def valueVariants(name, value):
+    if name.endswith('cipher_suites'):
+        suites = [value[i:i + 2] for i in range(0, len(value) - 1, 2)]
+        variants = [struct.pack('!H', c) for c in INTERESTING_SUITES]
+        variants += [b''.join(struct.pack('!H', c) for c in preset) for preset in PRESETS.values()]
+        variants.append(b''.join(reversed(suites)))
+        variants.append(value + value[:1])  # odd length
+        return variants
+    if name.endswith('_length'):
+        width = len(value)
+        n = int.from_bytes(value, 'big')
+        top = (1 << (8 * width)) - 1
+        return [x.to_bytes(width, 'big') for x in sorted({0, 1, max(n - 1, 0), min(n + 1, top), top // 2, top})
+                if x != n]
+    if name.endswith('version'):
+        return INTERESTING_VERSIONS
+    if name.endswith('sni_name'):
+        return INTERESTING_NAMES
+    if name.endswith('compression_methods'):
+        return [b'\x01', b'\x01\x00', b'\xff']
+    if name.endswith('_type'):
+        return [b'\x00' * len(value), b'\xff' * len(value)]
+    return [random.randbytes(len(value))]
+
+
+def fieldMutation(hello, name, value, op):
+    if op == 'TlsEmpty':
+        return encode(hello, name, b'')
+    if op == 'TlsBitFlip':
+        return encode(hello, name, bytes(255 - b for b in value))
+    if op == 'TlsRepeat':
+        return encode(hello, name, value * random.randint(2, 5))
+    return encode(hello, name, random.choice(valueVariants(name, value)))
+
+
+# (op, mutated content, snippet) for every field of a ClientHello content
+def fieldMutations(content):
+    hello = parse(content)
+    if hello is None:
+        return
+    spans = hello.fields()
+    for name, value in hello.layout():
+        if not value:
+            continue
+        snippet = [spans[name][0] * 2, spans[name][1] * 2 - 1]
+        for op in ('TlsEmpty', 'TlsBitFlip', 'TlsRepeat'):
+            mutated = fieldMutation(hello, name, value, op)
+            if mutated:
+                yield op, mutated, snippet
+        for variant in valueVariants(name, value):
+            mutated = encode(hello, name, variant)
+            if mutated:
+                yield 'TlsInteresting', mutated, snippet
+
+
+# one random field mutation, (op, content, snippet) or None
+def randomMutation(content):
+    hello = parse(content)
+    if hello is None:
+        return None
+    spans = hello.fields()
+    fields = [(name, value) for name, value in hello.layout() if value]
+    name, value = random.choice(fields)
+    op = random.choice(TLS_OPERATORS)
+    mutated = fieldMutation(hello, name, value, op)
+    if not mutated:
+        return None
+    return op, mutated, [spans[name][0] * 2, spans[name][1] * 2 - 1]
@@ -0,0 +1,423 @@
+import binascii
+import hashlib
+import hmac
+import json
+import os
+import random
+import socket
+import struct
+import time
+
+# AES backend: 'cryptography' if installed, else pycryptodome (tinytuya itself needs one of them)
+try:
+    from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+    from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+    AES = None
+except ImportError:
+    Cipher = None
+    try:
+        from Crypto.Cipher import AES
+    except ImportError:
+        AES = None
+
+###
+# Native Tuya LAN framing (protocol 3.3 / 3.4 / 3.5), used by the Messenger instead of rebuilding a
+# tinytuya.MessagePayload and calling tinytuya's private _send_receive for every message.
+#   3.3 : 55AA frame, CRC32,       AES-ECB with the local key
+#   3.4 : 55AA frame, HMAC-SHA256, AES-ECB with the negotiated session key
+#   3.5 : 6699 frame, AES-GCM tag, AES-GCM with the negotiated session key
+# A 'TuyaSession' keeps the socket, the session key and the AES/HMAC contexts across sends and only
+# negotiates again when the connection is lost or the device fails the authentication.
+###
+
+PREFIX_55AA = 0x000055AA
+SUFFIX_55AA = 0x0000AA55
+PREFIX_6699 = 0x00006699
+SUFFIX_6699 = 0x00009966
+
+SESS_KEY_NEG_START = 3
+SESS_KEY_NEG_RESP = 4
+SESS_KEY_NEG_FINISH = 5
+STATUS = 8
+HEART_BEAT = 9
+DP_QUERY = 10
+CONTROL_NEW = 13
+DP_QUERY_NEW = 16
+UPDATEDPS = 18
+LAN_EXT_STREAM = 0x40
+
+# commands sent without the "3.x" + 12 zero bytes version header
+NO_PROTOCOL_HEADER_CMDS = [DP_QUERY, DP_QUERY_NEW, UPDATEDPS, HEART_BEAT, SESS_KEY_NEG_START,
+                           SESS_KEY_NEG_RESP, SESS_KEY_NEG_FINISH, LAN_EXT_STREAM]
+
+# frame fields that can be overridden (and mutated) through the 'Frame' header of a seed message
+FRAME_FIELDS = ['cmd', 'seqno', 'length', 'checksum']
+
+# what tinytuya answers for a payload that is not JSON, kept identical so the response pools still match
+ERR_JSON = 'Invalid JSON Response from Device'
+
+
+class TuyaAuthError(Exception):
+    pass
+
+
+def available():
+    return Cipher is not None or AES is not None
+
+
+def pad(data):
+    n = 16 - len(data) % 16
+    return data + bytes([n]) * n
+
+
+def unpad(data):
+    if data and 0 < data[-1] <= 16 and data.endswith(bytes([data[-1]]) * data[-1]):
+        return data[:-data[-1]]
+    return data
+
+
+###
+# 'AESContext' wraps one AES key: ECB for 3.3/3.4, GCM for 3.5, built once per key and reused
+###
+class AESContext:
+    def __init__(self, key) -> None:
+        self.key = key
+        if Cipher is not None:
+            self.ecb = Cipher(algorithms.AES(key), modes.ECB())
+            self.gcm = AESGCM(key)
+        else:
+            self.ecb = AES.new(key, AES.MODE_ECB)
+            self.gcm = None
+
+    def encrypt(self, data, padding=True):
+        if padding:
+            data = pad(data)
+        if Cipher is not None:
+            encryptor = self.ecb.encryptor()
+            return encryptor.update(data) + encryptor.finalize()
+        return self.ecb.encrypt(data)
+
+    def decrypt(self, data):
+        data = data[:len(data) - len(data) % 16]
+        if Cipher is not None:
+            decryptor = self.ecb.decryptor()
+            return unpad(decryptor.update(data) + decryptor.finalize())
+        return unpad(self.ecb.decrypt(data))
+
+    # returns ciphertext + 16 byte tag
+    def encryptGCM(self, iv, data, aad):
+        if self.gcm is not None:
+            return self.gcm.encrypt(iv, data, aad)
+        cipher = AES.new(self.key, AES.MODE_GCM, nonce=iv)
+        if aad:
+            cipher.update(aad)
+        ciphertext, tag = cipher.encrypt_and_digest(data)
+        return ciphertext + tag
+
+    def decryptGCM(self, iv, data, aad):
+        try:
+            if self.gcm is not None:
+                return self.gcm.decrypt(iv, data, aad)
+            cipher = AES.new(self.key, AES.MODE_GCM, nonce=iv)
+            if aad:
+                cipher.update(aad)
+            return cipher.decrypt_and_verify(data[:-16], data[-16:])
+        except Exception as e:
+            raise TuyaAuthError("GCM tag mismatch: " + str(e))
+
+
+###
+# 'Frame' is one decoded frame from the device
+# 'Frame' attrs - [ cmd, seqno, retcode : header fields (int);
+#                   payload : decrypted payload (bytes), version header and retcode removed ]
+###
+class Frame:
+    def __init__(self, cmd, seqno, retcode, payload) -> None:
+        self.cmd = cmd
+        self.seqno = seqno
+        self.retcode = retcode
+        self.payload = payload
+
+
+# parse the 'Frame' header of a seed message, e.g. "cmd=13,seqno=0xffffffff,length=0,checksum=00000000"
+def parseFields(text):
+    fields = {}
+    for item in (text or "").split(','):
+        if '=' not in item:
+            continue
+        key, value = item.split('=', 1)
+        key = key.strip()
+        if key == 'checksum':
+            fields[key] = bytes.fromhex(value.strip())
+        elif key in FRAME_FIELDS:
+            fields[key] = int(value.strip(), 0)
+    return fields
+
+
+# a random frame field override for Havoc, in the 'Frame' header format
+def randomFields():
+    field = random.choice(FRAME_FIELDS)
+    if field == 'checksum':
+        return 'checksum=' + random.choice(['00000000', 'ffffffff', random.randbytes(4).hex()])
+    value = random.choice([0, 1, 0x7f, 0xff, 0xffff, 0x7fffffff, 0xffffffff, random.getrandbits(32)])
+    return field + '=' + hex(value)
+
+
+class TuyaSession:
+    def __init__(self, dev_id, address, local_key, version=3.4, port=6668, timeout=2.0) -> None:
+        self.dev_id = dev_id
+        self.address = address
+        self.port = port
+        self.timeout = timeout
+        self.version = version
+        self.version_header = ("%.1f" % version).encode() + b"\0" * 12
+        self.real_key = local_key.encode("latin1")
+        self.real_cipher = AESContext(self.real_key)
+        self.sock = None
+        self.seqno = 1
+        self.buffer = b''
+        self.negotiations = 0
+        self._set_session_key(self.real_key)
+
+    def _set_session_key(self, key):
+        self.session_key = key
+        self.cipher = self.real_cipher if key == self.real_key else AESContext(key)
+        # keyed HMAC state, copied per frame instead of re-keyed
+        self.hmac = hmac.new(key, digestmod=hashlib.sha256)
+
+    def connected(self):
+        return self.sock is not None
+
+    def close(self):
+        if self.sock is not None:
+            try:
+                self.sock.close()
+            except Exception:
+                pass
+        self.sock = None
+        self.buffer = b''
+        self._set_session_key(self.real_key)
+
+    def connect(self):
+        self.close()
+        self.sock = socket.create_connection((self.address, self.port), timeout=self.timeout)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        if self.version >= 3.4:
+            self.negotiate()
+
+    # ---------------------------------------------------------
+    #  3.4 / 3.5 session key negotiation
+    # ---------------------------------------------------------
+    def negotiate(self):
+        self.negotiations += 1
+        local_nonce = os.urandom(16)
+        self.sock.sendall(self.encode(SESS_KEY_NEG_START, local_nonce))
+
+        frame = self.receive()
+        while frame is not None and frame.cmd != SESS_KEY_NEG_RESP:
+            frame = self.receive()
+        if frame is None:
+            raise TuyaAuthError("no session key negotiation response")
+
+        payload = frame.payload
+        if len(payload) == 52:
+            payload = payload[4:]
+        if len(payload) < 48:
+            raise TuyaAuthError("short session key negotiation response")
+        remote_nonce = payload[:16]
+        if payload[16:48] != hmac.new(self.real_key, local_nonce, hashlib.sha256).digest():
+            raise TuyaAuthError("session key negotiation HMAC mismatch")
+
+        self.sock.sendall(self.encode(SESS_KEY_NEG_FINISH, hmac.new(self.real_key, remote_nonce, hashlib.sha256).digest()))
+
+        key = bytes(a ^ b for a, b in zip(local_nonce, remote_nonce))
+        if self.version >= 3.5:
+            key = self.real_cipher.encryptGCM(local_nonce[:12], key, None)[:16]
+        else:
+            key = self.real_cipher.encrypt(key, padding=False)
+        self._set_session_key(key)
+
+    # ---------------------------------------------------------
+    #  Encoding
+    # ---------------------------------------------------------
+    def _checksum(self, data):
+        if self.version >= 3.4:
+            h = self.hmac.copy()
+            h.update(data)
+            return h.digest()
+        return struct.pack('>I', binascii.crc32(data) & 0xFFFFFFFF)
+
+    def encode(self, cmd, payload, fields=None):
+        fields = fields or {}
+        seqno = fields.get('seqno', self.seqno)
+        self.seqno += 1
+        header_cmd = fields.get('cmd', cmd)
+
+        if self.version >= 3.5:
+            if cmd not in NO_PROTOCOL_HEADER_CMDS:
+                payload = self.version_header + payload
+            iv = os.urandom(12)
+            length = fields.get('length', len(payload) + 12 + 16)
+            header = struct.pack('>IHIII', PREFIX_6699, 0, seqno, header_cmd, length)
+            data = self.cipher.encryptGCM(iv, payload, header[4:])
+            if 'checksum' in fields:
+                data = data[:-16] + (fields['checksum'] * 16)[:16]
+            return header + iv + data + struct.pack('>I', SUFFIX_6699)
+
+        if self.version >= 3.4:
+            if cmd not in NO_PROTOCOL_HEADER_CMDS:
+                payload = self.version_header + payload
+            payload = self.cipher.encrypt(payload)
+            checksum_len = 32
+        else:
+            payload = self.cipher.encrypt(payload)
+            if cmd not in NO_PROTOCOL_HEADER_CMDS:
+                payload = self.version_header + payload
+            checksum_len = 4
+
+        length = fields.get('length', len(payload) + checksum_len + 4)
+        header = struct.pack('>IIII', PREFIX_55AA, seqno, header_cmd, length)
+        checksum = self._checksum(header + payload)
+        if 'checksum' in fields:
+            checksum = (fields['checksum'] * checksum_len)[:checksum_len]
+        return header + payload + checksum + struct.pack('>I', SUFFIX_55AA)
+
+    # ---------------------------------------------------------
+    #  Decoding
+    # ---------------------------------------------------------
+    def _read(self):
+        chunk = self.sock.recv(4096)
+        if not chunk:
+            raise ConnectionResetError("device closed the connection")
+        self.buffer += chunk
+
+    def _strip(self, payload):
+        # retcode (device -> client) and version header, whichever are present
+        retcode = 0
+        if len(payload) >= 4 and payload[:3] == b'\0\0\0':
+            retcode = payload[3]
+            payload = payload[4:]
+        if payload.startswith(self.version_header[:3]):
+            payload = payload[15:]
+        return retcode, payload
+
+    # read one frame, None on timeout
+    def receive(self):
+        try:
+            while True:
+                start = min((i for i in (self.buffer.find(b'\x00\x00\x55\xaa'), self.buffer.find(b'\x00\x00\x66\x99'))
+                             if i >= 0), default=-1)
+                if start < 0:
+                    self.buffer = self.buffer[-3:]
+                    self._read()
+                    continue
+                self.buffer = self.buffer[start:]
+                prefix = struct.unpack('>I', self.buffer[:4])[0]
+                header_len = 18 if prefix == PREFIX_6699 else 16
+                while len(self.buffer) < header_len:
+                    self._read()
+                if prefix == PREFIX_6699:
+                    _, _, seqno, cmd, length = struct.unpack('>IHIII', self.buffer[:18])
+                    total = 18 + length + 4
+                else:
+                    _, seqno, cmd, length = struct.unpack('>IIII', self.buffer[:16])
+                    total = 16 + length
+                while len(self.buffer) < total:
+                    self._read()
+                data, self.buffer = self.buffer[:total], self.buffer[total:]
+                return self.decode(data, prefix, seqno, cmd, length)
+        except socket.timeout:
+            return None
+
+    def decode(self, data, prefix, seqno, cmd, length):
+        if prefix == PREFIX_6699:
+            iv = data[18:30]
+            payload = self.cipher.decryptGCM(iv, data[30:18 + length], data[4:18])
+            retcode, payload = self._strip(payload)
+            return Frame(cmd, seqno, retcode, payload)
+
+        checksum_len = 32 if self.version >= 3.4 else 4
+        body = data[16:len(data) - checksum_len - 4]
+        checksum = data[len(data) - checksum_len - 4:len(data) - 4]
+        if checksum != self._checksum(data[:16] + body):
+            raise TuyaAuthError("frame checksum mismatch")
+
+        retcode = 0
+        if len(body) >= 4 and body[:3] == b'\0\0\0':
+            retcode = body[3]
+            body = body[4:]
+        if not body:
+            return Frame(cmd, seqno, retcode, b'')
+        if self.version < 3.4:
+            if body.startswith(self.version_header[:3]):
+                body = body[15:]
+            if len(body) % 16:
+                # plain text, e.g. 'data format error' from older firmware
+                return Frame(cmd, seqno, retcode, body)
+            return Frame(cmd, seqno, retcode, self.cipher.decrypt(body))
+        _, payload = self._strip(self.cipher.decrypt(body))
+        return Frame(cmd, seqno, retcode, payload)
+
+    def heartbeat(self):
+        """
+        True if the device answers a HEART_BEAT (even with an empty frame) within the timeout
+        """
+        if not self.connected():
+            self.connect()
+        self.sock.settimeout(self.timeout)
+        self.sock.sendall(self.encode(HEART_BEAT, b''))
+        return self.receive() is not None
+
+    # ---------------------------------------------------------
+    #  One request / response round
+    # ---------------------------------------------------------
+    def request(self, cmd, payload, fields=None, ack_wait=0.5):
+        """
+        Send one command and return the decoded response text, None when nothing but an empty ack came back
+        """
+        frame = self.exchange(cmd, payload, fields, ack_wait)
+        if frame is None:
+            return None
+        return responseText(frame.payload)
+
+    def status(self):
+        """
+        The device's DPS dictionary from a DP query, None when the device gave no usable answer
+        """
+        cmd = DP_QUERY_NEW if self.version >= 3.4 else DP_QUERY
+        payload = json.dumps({"gwId": self.dev_id, "devId": self.dev_id, "uid": self.dev_id,
+                              "t": str(int(time.time()))}, separators=(',', ':'))
+        frame = self.exchange(cmd, payload.encode())
+        if frame is None:
+            return None
+        try:
+            data = json.loads(frame.payload.decode("utf-8", errors="ignore").strip("\0 \r\n"))
+        except ValueError:
+            return None
+        if isinstance(data, dict) and isinstance(data.get("dps"), dict):
+            return data["dps"]
+        return None
+
+    # first non-empty frame answering a command, None on timeout
+    def exchange(self, cmd, payload, fields=None, ack_wait=0.5):
+        if not self.connected():
+            self.connect()
+        self.sock.settimeout(self.timeout)
+        self.sock.sendall(self.encode(cmd, payload, fields))
+
+        frame = self.receive()
+        # CONTROL is acked with an empty frame, the new state follows as a STATUS frame
+        while frame is not None and not frame.payload:
+            self.sock.settimeout(ack_wait)
+            frame = self.receive()
+        self.sock.settimeout(self.timeout)
+        return frame
+
+
+# decoded payload as the Messenger reports it (str of the JSON object, like tinytuya's return value)
+def responseText(payload):
+    text = payload.decode("utf-8", errors="ignore").strip("\0 \r\n")
+    try:
+        return str(json.loads(text))
+    except ValueError:
+        return str({'Error': ERR_JSON, 'Err': '900', 'Payload': text})
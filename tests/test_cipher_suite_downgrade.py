@@ -0,0 +1,137 @@
+import asyncio
+import json
+import os
+import shutil
+import socket
+import ssl
+import subprocess
+import sys
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "eWelink_hub"))
+
+from cipher_suite_downgrade import ClientHello, Enumerator, iana_suites, parse_serverhello, sweep_main
+
+SUITES = {0xc02f: 'ECDHE-RSA-AES128-GCM-SHA256', 0xc030: 'ECDHE-RSA-AES256-GCM-SHA384'}
+
+
+@pytest.fixture(scope="module")
+def certificate(tmp_path_factory):
+    if shutil.which("openssl") is None:
+        pytest.skip("needs the openssl command to make a certificate")
+    fold = tmp_path_factory.mktemp("tls")
+    cert, key = str(fold / "cert.pem"), str(fold / "key.pem")
+    subprocess.run(["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1", "-subj", "/CN=localhost",
+                    "-keyout", key, "-out", cert], check=True, capture_output=True)
+    return cert, key
+
+
+def serve(sock, context):
+    while True:
+        try:
+            conn, _ = sock.accept()
+        except OSError:
+            return
+        threading.Thread(target=handshake, args=(conn, context), daemon=True).start()
+
+
+def handshake(conn, context):
+    try:
+        with context.wrap_socket(conn, server_side=True):
+            pass
+    except (OSError, ssl.SSLError):
+        conn.close()
+
+
+# a TLS1.2-only server with the two SUITES on an ephemeral port
+@pytest.fixture
+def tls_port(certificate):
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.load_cert_chain(*certificate)
+    context.minimum_version = context.maximum_version = ssl.TLSVersion.TLSv1_2
+    context.set_ciphers(':'.join(SUITES.values()))
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    sock.listen(16)
+    threading.Thread(target=serve, args=(sock, context), daemon=True).start()
+    yield sock.getsockname()[1]
+    sock.close()
+
+
+def test_clienthello_round_trip():
+    hello = ClientHello([0xc02f, 0x00ff], sni_hostname="device.local", add_alpn=True)
+    data = hello.encode()
+    assert ClientHello.parse(data).encode() == data
+    start, end = hello.fields()['cipher_suites']
+    assert data[start:end] == b'\xc0\x2f\x00\xff'
+
+    # a lying length survives a lenient parse as an override
+    hello.overrides['handshake_length'] = b'\x00\x00\x10'
+    mutated = hello.encode()
+    with pytest.raises(ValueError):
+        ClientHello.parse(mutated)
+    assert ClientHello.parse(mutated, strict=False).encode() == mutated
+
+
+def test_clienthello_gets_serverhello(tls_port):
+    with socket.create_connection(("127.0.0.1", tls_port), timeout=3) as sock:
+        sock.sendall(Enumerator([]).hello(0x0303, [0xc030], "localhost"))
+        data = b''
+        while parse_serverhello(data) is None:
+            chunk = sock.recv(16384)
+            assert chunk
+            data += chunk
+    assert parse_serverhello(data) == (0x0303, 0xc030)
+
+
+def test_enumerate(tls_port):
+    enumerator = Enumerator(iana_suites(), sni="localhost", cap=2, timeout=3.0)
+    report, = asyncio.run(enumerator.run([("127.0.0.1", tls_port)]))
+    versions = {r['version']: r for r in report['versions']}
+    assert sorted(versions['TLS1.2']['suites']) == sorted(SUITES)
+    assert versions['TLS1.2']['order'] in ('server', 'client')
+    for name in ('SSLv3', 'TLS1.0', 'TLS1.1', 'TLS1.3'):
+        assert versions[name]['suites'] == []
+        assert versions[name]['stopped'].startswith(('alert', 'downgraded'))
+
+
+# a plain service that answers anything with an HTTP error
+@pytest.fixture
+def http_port():
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    sock.listen(16)
+
+    def answer():
+        while True:
+            try:
+                conn, _ = sock.accept()
+            except OSError:
+                return
+            with conn:
+                conn.recv(4096)
+                conn.sendall(b"HTTP/1.0 400 Bad Request\r\n\r\n")
+
+    threading.Thread(target=answer, daemon=True).start()
+    yield sock.getsockname()[1]
+    sock.close()
+
+
+def test_sweep(tls_port, http_port, tmp_path):
+    scan = tmp_path / "nmap_result.txt"
+    scan.write_text("Nmap scan report for 127.0.0.1\n"
+                    "PORT      STATE  SERVICE VERSION\n"
+                    f"{http_port}/tcp open   http    stand-in\n"
+                    f"{tls_port}/tcp open   ssl/unknown\n"
+                    "1/tcp     closed tcpmux\n")
+    report = tmp_path / "sweep.json"
+    sweep_main([str(scan), "--timeout", "3", "--json", str(report)])
+    ports = {r['port']: r for r in json.loads(report.read_text())}
+    assert sorted(ports) == sorted([tls_port, http_port])
+    assert ports[http_port]['tls'] is False
+    assert ports[http_port]['detect'] == "other:48"
+    assert ports[tls_port]['tls'] is True
+    versions = {r['version']: r for r in ports[tls_port]['versions']}
+    assert sorted(int(c['code'], 16) for c in versions['TLS1.2']['suites']) == sorted(SUITES)
@@ -0,0 +1,60 @@
+import os
+import socket
+import struct
+import sys
+import threading
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "pfuzz"))
+
+import MqttBroker
+from Mqtt import CONNACK, CONNECT, PUBACK, PUBLISH, MqttSession, encodeString, packet
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_broker():
+    port = free_port()
+    threading.Thread(target=MqttBroker.serve, args=(port,), daemon=True).start()
+    for _ in range(50):
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.1).close()
+            return port
+        except OSError:
+            threading.Event().wait(0.05)
+    raise RuntimeError("the broker did not start")
+
+
+def test_reply_matches_correlation():
+    port = start_broker()
+    session = MqttSession("127.0.0.1", port, topic="dev/in", reply_topic="dev/out", use_tls=False)
+    try:
+        reply = session.request(b'{"sequence": "42", "params": {}}', correlate="sequence")
+        assert reply is not None
+        assert b'"sequence": "42"' in reply
+        assert b'"length": 32' in reply
+        # the session is kept across requests
+        assert session.request(b'{"sequence": "43"}', correlate="sequence") is not None
+        assert session.connects == 1
+    finally:
+        session.close()
+
+
+def test_qos1_publish_is_acknowledged():
+    port = start_broker()
+    sock = socket.create_connection(("127.0.0.1", port), timeout=2)
+    try:
+        body = encodeString("MQTT") + bytes([4, 0x02]) + struct.pack('>H', 60) + encodeString("qos1")
+        sock.sendall(packet(CONNECT, 0, body))
+        buffer = b''
+        kind, _, _, buffer = MqttBroker.readPacket(sock, buffer)
+        assert kind == CONNACK
+        sock.sendall(packet(PUBLISH, 0x02, encodeString("dev/in") + struct.pack('>H', 7) + b'{}'))
+        kind, _, body, buffer = MqttBroker.readPacket(sock, buffer)
+        assert kind == PUBACK
+        assert struct.unpack('>H', body)[0] == 7
+    finally:
+        sock.close()
@@ -0,0 +1,67 @@
+import json
+import os
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+import pytest
+
+pytest.importorskip("requests")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "X-IoT_camera"))
+
+import sql_injection
+
+
+# a login form that redirects back on failure and lets "' or" payloads in
+class LoginForm(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    usernames = []
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        form = parse_qs(self.rfile.read(int(self.headers.get("Content-Length", 0))).decode())
+        username = form.get("username", [""])[0]
+        LoginForm.usernames.append(username)
+        injected = "' or" in username.lower()
+        body = b"welcome" if injected else b"login failed"
+        self.send_response(200 if injected else 302)
+        self.send_header("Location", "/home" if injected else "/login?error")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def login_url():
+    LoginForm.usernames = []
+    server = ThreadingHTTPServer(("127.0.0.1", 0), LoginForm)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield "http://127.0.0.1:" + str(server.server_address[1]) + "/doLogin"
+    server.shutdown()
+    server.server_close()
+
+
+def test_run_and_resume(login_url, tmp_path):
+    payloads = tmp_path / "payloads.txt"
+    # the zero-width space makes the last line a duplicate of the first
+    payloads.write_text("admin\nadmin' or '1'='1\n' OR 1=1 -- \nadmin\u200b\n", encoding="utf-8")
+    results = tmp_path / "results.jsonl"
+    argv = ["--url", login_url, "--payloads", str(payloads), "--rps", "0", "--concurrency", "3",
+            "--baseline", "3", "--csv", str(tmp_path / "results.csv"), "--jsonl", str(results)]
+    sql_injection.main(argv)
+
+    records = [json.loads(line) for line in results.read_text(encoding="utf-8").splitlines()]
+    assert "baseline" in records[0]
+    found = {r["payload"]: r for r in records[1:]}
+    assert sorted(found) == sorted(["admin", "admin' or '1'='1", "' OR 1=1 -- "])
+    assert found["admin"]["anomaly"] == ""
+    assert "status" in found["admin' or '1'='1"]["anomaly"].split("|")
+    assert "location" in found["' OR 1=1 -- "]["anomaly"].split("|")
+    assert len(LoginForm.usernames) == 3 + 3
+
+    # everything finished, a resumed run sends nothing
+    sql_injection.main(argv + ["--resume"])
+    assert len(LoginForm.usernames) == 3 + 3